@@ -0,0 +1,512 @@
+"""
+Benchmarks for the Games Club Statistics Program
+Run with: python -m benchmarks
+
+Times the stats functions, show_results, save_to_file, show_saved_stats,
+rollup queries and range queries at sizes from 10 to 1,000,000 games (or players) and prints
+the results as JSON. Save a run with --output and pass it to a later run with --compare to
+catch anything that got slower
+
+--follow 10000 times live mode instead, saving 10,000 events a second
+"""
+
+import argparse
+import bisect
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time as timer
+import timeit
+import tracemalloc
+from array import array
+from unittest.mock import patch
+
+import follow
+import ingest
+import main
+import storage
+from leaderboard import INDEX_FIELDS, Leaderboard
+from rollups import Rollups, bucket_keys
+
+# 10, 100, ... 1,000,000
+DEFAULT_SIZES = [10 ** power for power in range(1, 7)]
+
+# A benchmark this much slower than the saved run counts as a regression
+DEFAULT_THRESHOLD = 1.25
+
+def make_games(num_games, seed=1):
+    """
+    Makes a repeatable list of (score, time) pairs like a real season
+    """
+    rng = random.Random(seed)
+    return [(rng.randint(0, 1000000), round(rng.uniform(1, 1440), 2)) for _ in range(num_games)]
+
+def make_history(num_games, seed=1):
+    """
+    Makes a repeatable (scores, times) history stored the way the program keeps it
+    """
+    scores = array('i')
+    times = array('d')
+    for score, time in make_games(num_games, seed):
+        scores.append(score)
+        times.append(time)
+    return scores, times
+
+def _bytes_used(build):
+    """
+    Returns how many bytes are still allocated by what build() returns
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return after - before
+
+def bench_history_memory(num_games=100000):
+    """
+    Compares the memory used per game by two Python lists (the old way)
+    and by the array('i')/array('d') history record_scores uses now
+    Returns (list bytes per game, array bytes per game)
+    """
+    games = make_games(num_games)
+    # The numbers are turned back into new objects each time, the same as
+    # they would be coming in from input() one game at a time
+    text_games = [(str(score), str(time)) for score, time in games]
+
+    def build_lists():
+        scores = []
+        times = []
+        for score, time in text_games:
+            scores.append(int(score))
+            times.append(float(time))
+        return scores, times
+
+    def build_arrays():
+        scores = array('i')
+        times = array('d')
+        for score, time in text_games:
+            scores.append(int(score))
+            times.append(float(time))
+        return scores, times
+
+    list_bytes = _bytes_used(build_lists)
+    array_bytes = _bytes_used(build_arrays)
+    return list_bytes / num_games, array_bytes / num_games
+
+def time_call(function, min_time=0.2, repeat=3):
+    """
+    Times function() and returns (best, median) seconds per call
+    Each of the repeat runs calls it as many times as fits in min_time,
+    so quick functions are timed over lots of calls
+    """
+    timed = timeit.Timer(function)
+    number = 1
+    while True:
+        elapsed = timed.timeit(number)
+        if elapsed >= min_time or number >= 1000000:
+            break
+        # Aim straight for min_time rather than creeping up on it
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+    runs = [elapsed / number] + [total / number for total in timed.repeat(repeat - 1, number)]
+    return min(runs), statistics.median(runs)
+
+def _result(name, seconds, games=None, players=None, store=None):
+    """
+    Makes one entry for the JSON output
+    """
+    best, median = seconds
+    return {"name": name, "store": store, "games": games, "players": players,
+            "best_seconds": best, "median_seconds": median}
+
+@contextlib.contextmanager
+def _quiet():
+    """
+    Sends anything printed to nowhere, so printing is timed without a terminal
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+@contextlib.contextmanager
+def _temp_store(store_type):
+    """
+    Opens an empty store in a temporary folder as the program's store
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        main.set_store(storage.open_store(store_type, folder))
+        try:
+            yield main.get_store()
+        finally:
+            main.set_store(None)
+
+def bench_stats(sizes, min_time=0.2):
+    """
+    Times find_highest_score and calculate_average_time
+    """
+    results = []
+    for num_games in sizes:
+        scores, times = make_history(num_games)
+        results.append(_result("find_highest_score",
+                               time_call(lambda: main.find_highest_score(scores), min_time),
+                               games=num_games))
+        results.append(_result("calculate_average_time",
+                               time_call(lambda: main.calculate_average_time(times), min_time),
+                               games=num_games))
+    return results
+
+def bench_show_results(sizes, min_time=0.2):
+    """
+    Times show_results with everything it prints thrown away
+    """
+    results = []
+    for num_games in sizes:
+        scores, times = make_history(num_games)
+        highest_score = main.find_highest_score(scores)
+        average_time = main.calculate_average_time(times)
+        with _quiet():
+            seconds = time_call(lambda: main.show_results("BENCH", scores, times,
+                                                          highest_score, average_time), min_time)
+        results.append(_result("show_results", seconds, games=num_games))
+    return results
+
+def bench_save(sizes, store_types, min_time=0.2):
+    """
+    Times save_to_file writing one player's games into each kind of store
+    """
+    results = []
+    for store_type in store_types:
+        for num_games in sizes:
+            scores, times = make_history(num_games)
+            highest_score = main.find_highest_score(scores)
+            average_time = main.calculate_average_time(times)
+            with _temp_store(store_type):
+                seconds = time_call(lambda: main.save_to_file("BENCH", scores, times, highest_score,
+                                                              average_time, quiet=True), min_time)
+            results.append(_result("save_to_file", seconds, games=num_games, store=store_type))
+    return results
+
+def fill_store(store, num_players, games_per_player=5):
+    """
+    Saves num_players players with a few games each
+    Returns the list of player IDs
+    """
+    player_ids = [f"P{number}" for number in range(num_players)]
+    with store.batch():
+        for number, player_id in enumerate(player_ids):
+            scores, times = make_history(games_per_player, seed=number)
+            store.save_player(player_id, scores, times, max(scores), round(sum(times) / len(times), 2))
+    return player_ids
+
+def bench_show_saved_stats(sizes, store_types, min_time=0.2):
+    """
+    Times show_saved_stats looking players up in stores of different sizes
+    A different player is asked for each time, like a queue at the club desk
+    """
+    results = []
+    for store_type in store_types:
+        for num_players in sizes:
+            with _temp_store(store_type) as store:
+                player_ids = fill_store(store, num_players)
+                rng = random.Random(num_players)
+                # show_saved_stats asks for a player ID and then waits for Enter
+                pending = []
+
+                def fake_input(prompt=""):
+                    if pending:
+                        return pending.pop()
+                    pending.append("")
+                    return rng.choice(player_ids)
+
+                with patch('builtins.input', fake_input), _quiet():
+                    seconds = time_call(main.show_saved_stats, min_time)
+            results.append(_result("show_saved_stats", seconds, players=num_players, store=store_type))
+    return results
+
+def bench_rollup_queries(sizes, min_time=0.2, games_per_save=100):
+    """
+    Times asking for a player's highest score and average time this week
+    from the rollups, and the same question answered by going back over
+    every stamped game, as the history grows
+    Games are saved games_per_save at a time, a few hours apart
+    """
+    results = []
+    for num_games in sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            rollups = Rollups(os.path.join(folder, "rollups.db"))
+            scores, times = make_history(num_games)
+            when = 1700000000.0
+            for start in range(0, num_games, games_per_save):
+                rollups.add_games("P1", scores[start:start + games_per_save],
+                                  times[start:start + games_per_save], when)
+                when += 4 * 3600
+
+            week = bucket_keys(when)["week"]
+            rollup_seconds = time_call(lambda: rollups.totals_for_bucket("week", week, "P1"), min_time)
+
+            # The same week worked out as a range of times to scan for
+            moment = datetime.datetime.fromtimestamp(when)
+            week_start = (moment - datetime.timedelta(days=moment.weekday())).replace(
+                hour=0, minute=0, second=0, microsecond=0)
+            week_end = week_start + datetime.timedelta(days=7)
+
+            def rescan():
+                return rollups.connection.execute(
+                    "SELECT COUNT(*), MAX(score), SUM(time) FROM game_stamps"
+                    " WHERE player_id = ? AND recorded_at >= ? AND recorded_at < ?",
+                    ("P1", week_start.timestamp(), week_end.timestamp())).fetchone()
+
+            rescan_seconds = time_call(rescan, min_time)
+            rollups.close()
+        results.append(_result("rollup_query", rollup_seconds, games=num_games))
+        results.append(_result("rescan_query", rescan_seconds, games=num_games))
+    return results
+
+def bench_follow(events_per_second=10000, seconds=3.0, num_players=1000, store_type="sqlite"):
+    """
+    Times how long games take to be saved in live mode
+    A writer thread adds events to a JSONL log at events_per_second for
+    the given seconds while follow saves them into a temporary store
+    Returns a dictionary with the events saved, the rate they were saved at
+    and the latency (median, 99th percentile and worst) from being written
+    to being saved
+    """
+    with tempfile.TemporaryDirectory() as folder, _temp_store(store_type) as store:
+        log_path = os.path.join(folder, "events.jsonl")
+        open(log_path, 'w').close()
+        follower = follow.LogFollower(log_path)
+        rng = random.Random(1)
+        total = int(events_per_second * seconds)
+        written_counts = []  # events written so far after each write
+        written_times = []   # when each of those writes finished
+        done = threading.Event()
+
+        def write_events():
+            # Events are written every millisecond, like lots of machines at once
+            per_write = max(1, events_per_second // 1000)
+            started = timer.perf_counter()
+            written = 0
+            with open(log_path, 'a') as log:
+                while written < total:
+                    lines = []
+                    for _ in range(min(per_write, total - written)):
+                        lines.append(json.dumps({"player_id": f"P{rng.randrange(num_players)}",
+                                                 "score": rng.randint(0, 1000000),
+                                                 "time": round(rng.uniform(1, 1440), 2)}) + "\n")
+                    log.write("".join(lines))
+                    log.flush()
+                    written += len(lines)
+                    written_counts.append(written)
+                    written_times.append(timer.perf_counter())
+                    # Keep to the rate, catching up if a write was late
+                    delay = started + written / events_per_second - timer.perf_counter()
+                    if delay > 0:
+                        timer.sleep(delay)
+
+        latencies = []
+        saved = [0]
+
+        def on_batch(games, batch_seconds):
+            now = timer.perf_counter()
+            first = saved[0]
+            saved[0] += sum(len(scores) for scores, _ in games.values())
+            # Every write this batch finished is saved now, so its latency
+            # is how long ago the write happened
+            start = bisect.bisect_right(written_counts, first)
+            end = bisect.bisect_left(written_counts, saved[0])
+            for index in range(start, min(end + 1, len(written_counts))):
+                latencies.append(now - written_times[index])
+            if saved[0] >= total:
+                done.set()
+
+        def save_games(games):
+            # The same way main.follow_log saves them
+            with main.saving_players(games):
+                for player_id, (scores, times) in games.items():
+                    main.add_locked_games(player_id, scores, times)
+            main.get_rollups().add_many(games)
+
+        writer = threading.Thread(target=write_events)
+        started = timer.perf_counter()
+        writer.start()
+        report = ingest.new_report()
+        # Stop if saving falls too far behind rather than waiting forever
+        follow.follow(follower, save_games, report, on_batch,
+                      lambda: done.is_set() or timer.perf_counter() - started > seconds * 10)
+        taken = timer.perf_counter() - started
+        writer.join()
+        follower.close()
+
+    latencies.sort()
+    return {"store": store_type, "events": saved[0], "events_per_second": saved[0] / taken,
+            "median_latency": statistics.median(latencies) if latencies else None,
+            "p99_latency": latencies[int(len(latencies) * 0.99)] if latencies else None,
+            "worst_latency": latencies[-1] if latencies else None}
+
+def bench_range_queries(sizes, min_time=0.2):
+    """
+    Times finding the players with a highest score in a narrow range (about
+    0.1% of players) and an average time under 60 minutes, using the
+    leaderboard's sorted lists and by checking every player's stats in turn
+    The leaderboard answers from its snapshot file while the scan gets
+    every player's stats already in memory, which is the best a scan could
+    ever do (a real one has to open every report too)
+    """
+    results = []
+    for num_players in sizes:
+        rng = random.Random(num_players)
+        entries = {}
+        for number in range(num_players):
+            games = rng.randint(1, 200)
+            average = round(rng.uniform(1, 120), 2)
+            entries[f"P{number}"] = (rng.randint(0, 1000000), average, games, average * games)
+        ranges = {"score": (500000, 501000), "time": (None, 60.0)}
+        positions = [(INDEX_FIELDS.index(field), low, high) for field, (low, high) in ranges.items()]
+
+        def scan():
+            return [player_id for player_id, entry in entries.items()
+                    if all((low is None or entry[position] >= low) and (high is None or entry[position] <= high)
+                           for position, low, high in positions)]
+
+        with tempfile.TemporaryDirectory() as folder:
+            leaderboard = Leaderboard(None, os.path.join(folder, "leaderboard.log"))
+            leaderboard.rebuild(entries)
+            results.append(_result("range_query", time_call(lambda: leaderboard.find(ranges), min_time),
+                                   players=num_players))
+            leaderboard.close()
+        results.append(_result("range_scan", time_call(scan, min_time), players=num_players))
+    return results
+
+def run_benchmarks(game_sizes=DEFAULT_SIZES, player_sizes=DEFAULT_SIZES,
+                   store_types=storage.STORE_TYPES, min_time=0.2):
+    """
+    Runs every timing benchmark
+    Returns the run as a dictionary ready to be saved as JSON
+    """
+    started = timer.time()
+    results = []
+    results += bench_stats(game_sizes, min_time)
+    results += bench_show_results(game_sizes, min_time)
+    results += bench_save(game_sizes, store_types, min_time)
+    results += bench_show_saved_stats(player_sizes, store_types, min_time)
+    results += bench_rollup_queries(game_sizes, min_time)
+    results += bench_range_queries(player_sizes, min_time)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "started": started,
+        "seconds_taken": timer.time() - started,
+        "results": results,
+    }
+
+def _result_key(result):
+    return (result["name"], result["store"], result["games"], result["players"])
+
+def compare_runs(old_run, new_run, threshold=DEFAULT_THRESHOLD):
+    """
+    Finds the benchmarks that got slower between two runs
+    Best times are compared, as they are the least upset by other programs
+    Returns a list of (result, old seconds, how many times slower), slowest first
+    """
+    old_results = {_result_key(result): result for result in old_run["results"]}
+    slower = []
+    for result in new_run["results"]:
+        old = old_results.get(_result_key(result))
+        if old is None or old["best_seconds"] <= 0:
+            continue
+        ratio = result["best_seconds"] / old["best_seconds"]
+        if ratio > threshold:
+            slower.append((result, old["best_seconds"], ratio))
+    slower.sort(key=lambda item: item[2], reverse=True)
+    return slower
+
+def _describe(result):
+    size = f"{result['games']:,} games" if result["games"] is not None else f"{result['players']:,} players"
+    store = f" ({result['store']} store)" if result["store"] else ""
+    return f"{result['name']}{store} at {size}"
+
+def _sizes(text):
+    """
+    Reads a comma separated list of sizes like 10,1000,100000
+    """
+    try:
+        sizes = [int(size) for size in text.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a list of whole numbers: {text}")
+    if any(size < 1 for size in sizes):
+        raise argparse.ArgumentTypeError("sizes must be at least 1")
+    return sizes
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Times the Games Club Statistics Program")
+    parser.add_argument("--games", type=_sizes, default=DEFAULT_SIZES,
+                        help="games per player to time (default: 10,100,...,1000000)")
+    parser.add_argument("--players", type=_sizes, default=DEFAULT_SIZES,
+                        help="players in the store for show_saved_stats (default: 10,100,...,1000000)")
+    parser.add_argument("--stores", type=lambda text: text.split(","), default=storage.STORE_TYPES,
+                        help="stores to time saving and loading with (default: files,indexed,sqlite)")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="seconds to spend on each timing run (default: 0.2)")
+    parser.add_argument("--output", help="save the results to this JSON file as well as printing them")
+    parser.add_argument("--compare", help="JSON file from an earlier run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="how many times slower counts as a regression (default: 1.25)")
+    parser.add_argument("--memory", action="store_true",
+                        help="only measure the memory used by a 100,000 game history")
+    parser.add_argument("--follow", type=int, metavar="EVENTS_PER_SECOND",
+                        help="only time live mode saving this many events a second")
+    return parser
+
+def main_program(argv):
+    args = build_parser().parse_args(argv)
+
+    if args.memory:
+        list_per_game, array_per_game = bench_history_memory(100000)
+        print("Game history memory for 100,000 games:")
+        print(f"  Python lists: {list_per_game:.1f} bytes per game")
+        print(f"  Arrays:       {array_per_game:.1f} bytes per game")
+        return 0
+
+    for store_type in args.stores:
+        if store_type not in storage.STORE_TYPES:
+            print(f"Unknown store type: {store_type}", file=sys.stderr)
+            return 2
+
+    if args.follow:
+        for store_type in args.stores:
+            with _quiet():
+                result = bench_follow(args.follow, store_type=store_type)
+            print(json.dumps(result))
+        return 0
+
+    run = run_benchmarks(args.games, args.players, args.stores, args.min_time)
+    text = json.dumps(run, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + "\n")
+
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            old_run = json.load(file)
+        slower = compare_runs(old_run, run, args.threshold)
+        for result, old_seconds, ratio in slower:
+            print(f"SLOWER: {_describe(result)} took {result['best_seconds']:.6f}s, "
+                  f"was {old_seconds:.6f}s ({ratio:.2f}x)", file=sys.stderr)
+        if slower:
+            return 1
+        print(f"No benchmarks more than {args.threshold}x slower than {args.compare}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main_program(sys.argv[1:]))
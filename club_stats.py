@@ -0,0 +1,244 @@
+"""
+Club-wide statistics for the Games Club Statistics Program
+Loads every saved game into one pair of NumPy arrays (all the scores and
+all the times, one player after another) plus where each player starts,
+so every number is worked out for all players at once instead of one
+Python list at a time
+
+Needs NumPy (pip install numpy), the rest of the program doesn't
+"""
+
+from array import array
+
+import numpy as np
+
+from summary import COMPENSATED_SUM
+
+# Players with more games than this are added up one at a time by sequential_sums
+SHORT_GAMES = 64
+
+
+class ClubGames:
+    """
+    Every saved game for every player in contiguous arrays
+    Player number i's games are scores[starts[i]:starts[i] + counts[i]]
+    (and the same slice of times)
+    """
+
+    def __init__(self, player_ids, counts, scores, times):
+        self.player_ids = list(player_ids)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.starts = np.zeros(len(self.counts), dtype=np.int64)
+        if len(self.counts) > 1:
+            np.cumsum(self.counts[:-1], out=self.starts[1:])
+        self.scores = np.asarray(scores, dtype=np.int64)
+        self.times = np.asarray(times, dtype=np.float64)
+
+    @classmethod
+    def from_players(cls, players):
+        """
+        Builds the arrays from (player_id, scores, times) tuples
+        """
+        player_ids = []
+        counts = array('q')
+        scores = array('i')
+        times = array('d')
+        for player_id, player_scores, player_times in players:
+            player_ids.append(player_id)
+            counts.append(len(player_scores))
+            scores.extend(player_scores)
+            times.extend(player_times)
+        return cls(player_ids, np.frombuffer(counts, dtype=np.int64),
+                   np.frombuffer(scores, dtype=np.intc), np.frombuffer(times, dtype=np.float64))
+
+    def player_numbers(self):
+        """
+        Returns which player each game belongs to, e.g. [0, 0, 1, 2, 2, 2]
+        """
+        return np.repeat(np.arange(len(self.counts)), self.counts)
+
+
+def load_club_games(store):
+    """
+    Reads every player in the store into a ClubGames
+    Players are sorted by ID so the result is the same for every store
+    """
+    def players():
+        for player_id in sorted(store.player_ids()):
+            scores, times = store.load_games(player_id)
+            yield player_id, scores, times
+
+    return ClubGames.from_players(players())
+
+
+def sequential_sums(values, starts, counts, short_games=SHORT_GAMES):
+    """
+    Adds up each player's values in game order, the same way Python's sum()
+    does (compensated like summary.add_to_total on Python 3.12 and newer)
+    so the totals match sum(times) exactly, not just nearly
+    Players with up to short_games games are worked on all at once: step j
+    adds game j for every one of them who has at least j + 1 games
+    Longer histories are each added up by sum() in one go, so one player
+    with a huge number of games doesn't mean a huge number of steps
+    (np.add.reduceat would be quicker still but rounds differently)
+    """
+    totals = np.zeros(len(counts), dtype=np.float64)
+    compensation = np.zeros(len(counts), dtype=np.float64)
+    long_players = np.flatnonzero(counts > short_games)
+    active = np.flatnonzero((counts > 0) & (counts <= short_games))
+    step = 0
+
+    while len(active) > 0:
+        value = values[starts[active] + step]
+        total = totals[active]
+        new_total = total + value
+        if COMPENSATED_SUM:
+            big_total = np.abs(total) >= np.abs(value)
+            compensation[active] += np.where(big_total,
+                                             (total - new_total) + value,
+                                             (value - new_total) + total)
+        totals[active] = new_total
+        step += 1
+        active = active[counts[active] > step]
+
+    # There can only be len(values) / short_games of these
+    for player, start, count in zip(long_players.tolist(), starts[long_players].tolist(),
+                                    counts[long_players].tolist()):
+        totals[player] = sum(values[start:start + count].tolist())
+
+    return totals + compensation
+
+
+def _segment_reduce(ufunc, values, games, empty_value):
+    """
+    Runs a reduceat over each player's games, giving empty_value to players
+    with no games (reduceat can't handle empty slices on its own)
+    """
+    result = np.full(len(games.counts), empty_value, dtype=values.dtype)
+    has_games = games.counts > 0
+    if has_games.any():
+        result[has_games] = ufunc.reduceat(values, games.starts[has_games])
+    return result
+
+
+def player_stats(games):
+    """
+    Works out every player's stats at once
+    Returns a dictionary of arrays in the same order as games.player_ids
+    highest_score and average_time match find_highest_score and
+    calculate_average_time in main.py exactly, including the rounding
+    """
+    counts = games.counts
+    has_games = counts > 0
+    safe_counts = np.where(has_games, counts, 1)
+
+    highest_scores = _segment_reduce(np.maximum, games.scores, games, 0)
+    total_times = sequential_sums(games.times, games.starts, counts)
+    total_scores = _segment_reduce(np.add, games.scores, games, 0)
+
+    # Python's round() is used (not np.round) because it rounds the exact
+    # decimal value, which is what calculate_average_time gives
+    mean_times = np.where(has_games, total_times / safe_counts, 0.0)
+    average_times = np.array([round(mean, 2) for mean in mean_times.tolist()], dtype=np.float64)
+
+    # Spread of scores and times, using each game's distance from its
+    # player's mean so big numbers don't lose precision
+    player_numbers = games.player_numbers()
+    mean_scores = np.where(has_games, total_scores / safe_counts, 0.0)
+    score_gaps = games.scores - mean_scores[player_numbers]
+    time_gaps = games.times - mean_times[player_numbers]
+    score_std = np.sqrt(_segment_reduce(np.add, score_gaps * score_gaps, games, 0.0) / safe_counts)
+    time_std = np.sqrt(_segment_reduce(np.add, time_gaps * time_gaps, games, 0.0) / safe_counts)
+
+    score_per_minute = np.divide(total_scores, total_times,
+                                 out=np.zeros(len(counts)), where=total_times > 0)
+
+    return {
+        "games": counts,
+        "highest_score": highest_scores,
+        "average_time": average_times,
+        "total_time": total_times,
+        "score_std": score_std,
+        "time_std": time_std,
+        "score_per_minute": score_per_minute,
+    }
+
+
+def player_percentiles(games, values, percentiles):
+    """
+    Works out percentiles of each player's values (e.g. games.scores)
+    Returns an array with one row per player and one column per percentile,
+    using the same linear method as np.percentile
+    Players with no games get NaN
+    """
+    percentiles = np.asarray(percentiles, dtype=np.float64)
+    result = np.full((len(games.counts), len(percentiles)), np.nan)
+    if len(values) == 0:
+        return result
+
+    # Sort by player first and value second so each player's values end up
+    # sorted in their own slice of the array
+    player_numbers = games.player_numbers()
+    sorted_values = values[np.lexsort((values, player_numbers))]
+
+    has_games = np.flatnonzero(games.counts > 0)
+    starts = games.starts[has_games][:, None]
+    last = (games.counts[has_games] - 1)[:, None]
+    positions = percentiles[None, :] / 100 * last
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, last)
+    fraction = positions - lower
+
+    low_values = sorted_values[starts + lower]
+    high_values = sorted_values[starts + upper]
+    result[has_games] = low_values + (high_values - low_values) * fraction
+    return result
+
+
+def top_players(games, count=10, percentiles=(50, 90)):
+    """
+    Finds the players with the most points per minute
+    Returns a list of (player_id, games, points per minute, highest score,
+    score percentiles), best first
+    """
+    stats = player_stats(games)
+    score_percentiles = player_percentiles(games, games.scores, percentiles)
+    best = np.argsort(-stats["score_per_minute"], kind="stable")[:count]
+    return [(games.player_ids[player], int(stats["games"][player]),
+             float(stats["score_per_minute"][player]), int(stats["highest_score"][player]),
+             score_percentiles[player].tolist())
+            for player in best.tolist() if stats["games"][player] > 0]
+
+
+def club_stats(games, percentiles=(25, 50, 75, 90, 99), bins=10):
+    """
+    Works out the numbers for the whole club in one go
+    Returns a dictionary with the totals, percentiles of every game's score
+    and time, their standard deviations, points per minute and a histogram
+    of scores as (counts, bin_edges)
+    The total time is added up in game order like calculate_average_time,
+    so with one player the average is exactly the same
+    """
+    total_games = len(games.scores)
+    result = {
+        "players": len(games.player_ids),
+        "games": total_games,
+        "percentiles": list(percentiles),
+    }
+    if total_games == 0:
+        return result
+
+    # np.sum adds in pairs, which can round differently to sum()
+    total_time = sum(games.times.tolist())
+    result.update({
+        "highest_score": int(games.scores.max()),
+        "average_time": round(total_time / total_games, 2),
+        "total_time": total_time,
+        "score_percentiles": np.percentile(games.scores, percentiles),
+        "time_percentiles": np.percentile(games.times, percentiles),
+        "score_std": float(games.scores.std()),
+        "time_std": float(games.times.std()),
+        "score_per_minute": float(games.scores.sum()) / total_time,
+        "score_histogram": np.histogram(games.scores, bins=bins),
+    })
+    return result
@@ -0,0 +1,280 @@
+"""
+Columnar export for the Games Club Statistics Program
+Writes every saved game into a folder of binary columns, so analysts can
+scan all the scores and times without reading any reports
+
+The folder holds:
+    scores.npy      one int32 score per game
+    times.npy       one float64 time (minutes) per game
+    players.npy     one int32 per game, the line in player_ids.txt the game
+                    belongs to, or -1 if the game has been replaced by a
+                    newer export of that player (skip those rows)
+    player_ids.txt  one player ID per line, line 0 first
+    manifest.json   where each player's rows are and the store version they
+                    came from, used to only export players that have changed
+
+The .npy files are NumPy's own format (version 1.0, little-endian, one
+dimension), so numpy.load(path, mmap_mode='r') opens them without reading
+them into memory. Every header is exactly HEADER_SIZE bytes, so other
+programs can also map them directly, e.g.
+numpy.memmap(path, dtype='<i4', mode='r', offset=128)
+
+Exporting again only adds the rows of players saved since the last export
+to the end of the columns and marks their old rows -1 in players.npy. Once
+there are more replaced rows than current ones the folder is written again
+from scratch
+"""
+
+import ast
+import json
+import os
+import shutil
+import sys
+from array import array
+
+import locks
+import storage
+
+# Bytes before the first value in every column file
+HEADER_SIZE = 128
+
+# Each column's file name, array type code and NumPy type
+COLUMNS = {
+    "scores": ("scores.npy", 'i', '<i4'),
+    "times": ("times.npy", 'd', '<f8'),
+    "players": ("players.npy", 'i', '<i4'),
+}
+
+DEAD_ROW = -1
+
+def _header(descr, rows):
+    """
+    Makes a .npy header for a one dimensional column, padded to HEADER_SIZE
+    """
+    text = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({rows},), }}"
+    # Magic string, version 1.0 and the header length take up 10 bytes
+    text = text.ljust(HEADER_SIZE - 10 - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + len(text).to_bytes(2, 'little') + text.encode('latin1')
+
+def read_header(path):
+    """
+    Reads a column's header
+    Returns (NumPy type, number of rows)
+    """
+    with open(path, 'rb') as file:
+        start = file.read(HEADER_SIZE)
+    if start[:8] != b"\x93NUMPY\x01\x00" or len(start) < HEADER_SIZE:
+        raise ValueError(f"{path} isn't an exported column")
+    header = ast.literal_eval(start[10:].decode('latin1'))
+    return header["descr"], header["shape"][0]
+
+def _little_endian(values):
+    """
+    Returns the values ready to be written as little-endian bytes
+    """
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+def load_column(path):
+    """
+    Reads a whole column into an array ('i' or 'd')
+    Fine for small exports, big ones are better opened with numpy.load(mmap_mode='r')
+    """
+    descr, rows = read_header(path)
+    values = array('i' if descr == '<i4' else 'd')
+    with open(path, 'rb') as file:
+        file.seek(HEADER_SIZE)
+        values.fromfile(file, rows)
+    return _little_endian(values)
+
+
+class ColumnExport:
+    """
+    An export folder and its manifest
+    """
+
+    def __init__(self, folder="export"):
+        self.folder = folder
+        self.manifest_path = os.path.join(folder, "manifest.json")
+        self.rows = 0
+        self.dead_rows = 0
+        self.players = {}      # player ID -> {"index", "start", "count", "version"}
+        self.player_ids = []   # the lines of player_ids.txt
+        self.pending_dead = [] # (start, count) still to be marked -1
+        self._load()
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def _load(self):
+        """
+        Reads the manifest and puts the folder back the way it describes,
+        in case the last export was stopped part way
+        """
+        try:
+            with open(self.manifest_path, 'r') as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            return
+
+        self.rows = manifest["rows"]
+        self.dead_rows = manifest["dead_rows"]
+        self.players = manifest["players"]
+        self.player_ids = [None] * len(self.players)
+        for player_id, entry in self.players.items():
+            self.player_ids[entry["index"]] = player_id
+        self.pending_dead = [tuple(rows) for rows in manifest.get("pending_dead", [])]
+
+        with open(self.path("player_ids.txt"), 'r', encoding='utf-8') as file:
+            saved_ids = file.read().splitlines()
+        if saved_ids != self.player_ids:
+            storage.write_atomically(self.path("player_ids.txt"),
+                                     "".join(player_id + "\n" for player_id in self.player_ids))
+
+        # Rows added after the manifest was last saved don't count yet
+        for name, typecode, descr in COLUMNS.values():
+            with open(self.path(name), 'r+b') as file:
+                file.truncate(HEADER_SIZE + self.rows * array(typecode).itemsize)
+                file.write(_header(descr, self.rows))
+        self._mark_dead()
+
+    def _save_manifest(self):
+        manifest = {"rows": self.rows, "dead_rows": self.dead_rows, "players": self.players,
+                    "pending_dead": self.pending_dead}
+        storage.write_atomically(self.manifest_path, json.dumps(manifest) + "\n")
+
+    def _mark_dead(self):
+        """
+        Sets the player column to -1 for every row in pending_dead
+        Doing it again after a crash does no harm
+        """
+        if not self.pending_dead:
+            return
+        with open(self.path("players.npy"), 'r+b') as file:
+            for start, count in self.pending_dead:
+                file.seek(HEADER_SIZE + start * 4)
+                file.write(_little_endian(array('i', [DEAD_ROW] * count)).tobytes())
+        self.pending_dead = []
+        self._save_manifest()
+
+    def _start_folder(self):
+        """
+        Makes a new empty export
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        for name, _, descr in COLUMNS.values():
+            with open(self.path(name), 'wb') as file:
+                file.write(_header(descr, 0))
+        open(self.path("player_ids.txt"), 'w').close()
+        self._save_manifest()
+
+    def update(self, store):
+        """
+        Exports every player saved in the store since the last update
+        Returns how many players were written
+        """
+        if not os.path.exists(self.manifest_path):
+            self._start_folder()
+
+        player_ids = store.player_ids()
+        changed = []
+        for player_id in player_ids:
+            # Versions go through JSON so they compare the same as the saved ones
+            version = json.loads(json.dumps(store.version(player_id)))
+            entry = self.players.get(player_id)
+            if entry is None or entry["version"] != version:
+                changed.append((player_id, version))
+        # Players no longer in the store (their version is None once their rows are gone)
+        saved = set(player_ids)
+        gone = [player_id for player_id, entry in self.players.items()
+                if player_id not in saved and entry["version"] is not None]
+
+        files = {column: open(self.path(name), 'r+b') for column, (name, _, _) in COLUMNS.items()}
+        try:
+            for file in files.values():
+                file.seek(0, os.SEEK_END)
+            with open(self.path("player_ids.txt"), 'a', encoding='utf-8') as ids_file:
+                for player_id, version in changed:
+                    try:
+                        scores, times = store.load_games(player_id)
+                    except FileNotFoundError:
+                        continue
+                    entry = self.players.get(player_id)
+                    if entry is None:
+                        entry = {"index": len(self.player_ids)}
+                        self.player_ids.append(player_id)
+                        ids_file.write(player_id + "\n")
+                    else:
+                        self.pending_dead.append((entry["start"], entry["count"]))
+                        self.dead_rows += entry["count"]
+
+                    _little_endian(scores).tofile(files["scores"])
+                    _little_endian(times).tofile(files["times"])
+                    _little_endian(array('i', [entry["index"]]) * len(scores)).tofile(files["players"])
+                    entry.update(start=self.rows, count=len(scores), version=version)
+                    self.players[player_id] = entry
+                    self.rows += len(scores)
+
+            for player_id in gone:
+                entry = self.players[player_id]
+                self.pending_dead.append((entry["start"], entry["count"]))
+                self.dead_rows += entry["count"]
+                entry.update(count=0, version=None)
+
+            for column, (_, _, descr) in COLUMNS.items():
+                files[column].seek(0)
+                files[column].write(_header(descr, self.rows))
+        finally:
+            for file in files.values():
+                file.close()
+
+        # The new rows only count once the manifest says so
+        self._save_manifest()
+        self._mark_dead()
+        if self.dead_rows > self.rows - self.dead_rows:
+            self.rebuild(store)
+        return len(changed)
+
+    def rebuild(self, store):
+        """
+        Writes the whole export again from scratch, without any replaced rows
+        The new export is made next to the old one and swapped in at the end
+        """
+        new_folder = self.folder.rstrip(os.sep) + ".new"
+        shutil.rmtree(new_folder, ignore_errors=True)
+        fresh = ColumnExport(new_folder)
+        fresh.update(store)
+
+        old_folder = self.folder.rstrip(os.sep) + ".old"
+        shutil.rmtree(old_folder, ignore_errors=True)
+        if os.path.exists(self.folder):
+            os.rename(self.folder, old_folder)
+        os.rename(new_folder, self.folder)
+        shutil.rmtree(old_folder, ignore_errors=True)
+
+        fresh.folder = self.folder
+        fresh.manifest_path = self.manifest_path
+        self.__dict__.update(fresh.__dict__)
+
+
+def export_games(store, folder="export", rebuild=False):
+    """
+    Brings the export in folder up to date with the store
+    Only one program can export into a folder at a time
+    Returns (players written, rows in the export, replaced rows)
+    """
+    real_folder = os.path.abspath(folder)
+    with locks.file_lock(locks.lock_path(os.path.dirname(real_folder), "export.lock")):
+        # A rebuild stopped between swapping the folders leaves only the new one
+        if not os.path.exists(folder) and os.path.exists(folder.rstrip(os.sep) + ".new"):
+            os.rename(folder.rstrip(os.sep) + ".new", folder)
+
+        export = ColumnExport(folder)
+        if rebuild:
+            export.rebuild(store)
+            written = len(export.players)
+        else:
+            written = export.update(store)
+        return written, export.rows, export.dead_rows
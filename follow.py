@@ -0,0 +1,193 @@
+"""
+Live mode for the Games Club Statistics Program
+Follows a JSONL log that arcade machines add game results to (one
+{"player_id": ..., "score": ..., "time": ...} per line) and saves each new
+game to the player's report and running summary as soon as it shows up
+
+The log is checked for new lines every few milliseconds. Checking is one
+stat and one read, so it costs next to nothing while the log is quiet.
+New lines are saved as soon as they're read, and everything added while
+one batch is being saved is read and saved together as the next batch, so
+the busier the log the more games each save covers and a busy player is
+saved once per batch instead of once per game.
+
+With the SQLite store each save only writes the new games, which keeps up
+with 10,000 games a second with well under 50 ms from a line being added
+to its player's stats being saved (python benchmarks.py --follow 10000).
+The files and indexed stores write the player's whole report every time,
+so each save takes longer the more games the player has and they fall
+behind well before that.
+If the log is rotated (renamed and a new one started) the rest of the old
+file is read before moving on to the new one, and if it is cut back to
+nothing it is read again from the start
+"""
+
+import io
+import os
+import time as timer
+
+import ingest
+
+# Seconds between checks for new lines
+POLL_INTERVAL = 0.005
+
+# Lines read in one go are saved together, up to this many at a time
+MAX_BATCH_LINES = 5000
+
+# How long to keep gathering lines before saving them, in seconds. Lines
+# already gather while the last batch is being saved, so waiting any
+# longer only adds to the time before they're saved
+BATCH_INTERVAL = 0
+
+
+class LogFollower:
+    """
+    Hands out the complete lines added to a log file since the last look
+    """
+
+    def __init__(self, path, from_start=False):
+        self.path = path
+        self.file = None
+        self.inode = None
+        self._partial = b""  # the start of a line that is still being written
+        self._open(from_start)
+
+    def _open(self, from_start):
+        """
+        Opens the log if it's there, at the start or at the end
+        """
+        try:
+            self.file = open(self.path, 'rb')
+        except FileNotFoundError:
+            self.file = None
+            return
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self._partial = b""
+        if not from_start:
+            self.file.seek(0, os.SEEK_END)
+
+    def _read(self, max_bytes=-1):
+        """
+        Reads whatever has been added to the open file
+        Returns the complete lines
+        """
+        data = self._partial + self.file.read(max_bytes)
+        lines = data.split(b"\n")
+        self._partial = lines.pop()
+        return lines
+
+    def read_lines(self, max_bytes=1 << 20):
+        """
+        Returns the complete lines added since the last call, maybe none
+        At most about max_bytes are read at once so a huge backlog is
+        handed out a piece at a time
+        """
+        if self.file is None:
+            # A log that didn't exist yet is new, so all of it is wanted
+            self._open(from_start=True)
+            if self.file is None:
+                return []
+
+        lines = self._read(max_bytes)
+        if lines:
+            return lines
+
+        try:
+            details = os.stat(self.path)
+        except FileNotFoundError:
+            # Rotated and the new log isn't there yet, keep reading the old one
+            return lines
+
+        if details.st_ino != self.inode:
+            # Rotated, so finish the old file before starting the new one
+            lines += self._read()
+            if self._partial:
+                # The old file won't get any more, so its last line is complete
+                lines.append(self._partial)
+            self.file.close()
+            self._open(from_start=True)
+            return lines
+
+        if details.st_size < self.file.tell():
+            # Cut back (e.g. copytruncate), so start again from the top
+            self.file.seek(0)
+            self._partial = b""
+        return lines
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def parse_events(lines, report, quarantine=None):
+    """
+    Checks each line with the same rules as ingest and groups the games by
+    player, keeping the order they were played in
+    Returns {player_id: (scores, times)}
+    report (see ingest.new_report) counts every line and every bad one,
+    keeping the messages for the first few bad ones in report["examples"]
+    and counting the bad ones by problem in report["errors"]
+    Bad lines are written to quarantine (an open text file) if it's given,
+    numbered from the first line followed
+    """
+    text = io.StringIO(b"\n".join(lines).decode('utf-8', errors='replace'))
+    batch_report = ingest.new_report()
+    games = {}
+    records = ingest.read_jsonl_records(text)
+    for _, player_id, score, time in ingest.validate_records(records, batch_report, quarantine,
+                                                             first_row=report["rows"] + 1):
+        scores, times = games.setdefault(player_id, ([], []))
+        scores.append(score)
+        times.append(time)
+    report["rows"] += batch_report["rows"]
+    report["rejected"] += batch_report["rejected"]
+    examples = report.setdefault("examples", [])
+    for _, message in batch_report["examples"][:ingest.REJECTED_EXAMPLES - len(examples)]:
+        examples.append(message)
+    errors = report.setdefault("errors", {})
+    for name, count in batch_report["errors"].items():
+        errors[name] = errors.get(name, 0) + count
+    return games
+
+def follow(follower, save_games, report, on_batch=None, should_stop=None, poll_interval=POLL_INTERVAL,
+           batch_interval=BATCH_INTERVAL, quarantine=None):
+    """
+    Saves the games from every new line until should_stop() says to stop
+    (or forever, if it isn't given)
+    Lines are gathered until the log goes quiet, batch_interval seconds
+    have passed since the first one or there are MAX_BATCH_LINES of them,
+    then each player in them is saved once. With batch_interval at 0 they
+    are saved as soon as they're read
+    save_games(games) is given each batch as {player_id: (scores, times)}
+    on_batch(games, seconds) is called after each batch is saved, with the
+    time it took
+    Bad lines are written to quarantine if it's given (see parse_events)
+    """
+    pending = []
+    first_read = 0.0
+    while should_stop is None or not should_stop():
+        lines = follower.read_lines()
+        if lines and not pending:
+            first_read = timer.perf_counter()
+        pending.extend(lines)
+        if pending and (not lines or len(pending) >= MAX_BATCH_LINES
+                        or timer.perf_counter() - first_read >= batch_interval):
+            _save_lines(pending, save_games, report, on_batch, quarantine)
+            pending = []
+        elif not lines:
+            timer.sleep(poll_interval)
+        else:
+            # More lines are probably on the way, so wait for them to gather
+            timer.sleep(min(poll_interval, batch_interval))
+    # Don't lose the lines already read when stopping
+    _save_lines(pending, save_games, report, on_batch, quarantine)
+
+def _save_lines(lines, save_games, report, on_batch, quarantine):
+    for start in range(0, len(lines), MAX_BATCH_LINES):
+        batch_start = timer.perf_counter()
+        games = parse_events(lines[start:start + MAX_BATCH_LINES], report, quarantine)
+        if games:
+            save_games(games)
+        if on_batch is not None:
+            on_batch(games, timer.perf_counter() - batch_start)
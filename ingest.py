@@ -0,0 +1,153 @@
+"""
+Bulk ingestion for the Games Club Statistics Program
+Reads game results from a CSV or JSONL file (or stdin) one row at a time
+so huge tournament exports never have to fit in memory
+
+Every row needs a player_id, a score and a time, for example:
+    player_id,score,time
+    PLAYER001,1500,25.5
+or
+    {"player_id": "PLAYER001", "score": 1500, "time": 25.5}
+"""
+
+import csv
+import itertools
+import json
+import sys
+from array import array
+
+import validation
+
+# How many players are saved together in one batch (one transaction for
+# the SQLite store) while importing
+CHUNK_PLAYERS = 500
+
+# How many rows are checked together while importing
+VALIDATE_ROWS = 10000
+
+# How many bad rows are kept in a report to show, the rest are only counted
+REJECTED_EXAMPLES = 10
+
+def new_report():
+    """
+    Returns an empty report for validate_records
+    """
+    return {"rows": 0, "rejected": 0, "examples": [], "errors": {}}
+
+def guess_format(path):
+    """
+    Works out if a file is CSV or JSONL from its name
+    Anything that isn't .jsonl/.ndjson/.json is treated as CSV
+    """
+    if path.lower().endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    return "csv"
+
+def read_csv_records(file):
+    """
+    Yields one dictionary per CSV row
+    The first line must be a header naming the player_id, score and time columns
+    """
+    for row in csv.DictReader(file):
+        yield row
+
+def read_jsonl_records(file):
+    """
+    Yields one dictionary per line of a JSONL file
+    Blank lines are skipped, broken lines are passed on as empty records
+    so they get reported as bad rows instead of stopping the import
+    """
+    for line in file:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = {}
+        if not isinstance(record, dict):
+            record = {}
+        yield record
+
+def read_records(file, file_format):
+    """
+    Picks the right reader for the file format ("csv" or "jsonl")
+    """
+    if file_format == "jsonl":
+        return read_jsonl_records(file)
+    return read_csv_records(file)
+
+def validate_records(records, report, quarantine=None, first_row=1):
+    """
+    Checks every record with the same rules the menu uses
+    Records are checked VALIDATE_ROWS at a time, a column at a time, with
+    validation.validate_batch
+    Yields (row_number, player_id, score, time) for the good rows
+    report (see new_report) gets a count of every row read and every bad
+    one, (row_number, message) for the first REJECTED_EXAMPLES bad rows in
+    report["examples"] and report["errors"] counts the bad rows by problem
+    (e.g. {"score_negative": 3}), so a huge file of bad rows can't fill the memory
+    Bad records are written straight to quarantine (an open text file) if
+    given, one JSON line each, so they can be fixed and imported again
+    Rows are numbered from first_row
+    """
+    errors = report.setdefault("errors", {})
+    examples = report.setdefault("examples", [])
+    for batch in chunks(records, VALIDATE_ROWS):
+        # Values are turned into text first so 12.5 as a score is
+        # rejected the same way as typing "12.5" at the prompt would be
+        codes, cleaned = validation.validate_batch({
+            "player_id": [record.get("player_id") or "" for record in batch],
+            "score": [str(record.get("score")) for record in batch],
+            "time": [str(record.get("time")) for record in batch],
+        })
+        report["rows"] += len(batch)
+
+        rows = zip(itertools.count(first_row), codes, cleaned["player_id"], cleaned["score"], cleaned["time"])
+        for row_number, code, player_id, score, time in rows:
+            if not code:
+                yield row_number, player_id, score, time
+                continue
+            name, message = validation.ERRORS[code]
+            report["rejected"] += 1
+            if len(examples) < REJECTED_EXAMPLES:
+                examples.append((row_number, message))
+            errors[name] = errors.get(name, 0) + 1
+            if quarantine is not None:
+                quarantine.write(json.dumps({"row": row_number, "error": name, "message": message,
+                                             "record": batch[row_number - first_row]}) + "\n")
+        first_row += len(batch)
+
+def group_by_player(rows):
+    """
+    Groups rows for the same player that sit next to each other
+    Yields (player_id, scores, times) so only one player's games are
+    held in memory at a time
+    """
+    for player_id, player_rows in itertools.groupby(rows, key=lambda row: row[1]):
+        scores = array('i')
+        times = array('d')
+        for row in player_rows:
+            scores.append(row[2])
+            times.append(row[3])
+        yield player_id, scores, times
+
+def chunks(items, size):
+    """
+    Splits anything you can loop over into lists of up to size items
+    Only one list is held in memory at a time
+    """
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+def open_input(path):
+    """
+    Opens the file to import, or uses stdin when the path is "-"
+    """
+    if path == "-":
+        return sys.stdin
+    return open(path, 'r', newline='')
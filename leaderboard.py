@@ -0,0 +1,485 @@
+"""
+Leaderboard for the Games Club Statistics Program
+Keeps every player's highest score, average time, number of games and
+total time played in sorted order, so the top players can be read off the
+front and range questions ("highest score between 50,000 and 100,000")
+are answered with bisect without opening any reports
+
+It's saved as two files next to the store:
+    leaderboard.snapshot  every player, already sorted by each field, read
+                          through mmap so nothing has to be loaded or sorted
+                          before answering
+    leaderboard.log       the saves since the snapshot was written, one
+                          "<ID> <highest> <average> <games> <total time>"
+                          line each, where the last line for a player wins
+Once the log gets long it's merged into a new snapshot and started again
+IDs in the log are written with quote() so ones with spaces in still split
+properly, and the first line of the log is "#<generation>", matching the
+snapshot it follows on from
+"""
+
+import bisect
+import contextlib
+import heapq
+import itertools
+import mmap
+import os
+import threading
+from array import array
+from urllib.parse import quote, unquote
+
+import locks
+
+SORT_KEYS = ["score", "time"]
+
+# Everything that can be searched on, in the order it's kept in each entry
+INDEX_FIELDS = ["score", "time", "games", "total"]
+
+# Fields that are whole numbers (the snapshot keeps every value as a float)
+_WHOLE_NUMBERS = (True, False, True, False)
+
+# Sorts after every real player ID, for finding the end of a run of equal values
+_AFTER_EVERY_ID = chr(0x10FFFF)
+
+# Log lines kept before they're merged into a new snapshot
+TAIL_LINES = 5000
+
+_SNAPSHOT_MAGIC = b"LBSNAP1\n"
+
+
+class Snapshot:
+    """
+    A leaderboard snapshot file, read through mmap
+    Players are numbered by their row in the file. For each field there is
+    a list of -value, smallest first (so biggest value first), and the row
+    each one belongs to, which bisect can search straight from the file
+
+    The file is the magic line, then generation, players and ID bytes as
+    8 byte numbers, then the four value columns, then for each field its
+    sorted keys and rows, then where each ID starts and the IDs themselves
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.generation = 0
+        self.count = 0
+        self._map = None
+        self._columns = [()] * len(INDEX_FIELDS)
+        self.keys = [()] * len(INDEX_FIELDS)
+        self.rows = [()] * len(INDEX_FIELDS)
+        self._id_starts = ()
+        self._ids = b""
+        try:
+            with open(path, 'rb') as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return
+
+        view = memoryview(self._map)
+        if bytes(view[:len(_SNAPSHOT_MAGIC)]) != _SNAPSHOT_MAGIC:
+            view.release()
+            self.close()
+            raise ValueError(f"{path} isn't a leaderboard snapshot")
+        position = len(_SNAPSHOT_MAGIC)
+        self.generation, self.count, id_bytes = view[position:position + 24].cast('q')
+        position += 24
+
+        def take(typecode, length):
+            nonlocal position
+            part = view[position:position + 8 * length].cast(typecode)
+            position += 8 * length
+            return part
+
+        self._columns = [take('d', self.count) for _ in INDEX_FIELDS]
+        for field in range(len(INDEX_FIELDS)):
+            self.keys[field] = take('d', self.count)
+            self.rows[field] = take('q', self.count)
+        self._id_starts = take('q', self.count + 1)
+        self._ids = view[position:position + id_bytes]
+        if len(self._ids) != id_bytes:
+            self.close()
+            raise ValueError(f"{path} has been cut short")
+
+    def player_id(self, row):
+        return bytes(self._ids[self._id_starts[row]:self._id_starts[row + 1]]).decode('utf-8')
+
+    def entry(self, row):
+        """
+        Returns (highest score, average time, games, total time) for a row
+        """
+        return tuple(int(column[row]) if whole else column[row]
+                     for column, whole in zip(self._columns, _WHOLE_NUMBERS))
+
+    def span(self, field, low, high):
+        """
+        Returns (start, end) of the places in a field's sorted list whose
+        value is between low and high (either can be None)
+        """
+        keys = self.keys[field]
+        start = 0 if high is None else bisect.bisect_left(keys, -high)
+        end = len(keys) if low is None else bisect.bisect_right(keys, -low)
+        return start, max(start, end)
+
+    def close(self):
+        # The views have to go before the map can be closed
+        for part in [self._ids, self._id_starts] + self._columns + self.keys + self.rows:
+            if isinstance(part, memoryview):
+                part.release()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    @staticmethod
+    def write(path, generation, entries):
+        """
+        Writes a snapshot of entries ({player ID: entry}) to path
+        """
+        player_ids = list(entries)
+        values = list(entries.values())
+        encoded = [player_id.encode('utf-8') for player_id in player_ids]
+        id_starts = array('q', [0]) + array('q', itertools.accumulate(map(len, encoded)))
+
+        with open(path, 'wb') as file:
+            file.write(_SNAPSHOT_MAGIC)
+            file.write(array('q', [generation, len(player_ids), id_starts[-1]]).tobytes())
+            for field in range(len(INDEX_FIELDS)):
+                file.write(array('d', [entry[field] for entry in values]).tobytes())
+            for field in range(len(INDEX_FIELDS)):
+                ordered = sorted(range(len(values)), key=lambda row: (-values[row][field], player_ids[row]))
+                file.write(array('d', [-values[row][field] for row in ordered]).tobytes())
+                file.write(array('q', ordered).tobytes())
+            file.write(id_starts.tobytes())
+            file.write(b"".join(encoded))
+
+
+class Leaderboard:
+    """
+    Players sorted by each of INDEX_FIELDS, from the snapshot plus the log
+    Nothing is read until the leaderboard is looked at, so saving a player
+    just adds one line to the end of the log, and each look only reads the
+    lines added since the last one
+    If there is no snapshot or log yet it is worked out from the store
+    """
+
+    def __init__(self, store, path="leaderboard.log"):
+        self.store = store
+        self.path = path
+        self.snapshot_path = os.path.splitext(path)[0] + ".snapshot"
+        self.lock_path = locks.lock_path(os.path.dirname(path), "leaderboard.lock")
+        self.snapshot = None
+        # The log since the snapshot: player ID -> (highest score, average time, games, total time)
+        self.tail = {}
+        # For each field a sorted list of (-value, player ID) from the log, biggest first
+        self.indexes = {field: [] for field in INDEX_FIELDS}
+        self._log_file = None  # (inode, bytes read) of the log
+        self._log_generation = 0
+        self._log_lines = 0
+        # Saves can come from several threads (e.g. the web service)
+        self._lock = threading.Lock()
+        # Log lines held back by each thread's batch
+        self._batch = threading.local()
+
+    def close(self):
+        with self._lock:
+            if self.snapshot is not None:
+                self.snapshot.close()
+                self.snapshot = None
+
+    def _reset(self, snapshot):
+        if self.snapshot is not None:
+            self.snapshot.close()
+        self.snapshot = snapshot
+        self.tail = {}
+        self.indexes = {field: [] for field in INDEX_FIELDS}
+        self._log_file = None
+        self._log_generation = 0
+        self._log_lines = 0
+
+    def _open(self):
+        """
+        Opens the snapshot and reads the log from the start
+        Done while holding the file lock, so a merge can't swap the files part way
+        """
+        with locks.file_lock(self.lock_path):
+            snapshot = Snapshot(self.snapshot_path)
+            if snapshot.count == 0 and snapshot.generation == 0 and not os.path.exists(self.path):
+                snapshot.close()
+                self.rebuild()
+                return
+            self._reset(snapshot)
+            if not self._read_log() or self._log_generation < snapshot.generation:
+                # No log, or one that was merged into the snapshot just before
+                # the program writing it stopped
+                self._start_log(snapshot.generation)
+                self._reset(Snapshot(self.snapshot_path))
+                self._read_log()
+            elif self._log_generation != snapshot.generation:
+                raise ValueError(f"{self.path} doesn't follow on from {self.snapshot_path}")
+
+    def _read_log(self):
+        """
+        Reads the log lines added since the last read
+        Returns False if there's no log
+        """
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return False
+        position = 0 if self._log_file is None else self._log_file[1]
+        with open(self.path, 'rb') as file:
+            file.seek(position)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    # Another program is still writing this line
+                    break
+                position += len(line)
+                if line.startswith(b"#"):
+                    self._log_generation = int(line[1:])
+                    continue
+                if position == len(line):
+                    # Written before there were snapshots
+                    self._log_generation = 0
+                parts = line.decode('utf-8').rstrip("\n").split(" ")
+                if len(parts) == 3:
+                    # Written before games and total time were kept, so work it all out again
+                    raise _OldLog()
+                if len(parts) != 5:
+                    raise ValueError(f"Broken line in {self.path}: {line!r}")
+                self._add_to_tail(unquote(parts[0]),
+                                  (int(parts[1]), float(parts[2]), int(parts[3]), float(parts[4])))
+                self._log_lines += 1
+        self._log_file = (inode, position)
+        return True
+
+    def _add_to_tail(self, player_id, entry):
+        """
+        Puts a player's latest entry into the sorted lists for the log
+        Only the player's old place in each list moves, nothing is re-sorted
+        """
+        old = self.tail.get(player_id)
+        for position, field in enumerate(INDEX_FIELDS):
+            index = self.indexes[field]
+            if old is not None:
+                del index[bisect.bisect_left(index, (-old[position], player_id))]
+            bisect.insort(index, (-entry[position], player_id))
+        self.tail[player_id] = entry
+
+    def _refresh(self):
+        """
+        Brings the leaderboard up to date with the files, reading just the
+        new log lines unless the log has been merged into a new snapshot
+        """
+        try:
+            if self.snapshot is None:
+                self._open()
+            else:
+                try:
+                    stat = os.stat(self.path)
+                except FileNotFoundError:
+                    stat = None
+                if stat is None or stat.st_ino != self._log_file[0] or stat.st_size < self._log_file[1]:
+                    self._open()
+                elif stat.st_size > self._log_file[1]:
+                    self._read_log()
+        except _OldLog:
+            self.rebuild()
+        if self._log_lines > TAIL_LINES:
+            self._merge()
+
+    def _start_log(self, generation):
+        new_path = self.path + ".new"
+        with open(new_path, 'w', encoding='utf-8') as file:
+            file.write(f"#{generation}\n")
+        os.replace(new_path, self.path)
+
+    def _write(self, entries, generation):
+        """
+        Swaps in a snapshot of entries and an empty log (needs the file lock)
+        The snapshot goes first, so if it stops in between the log's
+        generation is older and it's known to be in the snapshot already
+        """
+        new_path = self.snapshot_path + ".new"
+        Snapshot.write(new_path, generation, entries)
+        os.replace(new_path, self.snapshot_path)
+        self._start_log(generation)
+        self._reset(Snapshot(self.snapshot_path))
+        self._read_log()
+
+    def _merge(self):
+        """
+        Merges the log into a new snapshot
+        """
+        with locks.file_lock(self.lock_path):
+            try:
+                if os.stat(self.path).st_ino != self._log_file[0]:
+                    # Another program has just merged it
+                    self._open()
+                    return
+            except FileNotFoundError:
+                self._open()
+                return
+            self._read_log()
+            snapshot = self.snapshot
+            entries = {snapshot.player_id(row): snapshot.entry(row) for row in range(snapshot.count)}
+            entries.update(self.tail)
+            self._write(entries, snapshot.generation + 1)
+
+    def rebuild(self, entries=None):
+        """
+        Works the leaderboard out again from every player's stats in the
+        store, or from entries ({player ID: entry}) if they're given
+        """
+        if entries is None:
+            entries = {}
+            for player_id in self.store.player_ids():
+                stats = self.store.load_stats(player_id)
+                entries[player_id] = (stats["highest_score"], stats["average_time"],
+                                      stats["games"], stats["total_time"])
+        with locks.file_lock(self.lock_path):
+            old = Snapshot(self.snapshot_path)
+            old.close()
+            self._write(entries, old.generation + 1)
+
+    def update(self, player_id, highest_score, average_time, games, total_time):
+        """
+        Records a player's latest stats by adding a line to the log, which
+        is read in the next time the leaderboard is looked at
+        Before there is a snapshot or log nothing needs writing, as it is
+        worked out from the store (which already has this save) when it's first needed
+        """
+        line = _log_line(player_id, (highest_score, average_time, games, total_time))
+        lines = getattr(self._batch, "lines", None)
+        if lines is not None:
+            lines.append(line)
+        else:
+            self._append([line])
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Holds back the updates this thread makes inside it and adds them to
+        the log in one write at the end, so saving lots of players takes
+        the file lock and opens the log once instead of once per player
+        """
+        if getattr(self._batch, "lines", None) is not None:
+            yield
+            return
+
+        self._batch.lines = []
+        try:
+            yield
+        finally:
+            # Written even if the batch stopped part way, the players saved
+            # before it stopped are in the store already
+            lines = self._batch.lines
+            self._batch.lines = None
+            if lines:
+                self._append(lines)
+
+    def _append(self, lines):
+        with self._lock, locks.file_lock(self.lock_path):
+            if not os.path.exists(self.path) and not os.path.exists(self.snapshot_path):
+                return
+            # One write, so lines from two programs saving at once never get mixed together
+            descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(descriptor, "".join(lines).encode('utf-8'))
+            finally:
+                os.close(descriptor)
+
+    def _snapshot_rows(self, field, start, end):
+        """
+        Yields (-value, player ID, row) for places start to end in the
+        snapshot's list for a field, skipping players the log has replaced
+        """
+        snapshot = self.snapshot
+        keys = snapshot.keys[field]
+        rows = snapshot.rows[field]
+        for place in range(start, end):
+            row = rows[place]
+            player_id = snapshot.player_id(row)
+            if player_id not in self.tail:
+                yield keys[place], player_id, row
+
+    def top(self, count, by="score"):
+        """
+        Returns the top players as a list of (player_id, highest_score, average_time)
+        by="score" puts the highest scores first, by="time" the longest average times
+        """
+        if by not in SORT_KEYS:
+            raise ValueError(f"Unknown leaderboard order: {by}")
+
+        with self._lock:
+            self._refresh()
+            field = INDEX_FIELDS.index(by)
+            from_snapshot = self._snapshot_rows(field, 0, self.snapshot.count)
+            from_log = ((key, player_id, None) for key, player_id in self.indexes[by])
+
+            top_players = []
+            for _, player_id, row in itertools.islice(heapq.merge(from_snapshot, from_log), count):
+                entry = self.tail[player_id] if row is None else self.snapshot.entry(row)
+                top_players.append((player_id, entry[0], entry[1]))
+            return top_players
+
+    def _range(self, field, low, high):
+        """
+        Returns (start, end) of the players in the log's sorted list for a
+        field whose value is between low and high (either can be None)
+        The list is biggest first, so high gives the start and low the end
+        """
+        index = self.indexes[field]
+        start = 0 if high is None else bisect.bisect_left(index, (-high,))
+        end = len(index) if low is None else bisect.bisect_right(index, (-low, _AFTER_EVERY_ID))
+        return start, max(start, end)
+
+    def find(self, ranges, by="score", limit=None):
+        """
+        Finds the players inside every range, e.g.
+        find({"score": (50000, 100000), "time": (None, 10)}) for a highest
+        score from 50,000 to 100,000 and an average time of 10 minutes or less
+        Both ends of a range are included, and None leaves that end open
+        Each range is found with bisect in the snapshot and the log, and only
+        the smallest one is walked through, so it takes O(log n + k) for k
+        players in that range (plus sorting the ones that match)
+        Returns (player_id, highest_score, average_time, games, total_time)
+        tuples, biggest value of by first
+        """
+        for field in list(ranges) + [by]:
+            if field not in INDEX_FIELDS:
+                raise ValueError(f"Unknown leaderboard field: {field}")
+
+        with self._lock:
+            self._refresh()
+            if not ranges:
+                ranges = {by: (None, None)}
+            spans = {field: (self.snapshot.span(INDEX_FIELDS.index(field), low, high),
+                             self._range(field, low, high))
+                     for field, (low, high) in ranges.items()}
+            # Walk the smallest range, checking the others against each player's entry
+            walked = min(spans, key=lambda field: sum(end - start for start, end in spans[field]))
+            (snapshot_start, snapshot_end), (log_start, log_end) = spans[walked]
+            checks = [(INDEX_FIELDS.index(field), low, high)
+                      for field, (low, high) in ranges.items() if field != walked]
+
+            candidates = [(player_id, self.snapshot.entry(row)) for _, player_id, row
+                          in self._snapshot_rows(INDEX_FIELDS.index(walked), snapshot_start, snapshot_end)]
+            candidates += [(player_id, self.tail[player_id])
+                           for _, player_id in self.indexes[walked][log_start:log_end]]
+            found = [(player_id,) + entry for player_id, entry in candidates
+                     if all((low is None or entry[position] >= low) and (high is None or entry[position] <= high)
+                            for position, low, high in checks)]
+
+        position = INDEX_FIELDS.index(by) + 1
+        found.sort(key=lambda row: (-row[position], row[0]))
+        return found[:limit] if limit is not None else found
+
+
+class _OldLog(Exception):
+    """
+    Raised while reading a log from before games and total time were kept
+    """
+
+
+def _log_line(player_id, entry):
+    highest, average, games, total = entry
+    return f"{quote(player_id, safe='')} {highest} {average} {games} {total}\n"
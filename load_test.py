@@ -0,0 +1,153 @@
+"""
+Load test for the Games Club stats web service
+Opens lots of connections at once, each one adding games and reading stats
+back, then checks no games went missing
+
+Run with: python load_test.py --connections 2000 --requests 5
+Without --port a local copy of the service is started using a temporary
+folder, so no real player data is touched
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time as timer
+
+import main
+import storage
+from server import StatsServer
+
+async def _request(reader, writer, method, path, data=None):
+    """
+    Sends one request on an open connection and reads the JSON answer
+    Returns (status, data)
+    """
+    body = json.dumps(data).encode('utf-8') if data is not None else b""
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode('latin-1') + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+async def _client(host, port, number, requests, players, results):
+    """
+    One connection: adds a game then reads the stats, requests times over
+    """
+    player_id = f"LOAD{number % players}"
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for request in range(requests):
+            game = {"score": (number * 7919 + request) % 1000000, "time": 1.5 + request % 30}
+            start = timer.perf_counter()
+            status, _ = await _request(reader, writer, "POST", f"/players/{player_id}/games", game)
+            results["latencies"].append(timer.perf_counter() - start)
+            if status != 201:
+                results["errors"] += 1
+                continue
+            results["games"][player_id] = results["games"].get(player_id, 0) + 1
+
+            start = timer.perf_counter()
+            status, _ = await _request(reader, writer, "GET", f"/players/{player_id}/stats")
+            results["latencies"].append(timer.perf_counter() - start)
+            if status != 200:
+                results["errors"] += 1
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+async def run_load_test(host, port, connections=100, requests=5, players=50):
+    """
+    Runs the load test against a service that is already running
+    Returns a dictionary with the request count, errors, time taken,
+    latencies and how many games each player was sent
+    """
+    results = {"latencies": [], "errors": 0, "games": {}}
+    start = timer.perf_counter()
+    outcomes = await asyncio.gather(*(_client(host, port, number, requests, players, results)
+                                      for number in range(connections)), return_exceptions=True)
+    results["elapsed"] = timer.perf_counter() - start
+    results["errors"] += sum(1 for outcome in outcomes if isinstance(outcome, Exception))
+    results["requests"] = len(results["latencies"])
+    return results
+
+async def check_games(host, port, sent):
+    """
+    Asks the service for every player's game count
+    Returns the players whose count doesn't match what was sent
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    wrong = {}
+    try:
+        for player_id, count in sent.items():
+            _, stats = await _request(reader, writer, "GET", f"/players/{player_id}/stats")
+            if stats.get("games") != count:
+                wrong[player_id] = (count, stats.get("games"))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return wrong
+
+def latency_percentile(latencies, percentile):
+    """
+    Returns a latency percentile in milliseconds
+    """
+    if not latencies:
+        return 0.0
+    ordered = sorted(latencies)
+    return ordered[min(int(len(ordered) * percentile / 100), len(ordered) - 1)] * 1000
+
+async def run_local(args):
+    """
+    Starts a local copy of the service with a temporary store and tests it
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        main.set_store(storage.open_store(args.store, folder))
+        server = StatsServer(args.workers)
+        host, port = await server.start("127.0.0.1", 0)
+        try:
+            results = await run_load_test(host, port, args.connections, args.requests, args.players)
+            results["wrong"] = await check_games(host, port, results["games"])
+        finally:
+            await server.stop()
+            main.set_store(None)
+    return results
+
+def main_program(argv):
+    parser = argparse.ArgumentParser(prog="load_test.py", description="Load test the stats service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="port of a running service (default: start a local one)")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=5, help="POST + GET pairs per connection")
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8, help="I/O threads for the local service")
+    parser.add_argument("--store", choices=storage.STORE_TYPES, default="files")
+    args = parser.parse_args(argv)
+
+    if args.port is None:
+        results = asyncio.run(run_local(args))
+    else:
+        results = asyncio.run(run_load_test(args.host, args.port, args.connections,
+                                            args.requests, args.players))
+        results["wrong"] = asyncio.run(check_games(args.host, args.port, results["games"]))
+
+    rate = results["requests"] / results["elapsed"] if results["elapsed"] > 0 else 0.0
+    print(f"{results['requests']:,} requests over {args.connections:,} connections "
+          f"in {results['elapsed']:.2f} seconds ({rate:,.0f} requests/sec)")
+    print(f"Latency: p50 {latency_percentile(results['latencies'], 50):.1f} ms, "
+          f"p99 {latency_percentile(results['latencies'], 99):.1f} ms")
+    print(f"Errors: {results['errors']:,}, players with missing games: {len(results['wrong']):,}")
+    return 1 if results["errors"] or results["wrong"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main_program(sys.argv[1:]))
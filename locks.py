@@ -0,0 +1,125 @@
+"""
+File locks for the Games Club Statistics Program
+Lets several terminals (or threads) save at the same time without one
+silently overwriting another's games
+
+Locks are advisory fcntl locks on small lock files, so they only keep out
+other programs that take the same lock. Where fcntl isn't available
+(Windows) they still keep threads in this program apart
+
+The lock files are kept in a .locks folder inside the store's folder, so
+they stay with the store (and go when it's deleted) without being mixed
+in with the players. Players share PLAYER_STRIPES lock files between them,
+so there are never more lock files however many players are saved
+"""
+
+import functools
+import os
+import threading
+import zlib
+from contextlib import ExitStack, contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Lock files this thread already holds, so taking one again doesn't deadlock
+_held = threading.local()
+
+# Used instead of fcntl when it isn't available
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+@contextmanager
+def file_lock(path):
+    """
+    Holds an exclusive lock on the lock file at path until the block ends
+    The lock file is made if needed. Taking a lock the thread already holds
+    just carries on, so functions that lock can call each other
+    """
+    held = getattr(_held, "paths", None)
+    if held is None:
+        held = _held.paths = set()
+    if path in held:
+        yield
+        return
+
+    if fcntl is None:
+        with _thread_locks_guard:
+            lock = _thread_locks.setdefault(path, threading.Lock())
+        with lock:
+            held.add(path)
+            try:
+                yield
+            finally:
+                held.discard(path)
+        return
+
+    # Every open gets its own lock, so two threads in this program wait for
+    # each other the same way two programs do
+    descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(descriptor, fcntl.LOCK_EX)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+            fcntl.flock(descriptor, fcntl.LOCK_UN)
+    finally:
+        os.close(descriptor)
+
+LOCK_FOLDER = ".locks"
+
+# How many lock files the players are shared out between
+PLAYER_STRIPES = 64
+
+@functools.lru_cache(maxsize=None)
+def _lock_folder(absolute_folder):
+    """
+    Returns the folder the lock files for a store's folder are kept in,
+    making it the first time
+    realpath looks at every part of the path, so it's only done once per folder
+    """
+    lock_folder = os.path.join(os.path.realpath(absolute_folder), LOCK_FOLDER)
+    os.makedirs(lock_folder, exist_ok=True)
+    return lock_folder
+
+def lock_path(folder, name):
+    """
+    Returns the path of the lock file with this name for a store's folder
+    Every program using the same store folder (however they name it) gets
+    the same path
+    """
+    return os.path.join(_lock_folder(os.path.abspath(folder or ".")), name)
+
+def player_stripe(player_id):
+    """
+    Returns which of the PLAYER_STRIPES lock files the player uses
+    crc32 gives the same answer in every program, unlike hash()
+    """
+    return zlib.crc32(player_id.encode('utf-8')) % PLAYER_STRIPES
+
+def _stripe_lock(folder, stripe):
+    return file_lock(lock_path(folder, f"players_{stripe}.lock"))
+
+def player_lock(folder, player_id):
+    """
+    Locks one player in a store's folder
+    Saves for different players nearly always use different lock files, so
+    they hardly ever wait for each other
+    """
+    return _stripe_lock(folder, player_stripe(player_id))
+
+@contextmanager
+def player_locks(folder, player_ids):
+    """
+    Locks several players in a store's folder until the block ends
+    Their lock files are always taken in the same order, so two programs
+    locking some of the same players can't each end up waiting for the other
+    """
+    with ExitStack() as stack:
+        for stripe in sorted({player_stripe(player_id) for player_id in player_ids}):
+            stack.enter_context(_stripe_lock(folder, stripe))
+        yield
@@ -4,6 +4,111 @@ A simple program to record player scores and calculate statistics and write them
 https://github.com/maxtheobaldd/u4-starting-projectfg
 """
 
+import argparse
+import collections
+import contextlib
+import itertools
+import os
+import sys
+import time as timer
+from array import array
+
+import locks
+import metrics
+import pager
+import storage
+from leaderboard import INDEX_FIELDS, Leaderboard, SORT_KEYS
+from rollups import PERIODS, Rollups
+from session import ConsoleSession
+from summary import RunningSummary
+from validation import validate_player_id, validate_number_of_games, validate_score, validate_time
+
+# The store that player reports are saved in (see get_store)
+_store = None
+# The leaderboard for that store (see get_leaderboard)
+_leaderboard = None
+# The day/week/month/season totals for that store (see get_rollups)
+_rollups = None
+# Where the menu asks its questions and shows its answers (see get_session)
+_session = None
+
+def get_store():
+    """
+    Returns the store player reports are saved in
+    Uses one player_<ID>.txt file per player unless the GAMES_CLUB_STORE
+    environment variable picks another kind of store (e.g. "indexed")
+    """
+    global _store
+    if _store is None:
+        _store = storage.open_store(os.environ.get("GAMES_CLUB_STORE", "files"))
+    return _store
+
+def set_store(store):
+    """
+    Switches to a different store, closing the old one
+    """
+    global _store, _leaderboard, _rollups
+    if _store is not None:
+        _store.close()
+    if _rollups is not None:
+        _rollups.close()
+    if _leaderboard is not None:
+        _leaderboard.close()
+    _store = store
+    _leaderboard = None
+    _rollups = None
+
+def get_leaderboard():
+    """
+    Returns the leaderboard for the current store
+    It is kept in leaderboard.log in the same folder as the store
+    """
+    global _leaderboard
+    if _leaderboard is None:
+        store = get_store()
+        _leaderboard = Leaderboard(store, os.path.join(store.folder, "leaderboard.log"))
+    return _leaderboard
+
+def get_rollups():
+    """
+    Returns the day/week/month/season totals for the current store
+    They are kept in rollups.db in the same folder as the store
+    """
+    global _rollups
+    if _rollups is None:
+        _rollups = Rollups(os.path.join(get_store().folder, "rollups.db"))
+    return _rollups
+
+def get_session():
+    """
+    Returns the session the menu talks through
+    Uses the terminal unless set_session has picked another one
+    """
+    global _session
+    if _session is None:
+        _session = ConsoleSession()
+    return _session
+
+def set_session(session):
+    """
+    Switches to a different session, e.g. a ScriptedSession to play back
+    answers (None goes back to the terminal)
+    """
+    global _session
+    _session = session
+
+def ask(prompt):
+    """
+    Asks the user something through the current session
+    """
+    return get_session().ask(prompt)
+
+def say(*parts, **options):
+    """
+    Shows the user something through the current session, like print
+    """
+    get_session().say(*parts, **options)
+
 def main():
     """
     Main function that runs the whole program
@@ -18,27 +123,33 @@ def main():
         elif choice == "2":
             show_saved_stats()
         elif choice == "3":
-            print("\nThanks for using the Games Club Program!")
-            print("Goodbye!")
+            say("\nThanks for using the Games Club Program!")
+            say("Goodbye!")
             break
+        elif choice == "4":
+            add_more_games()
+        elif choice == "5":
+            show_leaderboard()
         else:
-            print("That's not a valid choice. Please pick 1, 2, or 3.")
-            input("Press Enter to try again...")
+            say("That's not a valid choice. Please pick 1, 2, 3, 4, or 5.")
+            ask("Press Enter to try again...")
 
 def show_menu():
     """
     Shows the main menu and gets the user's choice
     Returns what the user picked as a string
     """
-    print("=" * 50)
-    print("GAMES CLUB STATISTICS PROGRAM")
-    print("=" * 50)
-    print("1. Record Player Scores")
-    print("2. Show Saved Player Stats")
-    print("3. Exit Program")
-    print("=" * 50)
+    say("=" * 50)
+    say("GAMES CLUB STATISTICS PROGRAM")
+    say("=" * 50)
+    say("1. Record Player Scores")
+    say("2. Show Saved Player Stats")
+    say("3. Exit Program")
+    say("4. Add More Games for a Player")
+    say("5. Show Leaderboard")
+    say("=" * 50)
     
-    choice = input("What would you like to do? (1-3): ")
+    choice = ask("What would you like to do? (1-5): ")
     return choice
 
 def get_player_id():
@@ -47,17 +158,13 @@ def get_player_id():
     Keeps asking until they enter something good
     """
     while True:
-        player_id = input("Enter Player ID: ").strip()
-        
-        # Check if they entered nothing
-        if len(player_id) == 0:
-            print("Oops! You can't leave this empty. Try again.")
-        # Check if it's too long
-        elif len(player_id) > 20:
-            print("That's too long! Keep it under 20 characters.")
-        else:
-            # Make it uppercase so it looks consistent
-            return player_id.upper()
+        try:
+            text = ask("Enter Player ID: ")
+            # validate_player_id also makes it uppercase so it looks consistent
+            with metrics.stage("validation"):
+                return validate_player_id(text)
+        except ValueError as error:
+            say(str(error))
 
 def get_number_of_games():
     """
@@ -65,17 +172,11 @@ def get_number_of_games():
     """
     while True:
         try:
-            num_games = int(input("How many games did you play? "))
-            
-            if num_games <= 0:
-                print("You need to have played at least 1 game!")
-            elif num_games > 100:
-                print("Wow, that's a lot! Let's keep it under 100 games.")
-            else:
-                return num_games
-                
-        except ValueError:
-            print("Please enter a number, not letters!")
+            text = ask("How many games did you play? ")
+            with metrics.stage("validation"):
+                return validate_number_of_games(text)
+        except ValueError as error:
+            say(str(error))
 
 def get_score():
     """
@@ -84,17 +185,11 @@ def get_score():
     """
     while True:
         try:
-            score = int(input("Enter your score: "))
-            
-            if score < 0:
-                print("Scores can't be negative! Try again.")
-            elif score > 1000000:
-                print("That's an amazing score, but let's keep it under 1,000,000!")
-            else:
-                return score
-                
-        except ValueError:
-            print("Please enter a number for the score!")
+            text = ask("Enter your score: ")
+            with metrics.stage("validation"):
+                return validate_score(text)
+        except ValueError as error:
+            say(str(error))
 
 def get_time():
     """
@@ -103,42 +198,38 @@ def get_time():
     """
     while True:
         try:
-            time = float(input("How long did you play (in minutes)? "))
-            
-            if time <= 0:
-                print("Time must be more than 0 minutes!")
-            elif time > 1440:  # 1440 minutes = 24 hours
-                print("That's more than 24 hours! Are you sure?")
-            else:
-                return time
-                
-        except ValueError:
-            print("Please enter a number for the time!")
+            text = ask("How long did you play (in minutes)? ")
+            with metrics.stage("validation"):
+                return validate_time(text)
+        except ValueError as error:
+            say(str(error))
 
 def record_scores():
     """
     Main function to record all player data
     Gets player info, scores, times, then calculates and saves everything
     """
-    print("\n" + "=" * 50)
-    print("RECORD PLAYER SCORES")
-    print("=" * 50)
+    say("\n" + "=" * 50)
+    say("RECORD PLAYER SCORES")
+    say("=" * 50)
     
     # Get basic player information
     player_id = get_player_id()
     num_games = get_number_of_games()
     
-    # Create empty lists to store all the scores and times
-    scores = []  # Will hold all scores like [1200, 1500, 1800]
-    times = []   # Will hold all times like [25.0, 20.5, 30.0]
+    # Create empty arrays to store all the scores and times
+    # Arrays keep plain numbers (4 bytes per score, 8 per time) instead of
+    # a Python object for each one, so long histories stay small
+    scores = array('i')  # Will hold all scores like [1200, 1500, 1800]
+    times = array('d')   # Will hold all times like [25.0, 20.5, 30.0]
     
     # Get data for each game
-    print(f"\nOkay! Let's enter data for {num_games} games:")
-    print("-" * 30)
+    say(f"\nOkay! Let's enter data for {num_games} games:")
+    say("-" * 30)
     
     # Loop through each game
     for game_number in range(1, num_games + 1):
-        print(f"\nGame {game_number}:")
+        say(f"\nGame {game_number}:")
         
         # Get score and time for this game
         score = get_score()
@@ -148,23 +239,205 @@ def record_scores():
         scores.append(score)
         times.append(time)
         
-        print(f"  Got it! Score = {score}, Time = {time} minutes")
+        say(f"  Got it! Score = {score}, Time = {time} minutes")
     
     # Calculate the statistics
-    print("\nCalculating your stats...")
-    highest_score = find_highest_score(scores)
-    average_time = calculate_average_time(times)
+    say("\nCalculating your stats...")
+    with metrics.stage("stats"):
+        highest_score = find_highest_score(scores)
+        average_time = calculate_average_time(times)
+    metrics.count("games_recorded", num_games)
     
     # Show the results
-    show_results(player_id, scores, times, highest_score, average_time)
+    with metrics.stage("show_results"):
+        show_results(player_id, scores, times, highest_score, average_time)
     
-    # Save to file
-    save_to_file(player_id, scores, times, highest_score, average_time)
+    # Save to file, only adding the games that weren't saved before to this
+    # week's totals (recording a player again replaces their history)
+    with locks.player_lock(get_store().folder, player_id):
+        new_scores, new_times, _ = unsaved_games(player_id, scores, times)
+        save_to_file(player_id, scores, times, highest_score, average_time,
+                     new_games=(new_scores, new_times))
     
-    print("\n" + "=" * 50)
-    print("All done! Your data has been saved!")
-    print("=" * 50)
-    input("Press Enter to go back to the main menu...")
+    say("\n" + "=" * 50)
+    say("All done! Your data has been saved!")
+    say("=" * 50)
+    ask("Press Enter to go back to the main menu...")
+
+def add_more_games():
+    """
+    Adds new games to a player who has already been saved
+    Their running summary is updated with just the new games, so this
+    stays quick however many games they have played before
+    """
+    say("\n" + "=" * 50)
+    say("ADD MORE GAMES")
+    say("=" * 50)
+    
+    player_id = get_player_id()
+    _, _, summary = load_player_history(player_id)
+    if summary.games == 0:
+        say(f"\nNo saved games for {player_id} yet, so we'll start fresh.")
+    else:
+        say(f"\n{player_id} has {summary.games} saved games.")
+    
+    num_games = get_number_of_games()
+    say(f"\nOkay! Let's enter data for {num_games} more games:")
+    say("-" * 30)
+    
+    new_scores = array('i')
+    new_times = array('d')
+    for game_number in range(summary.games + 1, summary.games + num_games + 1):
+        say(f"\nGame {game_number}:")
+        score = get_score()
+        time = get_time()
+        
+        new_scores.append(score)
+        new_times.append(time)
+        
+        say(f"  Got it! Score = {score}, Time = {time} minutes")
+    
+    # The history is loaded again when saving, so games another terminal
+    # saved for this player while these were typed in aren't lost
+    summary = append_games(player_id, new_scores, new_times)
+    if summary is not None:
+        scores, times = get_store().load_games(player_id)
+        show_results(player_id, scores, times, summary.highest_score, summary.average_time)
+    
+    say("\n" + "=" * 50)
+    say("All done! The new games have been added!")
+    say("=" * 50)
+    ask("Press Enter to go back to the main menu...")
+
+def load_player_history(player_id):
+    """
+    Loads a player's saved games and running summary
+    Returns (scores, times, summary), with empty arrays for a new player
+    """
+    store = get_store()
+    try:
+        scores, times = store.load_games(player_id)
+    except FileNotFoundError:
+        return array('i'), array('d'), RunningSummary()
+    
+    summary = store.load_summary(player_id)
+    if summary is None or summary.games != len(scores):
+        # Saved before running summaries existed, so work it out this once
+        summary = RunningSummary.from_games(scores, times)
+    return scores, times, summary
+
+def extend_history(player_id, new_scores, new_times):
+    """
+    Loads a player's saved games and adds new games on to the end
+    Returns the updated (scores, times, summary), nothing is saved yet
+    """
+    scores, times, summary = load_player_history(player_id)
+    summary.add_games(new_scores, new_times)
+    scores.extend(new_scores)
+    times.extend(new_times)
+    return scores, times, summary
+
+def unsaved_games(player_id, scores, times, saved=None):
+    """
+    Works out which games in a history that's about to replace a player's
+    saved one weren't already saved, so saving the same games again (e.g.
+    importing a file twice) doesn't add them to the totals again
+    Games are matched on their score and time, and a game in there twice
+    has to be saved twice to match both
+    saved is a Counter of the (score, time) games to match against, taken
+    from the player's saved history if not given. Matched games are taken out of it
+    Returns (new scores, new times, saved games that weren't matched)
+    """
+    if saved is None:
+        try:
+            saved_scores, saved_times = get_store().load_games(player_id)
+        except FileNotFoundError:
+            return scores, times, collections.Counter()
+        saved = collections.Counter(zip(saved_scores, saved_times))
+
+    new_scores = []
+    new_times = []
+    for score, time in zip(scores, times):
+        if saved[score, time] > 0:
+            saved[score, time] -= 1
+        else:
+            new_scores.append(score)
+            new_times.append(time)
+    return new_scores, new_times, +saved
+
+def save_new_games(player_id, new_scores, new_times, attempts=3, stamp=True, new_games=None):
+    """
+    Adds new games to the end of a player's saved history and saves it,
+    without losing games someone else saves for the player at the same time
+    The history is loaded without a lock, then the player is locked and
+    only saved if their version hasn't changed since. If it has, the new
+    games are added to the newer history instead. After a few clashes the
+    player is locked for the whole load and save so it can't go on forever
+    stamp=False leaves adding the new games to the rollups to the caller,
+    and new_games=(scores, times) adds just those ones if only some are really new
+    Returns the updated (scores, times, summary)
+    """
+    store = get_store()
+    if not stamp:
+        new_games = None
+    elif new_games is None:
+        new_games = (new_scores, new_times)
+    for _ in range(attempts):
+        version = store.version(player_id)
+        scores, times, summary = extend_history(player_id, new_scores, new_times)
+        with locks.player_lock(store.folder, player_id):
+            if store.version(player_id) == version:
+                # Nothing was saved in between, so the old games are still there as loaded
+                save_player_data(player_id, scores, times, summary.highest_score,
+                                 summary.average_time, summary, new_games,
+                                 len(scores) - len(new_scores))
+                return scores, times, summary
+
+    with locks.player_lock(store.folder, player_id):
+        scores, times, summary = extend_history(player_id, new_scores, new_times)
+        save_player_data(player_id, scores, times, summary.highest_score,
+                         summary.average_time, summary, new_games, len(scores) - len(new_scores))
+        return scores, times, summary
+
+def add_locked_games(player_id, new_scores, new_times):
+    """
+    Adds new games for a player the caller already has locked (e.g. with
+    saving_players), leaving the rollups to the caller
+    Stores with add_games (SQLite) only get the new games, so it takes the
+    same time however many games the player has. Other stores, and players
+    saved before running summaries, go through save_new_games
+    Returns the player's updated running summary
+    """
+    store = get_store()
+    if hasattr(store, "add_games"):
+        # A new player starts from an empty summary
+        summary = store.load_summary(player_id) or RunningSummary()
+        summary.add_games(new_scores, new_times)
+        if store.add_games(player_id, new_scores, new_times, summary):
+            get_leaderboard().update(player_id, summary.highest_score, summary.average_time,
+                                     summary.games, summary.total_time)
+            return summary
+    _, _, summary = save_new_games(player_id, new_scores, new_times, attempts=0, stamp=False)
+    return summary
+
+def append_games(player_id, new_scores, new_times, quiet=False, new_games=None):
+    """
+    Adds new games to the end of a player's saved history and saves them
+    new_games is passed on to save_new_games
+    Returns the player's updated running summary, or None if they couldn't
+    be saved
+    """
+    try:
+        _, _, summary = save_new_games(player_id, new_scores, new_times, new_games=new_games)
+    except Exception as e:
+        # file write error handling
+        say(f"Oops! Couldn't save the file: {e}")
+        say("Your data couldn't be saved, but everything else worked fine.")
+        return None
+
+    if not quiet:
+        say(f"\nYour data has been saved to: {get_store().location(player_id)}")
+    return summary
 
 def find_highest_score(scores):
     """
@@ -198,123 +471,948 @@ def show_results(player_id, scores, times, highest_score, average_time):
     """
     Shows all the player statistics in a nice format
     Makes everything look organized and easy to read
+    Long histories are shown a screen at a time (see pager.py)
     """
-    print("\n" + "=" * 60)
-    print("YOUR GAME STATISTICS")
-    print("=" * 60)
-    
-    # Show basic info
-    print(f"Player ID: {player_id}")
-    print(f"Number of games played: {len(scores)}")
-    print(f"Highest Score: {highest_score:,}")  # :, adds commas to big numbers
-    print(f"Average Time per Game: {average_time} minutes")
-    
-    print("\n" + "-" * 60)
-    print("ALL YOUR GAME DATA")
-    print("-" * 60)
-    
-    # Show all scores with game numbers
-    print("All Your Scores:")
-    for i in range(len(scores)):
-        game_num = i + 1  # Add 1 because we want to start from Game 1, not Game 0
-        print(f"  Game {game_num}: {scores[i]:,} points")
-    
-    # Show all times with game numbers
-    print("\nAll Your Times:")
-    for i in range(len(times)):
-        game_num = i + 1
-        print(f"  Game {game_num}: {times[i]} minutes")
-    
-    # Calculate and show total time
     total_time = sum(times)
-    print(f"\nTotal Time Played: {total_time} minutes")
-    
-    print("=" * 60)
 
-def save_to_file(player_id, scores, times, highest_score, average_time):
+    def results_from(start_game=1, summary_only=False):
+        return result_pieces(player_id, scores, times, highest_score, average_time, total_time,
+                             start_game, summary_only)
+
+    def jump(game_number):
+        if not 1 <= game_number <= len(scores):
+            return None
+        return results_from(game_number)
+
+    pager.show_pages(get_session(), results_from(), jump, lambda: results_from(summary_only=True))
+
+def result_pieces(player_id, scores, times, highest_score, average_time, total_time, start_game=1,
+                  summary_only=False):
     """
-    Saves all player data to a text file
-    Creates a file named 'player_PLAYERID.txt'
+    Yields the lines show_results shows, one at a time
+    Starting from a later game leaves out the summary at the top, and
+    summary_only leaves out the games
+    """
+    if start_game == 1:
+        yield "\n" + "=" * 60 + "\n"
+        yield "YOUR GAME STATISTICS\n"
+        yield "=" * 60 + "\n"
+
+        # Show basic info
+        yield f"Player ID: {player_id}\n"
+        yield f"Number of games played: {len(scores)}\n"
+        yield f"Highest Score: {highest_score:,}\n"  # :, adds commas to big numbers
+        yield f"Average Time per Game: {average_time} minutes\n"
+        if summary_only:
+            yield "=" * 60 + "\n"
+            return
+
+        yield "\n" + "-" * 60 + "\n"
+        yield "ALL YOUR GAME DATA\n"
+        yield "-" * 60 + "\n"
+
+    # Show each game's score and time together (start_game counts from Game 1, not Game 0)
+    games = itertools.islice(zip(scores, times), start_game - 1, None)
+    for game_num, (score, time) in enumerate(games, start=start_game):
+        yield f"  Game {game_num}: {score:,} points, {time} minutes\n"
+
+    # Show total time
+    yield f"\nTotal Time Played: {total_time} minutes\n"
+    yield "=" * 60 + "\n"
+
+def save_to_file(player_id, scores, times, highest_score, average_time, quiet=False, summary=None,
+                 new_games=None):
+    """
+    Saves all player data to the store
+    By default this creates a file named 'player_PLAYERID.txt', which is
+    swapped in whole so a crash can't leave half a report behind
+    Set quiet to True to skip the "saved" message (used by bulk imports)
+    Pass the player's running summary to save it too, without one any older
+    summary is dropped and gets worked out again the next time it's needed
+    Pass the games that were just played as new_games=(scores, times) to
+    add them to the day, week, month and season totals
     """
-    # Create filename using the player ID
-    filename = f"player_{player_id}.txt"
-    
     try:
-        # Open file for writing ('w' means write mode)
-        # 'with' automatically closes the file when im done
-        with open(filename, 'w') as file:
-            
-            # Write a nice header
-            file.write("GAMES CLUB STATISTICS REPORT\n")
-            file.write("=" * 40 + "\n")
-            file.write(f"Report for Player: {player_id}\n")
-            file.write("=" * 40 + "\n\n")
-            
-            # Write the main statistics
-            file.write("SUMMARY:\n")
-            file.write("-" * 20 + "\n")
-            file.write(f"Player ID: {player_id}\n")
-            file.write(f"Number of Games: {len(scores)}\n")
-            file.write(f"Highest Score: {highest_score:,}\n")
-            file.write(f"Average Time: {average_time} minutes\n")
-            file.write(f"Total Time Played: {sum(times)} minutes\n\n")
-            
-            # write game data
-            file.write("DETAILED GAME DATA:\n")
-            file.write("-" * 20 + "\n")
-            
-            # write each games data
-            for i in range(len(scores)):
-                game_num = i + 1
-                file.write(f"Game {game_num}: Score = {scores[i]:,}, Time = {times[i]} minutes\n")
-            
-            file.write("\n" + "=" * 40 + "\n")
-            
-            # write raw data (useful if someone wants to use it in another program)
-            file.write("RAW DATA:\n")
-            # Convert all numbers to text and join them with commas
-            scores_text = ', '.join([str(score) for score in scores])
-            times_text = ', '.join([str(time) for time in times])
-            file.write(f"Scores: {scores_text}\n")
-            file.write(f"Times: {times_text}\n")
-            
-        print(f"\nYour data has been saved to: {filename}")
-        
+        with metrics.stage("save"):
+            store = save_player_data(player_id, scores, times, highest_score, average_time, summary,
+                                     new_games)
+        metrics.count("players_saved")
+
+        if not quiet:
+            say(f"\nYour data has been saved to: {store.location(player_id)}")
+
     except Exception as e:
         # file write error handling
-        print(f"Oops! Couldn't save the file: {e}")
-        print("Your data couldn't be saved, but everything else worked fine.")
+        metrics.count("save_errors")
+        say(f"Oops! Couldn't save the file: {e}")
+        say("Your data couldn't be saved, but everything else worked fine.")
+
+@contextlib.contextmanager
+def saving_players(player_ids):
+    """
+    Locks every player that's about to be saved and then starts one batch
+    in the store, the same order save_player_data takes them in, so a
+    program saving lots of players at once and one saving a single player
+    can't each be waiting for the other
+    Their leaderboard lines are added in one go once the store's batch is done
+    """
+    store = get_store()
+    with locks.player_locks(store.folder, player_ids), get_leaderboard().batch(), store.batch():
+        yield store
+
+def save_player_data(player_id, scores, times, highest_score, average_time, summary=None,
+                     new_games=None, kept_games=0):
+    """
+    Saves a player's report, running summary and place on the leaderboard,
+    and adds new_games (the (scores, times) just played, if any) to the
+    day, week, month and season totals
+    kept_games is how many of the first games are already saved unchanged,
+    so stores that can skip rewriting them do
+    Unlike save_to_file nothing is printed and errors are passed on
+    The player is locked while saving, so two programs saving the same
+    player take turns (saves for different players don't wait)
+    Returns the store the player was saved in
+    """
+    store = get_store()
+    total_time = summary.total_time if summary is not None else None
+
+    with locks.player_lock(store.folder, player_id):
+        with store.batch():
+            store.save_player(player_id, scores, times, highest_score, average_time, total_time,
+                              kept_games)
+            store.save_summary(player_id, summary)
+        if total_time is None:
+            total_time = sum(times)
+        get_leaderboard().update(player_id, highest_score, average_time, len(scores), total_time)
+        if new_games is not None:
+            get_rollups().add_games(player_id, *new_games)
+    return store
 
 def show_saved_stats():
     """
     Shows previously saved player statistics
     Reads data from a file and displays it
     """
-    print("\n" + "=" * 50)
-    print("SHOW SAVED PLAYER STATS")
-    print("=" * 50)
+    say("\n" + "=" * 50)
+    say("SHOW SAVED PLAYER STATS")
+    say("=" * 50)
     
     # Get the player ID to look up
     player_id = get_player_id()
-    filename = f"player_{player_id}.txt"
     
     try:
-        # Try to open and read the file
-        with open(filename, 'r') as file:  # 'r' means read mode
-            content = file.read()  # Read the entire file
-            print("\n" + content)  # Show everything in the file
-            
+        # Try to open the saved report in the store
+        with metrics.stage("load_report"):
+            pieces = get_store().report_pieces(player_id)
+        with metrics.stage("print_report"):
+            say()
+            show_saved_report(player_id, pieces)  # Show everything in the report
+        metrics.count("reports_shown")
+        
     except FileNotFoundError:
         # handling target file not existing
-        print(f"\nSorry, no data found for player {player_id}")
-        print("Make sure you've recorded scores for this player first!")
+        metrics.count("reports_not_found")
+        say(f"\nSorry, no data found for player {player_id}")
+        say("Make sure you've recorded scores for this player first!")
         
     except Exception as e:
         # catching any other file problems
-        print(f"Oops! There was a problem reading the file: {e}")
+        say(f"Oops! There was a problem reading the file: {e}")
     
-    input("\nPress Enter to go back to the main menu...")
+    ask("\nPress Enter to go back to the main menu...")
+
+def show_saved_report(player_id, pieces=None, start_game=None):
+    """
+    Shows a player's saved report a screen at a time (see pager.py), read
+    from the store a piece at a time so it's never all in memory
+    pieces is the report if it's already been opened, and start_game
+    starts it from that game instead of the top
+    Raises FileNotFoundError if the player hasn't been saved, or
+    ValueError if they don't have game start_game
+    """
+    store = get_store()
+
+    def jump(game_number):
+        if not 1 <= game_number <= store.load_stats(player_id)["games"]:
+            return None
+        return pager.skip_to_line(store.report_pieces(player_id), f"Game {game_number}:")
+
+    def summary():
+        return pager.stop_at_line(store.report_pieces(player_id), "DETAILED GAME DATA:")
+
+    if start_game is not None:
+        pieces = jump(start_game)
+        if pieces is None:
+            raise ValueError(f"{player_id} doesn't have a game {start_game}")
+    elif pieces is None:
+        pieces = store.report_pieces(player_id)
+    pager.show_pages(get_session(), pieces, jump, summary)
+
+def print_player_stats(player_id, summary_only=False, start_game=None):
+    """
+    Prints one player's saved report, e.g. python main.py stats P1
+    With summary_only just their stats are looked up, which only reads the
+    top of the report so it's quick however many games they have
+    start_game starts the report from that game, e.g. --game 500
+    Returns the exit code for the program
+    """
+    try:
+        player_id = validate_player_id(player_id)
+        store = get_store()
+        if not summary_only:
+            show_saved_report(player_id, start_game=start_game)
+            return 0
+        with metrics.stage("load_stats"):
+            stats = store.load_stats(player_id)
+    except FileNotFoundError:
+        print(f"Sorry, no data found for player {player_id}")
+        return 1
+    except ValueError as error:
+        print(str(error))
+        return 1
+
+    print(f"Player ID: {stats['player_id']}")
+    print(f"Number of Games: {stats['games']}")
+    print(f"Highest Score: {stats['highest_score']:,}")
+    print(f"Average Time: {stats['average_time']} minutes")
+    print(f"Total Time Played: {stats['total_time']} minutes")
+    return 0
+
+def print_leaderboard(count=10, by="score"):
+    """
+    Prints the top players, best first
+    by="score" ranks them on highest score, by="time" on average time
+    """
+    top_players = get_leaderboard().top(count, by)
+    title = "HIGHEST SCORES" if by == "score" else "LONGEST AVERAGE TIMES"
+
+    say("\n" + "=" * 50)
+    say(f"LEADERBOARD - {title}")
+    say("=" * 50)
+    if len(top_players) == 0:
+        say("No players have been saved yet.")
+    for place, (player_id, highest_score, average_time) in enumerate(top_players, start=1):
+        say(f"{place:>3}. {player_id:<20} {highest_score:>9,} points  {average_time} minutes")
+    say("=" * 50)
+
+def print_query(ranges, by="score", limit=None):
+    """
+    Prints the players whose stats are inside every range, e.g.
+    python main.py query --score 50000:100000 --time :10
+    ranges is a dictionary like {"score": (50000, 100000), "time": (None, 10)}
+    Uses the leaderboard's sorted lists, so no reports are opened
+    """
+    found = get_leaderboard().find(ranges, by, limit)
+
+    print("\n" + "=" * 50)
+    print(f"PLAYERS FOUND: {len(found):,}")
+    print("=" * 50)
+    for player_id, highest_score, average_time, games, total_time in found:
+        print(f"{player_id:<20} {highest_score:>9,} points  {average_time} minutes average  "
+              f"{games:,} games  {round(total_time, 2)} minutes in total")
+    print("=" * 50)
+    return 0
+
+def parse_range(text, number_type):
+    """
+    Turns "LOW:HIGH" into (low, high), leaving out either end leaves it
+    open, e.g. ":10" is (None, 10.0) with number_type float
+    """
+    low, colon, high = text.partition(":")
+    if not colon:
+        raise argparse.ArgumentTypeError(f"{text} should look like LOW:HIGH, e.g. 50000:100000 or :10")
+    try:
+        return (number_type(low) if low.strip() else None,
+                number_type(high) if high.strip() else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{text} should be two numbers, e.g. 50000:100000 or :10")
+
+def parse_count(text):
+    """
+    Turns text into a whole number of at least 1, for how many players to show
+    """
+    try:
+        count = int(text)
+    except ValueError:
+        count = 0
+    if count < 1:
+        raise argparse.ArgumentTypeError(f"{text} should be a whole number of at least 1")
+    return count
+
+def print_rollup(period="week", player_id=None, history=False):
+    """
+    Prints the totals for this day, week, month or season, for one player
+    or the whole club, e.g. python main.py rollup P1 --period month
+    With history every earlier one is shown too
+    Returns the exit code for the program
+    """
+    try:
+        if player_id is not None:
+            player_id = validate_player_id(player_id)
+        rollups = get_rollups()
+        if history:
+            buckets = rollups.history(period, player_id)
+        else:
+            buckets = [(None, rollups.totals(period, player_id))]
+    except ValueError as error:
+        print(str(error))
+        return 1
+
+    who = player_id if player_id is not None else "the whole club"
+    for bucket, totals in buckets:
+        name = bucket if bucket is not None else f"This {period}"
+        print(f"{name} for {who}: {totals.games:,} games, highest score {totals.highest_score:,}, "
+              f"average time {totals.average_time} minutes, total {round(totals.total_time, 2)} minutes")
+    if len(buckets) == 0:
+        print(f"No games recorded for {who} yet.")
+    return 0
+
+def show_leaderboard():
+    """
+    Shows the top 10 players by highest score and by average time
+    """
+    print_leaderboard(10, "score")
+    print_leaderboard(10, "time")
+    ask("\nPress Enter to go back to the main menu...")
+
+def sketches_path():
+    """
+    Returns the file the club's score, time and player sketches are kept in
+    """
+    return os.path.join(get_store().folder, "sketches.json")
+
+def add_to_club_sketches(run_sketches):
+    """
+    Merges the sketches from an import (or another computer) into the club's
+    """
+    import sketches
+
+    path = sketches_path()
+    # Two imports finishing at once would otherwise lose one of them
+    with locks.file_lock(locks.lock_path(get_store().folder, "sketches.lock")):
+        club = sketches.load_sketches(path)
+        club.merge(run_sketches)
+        sketches.save_sketches(path, club)
+
+def ingest_file(path, file_format=None, append=False, sketch_path=None, quarantine_path=None):
+    """
+    Imports lots of games at once from a CSV/JSONL file (or stdin with "-")
+    Rows are streamed through a generator pipeline and each player's stats
+    are saved as soon as all of their rows have been read
+    Players are saved in chunks, each one a single batch in the store
+    Normally a player's games in the file replace what was saved before,
+    with append set to True they are added on to the saved games instead
+    Every game that wasn't saved before also goes into the club's quantile
+    and player sketches, and the sketches for just this import are saved
+    to sketch_path if given
+    Rows are checked in batches and bad ones are skipped, with a count of
+    each problem at the end. Set quarantine_path to also write the bad rows
+    to a JSONL file with the row number and problem for each one
+    """
+    import ingest
+    import sketches
+
+    if file_format is None:
+        file_format = "csv" if path == "-" else ingest.guess_format(path)
+
+    report = ingest.new_report()
+    seen_players = set()
+    # Saved games a replaced player's rows haven't matched yet, for when
+    # their rows are split up in the file
+    unmatched = {}
+    run_sketches = sketches.ClubSketches()
+    start = timer.perf_counter()
+
+    try:
+        file = ingest.open_input(path)
+    except OSError as e:
+        print(f"Oops! Couldn't open {path}: {e}")
+        return 1
+
+    quarantine = None
+    if quarantine_path:
+        try:
+            quarantine = open(quarantine_path, 'w', encoding='utf-8')
+        except OSError as e:
+            file.close()
+            print(f"Oops! Couldn't open {quarantine_path}: {e}")
+            return 1
+
+    with file, quarantine if quarantine is not None else contextlib.nullcontext():
+        records = ingest.read_records(file, file_format)
+        rows = ingest.validate_records(records, report, quarantine)
+
+        for chunk in ingest.chunks(ingest.group_by_player(rows), ingest.CHUNK_PLAYERS):
+            # Each chunk of players is saved as one batch
+            with saving_players([player_id for player_id, _, _ in chunk]):
+                for player_id, scores, times in chunk:
+                    new_games = (scores, times)
+                    if not append:
+                        # Games that were already saved (e.g. the same file imported
+                        # again) don't go into the totals a second time
+                        saved = None
+                        if player_id in seen_players:
+                            saved = unmatched.pop(player_id, collections.Counter())
+                        new_scores, new_times, left = unsaved_games(player_id, scores, times, saved)
+                        new_games = (new_scores, new_times)
+                        if left:
+                            unmatched[player_id] = left
+                    # The sketches get the same new games as the rollups, so importing
+                    # a file again doesn't pull the percentiles towards its players
+                    run_sketches.add_games(player_id, *new_games)
+                    if append or player_id in seen_players:
+                        # Rows for a player that are split up in the file get added
+                        # on to the block that was saved earlier
+                        append_games(player_id, scores, times, quiet=True, new_games=new_games)
+                    else:
+                        highest_score = find_highest_score(scores)
+                        average_time = calculate_average_time(times)
+                        save_to_file(player_id, scores, times, highest_score, average_time, quiet=True,
+                                     new_games=new_games)
+                    seen_players.add(player_id)
+
+    try:
+        add_to_club_sketches(run_sketches)
+        if sketch_path:
+            sketches.save_sketches(sketch_path, run_sketches)
+    except OSError as e:
+        print(f"Oops! Couldn't save the sketches: {e}")
+
+    elapsed = timer.perf_counter() - start
+    total_rows = report["rows"]
+    rejected = report["rejected"]
+    rate = total_rows / elapsed if elapsed > 0 else 0.0
+
+    # Only the first few bad rows are kept, so a messy file doesn't flood the screen
+    for row_number, message in report["examples"]:
+        print(f"Row {row_number} skipped: {message}")
+    if rejected > len(report["examples"]):
+        print(f"...and {rejected - len(report['examples']):,} more bad rows")
+
+    print(f"Imported {total_rows - rejected:,} rows for {len(seen_players):,} players "
+          f"({rejected:,} rejected)")
+    # Most common problems first
+    for name, count in sorted(report["errors"].items(), key=lambda item: -item[1]):
+        print(f"  {name}: {count:,} rows")
+    if quarantine_path and rejected:
+        print(f"Bad rows written to {quarantine_path}")
+    print(f"Took {elapsed:.2f} seconds ({rate:,.0f} rows/sec)")
+    return 0
+
+def show_sketches(merge_paths=()):
+    """
+    Prints the club's estimated score and time percentiles and how many
+    different players have been imported
+    Sketches saved by other imports (e.g. ingest --sketch) can be merged
+    into the club's first
+    Returns the exit code for the program
+    """
+    import sketches
+
+    try:
+        for path in merge_paths:
+            with open(path, 'r') as file:
+                add_to_club_sketches(sketches.ClubSketches.from_text(file.read()))
+        club = sketches.load_sketches(sketches_path())
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Oops! Couldn't read the sketches: {e}")
+        return 1
+
+    print("\n" + "=" * 50)
+    print("CLUB SKETCHES (estimates)")
+    print("=" * 50)
+    if club.games == 0:
+        print("No games have been imported yet.")
+        print("=" * 50)
+        return 0
+
+    print(f"Games: {club.games:,}")
+    print(f"Different players: about {club.players.count():,} "
+          f"(give or take {club.players.standard_error:.1%})")
+    for name, digest in [("Score", club.scores), ("Time", club.times)]:
+        percentiles = ", ".join(f"p{percent}: {digest.quantile(percent / 100):,.2f}"
+                                for percent in (50, 90, 95, 99))
+        print(f"{name} percentiles - {percentiles}")
+    print("=" * 50)
+    return 0
+
+def follow_log(path, from_start=False, should_stop=None, quarantine_path=None):
+    """
+    Follows a JSONL log of game results and saves each new game as soon as
+    it's added, e.g. python main.py follow arcade.jsonl
+    Every game is added with save_new_games, so the reports and running
+    summaries stay right even if the menu is saving at the same time.
+    Lines that arrive close together are saved together, one save per player
+    Runs until Ctrl+C (or until should_stop() says to stop)
+    Bad lines are counted, and written to quarantine_path (JSONL) if it's given
+    Use the SQLite store to keep up with a busy log, it's the only one that
+    saves just the new games instead of the whole report (see follow.py)
+    """
+    import follow
+    import ingest
+
+    try:
+        quarantine = open(quarantine_path, 'a', encoding='utf-8') if quarantine_path else None
+    except OSError as e:
+        print(f"Oops! Couldn't open {quarantine_path}: {e}")
+        return 1
+    follower = follow.LogFollower(path, from_start)
+    report = ingest.new_report()
+    totals = {"games": 0, "players": 0, "errors": 0, "slowest": 0.0, "shown_rejected": 0}
+    last_status = [timer.perf_counter()]
+
+    def save_games(games):
+        # Each batch of lines is saved as one batch in the store, and the
+        # rollups for all of its players are updated together at the end.
+        # Its players are all locked before the batch starts, so their
+        # games can be added without checking versions
+        saved = {}
+        with saving_players(games):
+            for player_id, (scores, times) in games.items():
+                try:
+                    with metrics.stage("follow_save"):
+                        add_locked_games(player_id, scores, times)
+                    saved[player_id] = (scores, times)
+                except Exception as e:
+                    totals["errors"] += 1
+                    print(f"Oops! Couldn't save the games for {player_id}: {e}")
+        get_rollups().add_many(saved)
+
+    def on_batch(games, seconds):
+        totals["games"] += sum(len(scores) for scores, _ in games.values())
+        totals["players"] += len(games)
+        totals["slowest"] = max(totals["slowest"], seconds)
+        # Only show the first few bad lines so a broken machine doesn't flood the screen
+        for message in report["examples"][totals["shown_rejected"]:]:
+            print(f"Bad line skipped: {message}")
+        totals["shown_rejected"] = len(report["examples"])
+        now = timer.perf_counter()
+        if now - last_status[0] >= 5:
+            last_status[0] = now
+            print(f"Saved {totals['games']:,} games so far ({report['rejected']:,} bad lines, "
+                  f"slowest batch {totals['slowest'] * 1000:.1f} ms)")
+
+    print(f"Following {path}, press Ctrl+C to stop")
+    try:
+        follow.follow(follower, save_games, report, on_batch, should_stop, quarantine=quarantine)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        follower.close()
+        if quarantine is not None:
+            quarantine.close()
+
+    print(f"Saved {totals['games']:,} games ({report['rejected']:,} bad lines, "
+          f"{totals['errors']:,} players couldn't be saved)")
+    # Most common problems first, the same as ingest
+    for name, count in sorted(report["errors"].items(), key=lambda item: -item[1]):
+        print(f"  {name}: {count:,} lines")
+    return 0
+
+def compact_store():
+    """
+    Frees up the space taken by old reports that have been replaced
+    Only the indexed store keeps old reports around
+    """
+    store = get_store()
+    if not hasattr(store, "compact"):
+        print("Nothing to compact, this store doesn't keep old reports.")
+        return 0
+
+    freed = store.compact()
+    print(f"Compacted the store and freed {freed:,} bytes")
+    return 0
+
+def show_club_stats(bins=10, top=10):
+    """
+    Shows statistics for every game played by every saved player, and the
+    top players by points per minute
+    """
+    try:
+        import club_stats
+    except ImportError:
+        print("Club stats need NumPy, install it with: pip install numpy")
+        return 1
+
+    games = club_stats.load_club_games(get_store())
+    stats = club_stats.club_stats(games, bins=bins)
+
+    print("=" * 60)
+    print("CLUB STATISTICS")
+    print("=" * 60)
+    print(f"Players: {stats['players']:,}")
+    print(f"Games played: {stats['games']:,}")
+    if stats["games"] == 0:
+        print("No games have been saved yet.")
+        return 0
+
+    print(f"Highest Score: {stats['highest_score']:,}")
+    print(f"Average Time per Game: {stats['average_time']} minutes")
+    print(f"Score standard deviation: {stats['score_std']:,.2f}")
+    print(f"Time standard deviation: {stats['time_std']:.2f} minutes")
+    print(f"Points per minute: {stats['score_per_minute']:,.2f}")
+
+    print("\n" + "-" * 60)
+    print("PERCENTILES")
+    print("-" * 60)
+    for percentile, score, time in zip(stats["percentiles"], stats["score_percentiles"],
+                                       stats["time_percentiles"]):
+        print(f"  {percentile}th: score {score:,.1f}, time {time:.2f} minutes")
+
+    print("\n" + "-" * 60)
+    print("SCORE HISTOGRAM")
+    print("-" * 60)
+    counts, edges = stats["score_histogram"]
+    biggest = max(counts.max(), 1)
+    for count, low, high in zip(counts, edges[:-1], edges[1:]):
+        bar = "#" * int(round(40 * count / biggest))
+        print(f"  {low:>11,.0f} - {high:>11,.0f} | {bar} {count:,}")
+
+    if top > 0:
+        print("\n" + "-" * 60)
+        print("TOP PLAYERS BY POINTS PER MINUTE")
+        print("-" * 60)
+        for rank, (player_id, played, rate, highest, (median, top_tenth)) in enumerate(
+                club_stats.top_players(games, top, (50, 90)), start=1):
+            print(f"  {rank}. {player_id}: {rate:,.2f} points/min over {played:,} games, "
+                  f"highest {highest:,}, median {median:,.1f}, 90th {top_tenth:,.1f}")
+    print("=" * 60)
+    return 0
+
+def render_all_reports(folder="reports", workers=None, chunk_size=200):
+    """
+    Writes a player_<ID>.txt report for every saved player into the folder
+    The work is split across worker processes and the speed of each one is shown
+    """
+    import render
+
+    store = get_store()
+    if store.store_type == "files" and os.path.realpath(store.folder or ".") == os.path.realpath(folder or "."):
+        print("That's the store's own folder, pick another one with --output")
+        return 1
+
+    start = timer.perf_counter()
+    try:
+        results = render.render_all(store, folder, workers, chunk_size)
+    except (OSError, ValueError) as e:
+        print(f"Oops! Couldn't write the reports: {e}")
+        return 1
+    elapsed = timer.perf_counter() - start
+
+    totals = render.worker_totals(results)
+    for worker_number, (players, written, seconds) in enumerate(totals.values(), start=1):
+        rate = players / seconds if seconds > 0 else 0.0
+        print(f"Worker {worker_number}: {players:,} reports, {written / 1e6:,.2f} MB "
+              f"in {seconds:.2f} seconds ({rate:,.0f} reports/sec)")
+
+    players = sum(total[0] for total in totals.values())
+    rate = players / elapsed if elapsed > 0 else 0.0
+    print(f"Wrote {players:,} reports with {len(totals)} workers in {elapsed:.2f} seconds "
+          f"({rate:,.0f} reports/sec)")
+    return 0
+
+def export_columns(folder="export", rebuild=False):
+    """
+    Writes every saved game into binary columns in folder for analysis
+    (see export.py for the layout). Only players saved since the last
+    export are written again, unless rebuild is True
+    """
+    import export
+
+    start = timer.perf_counter()
+    try:
+        written, rows, dead_rows = export.export_games(get_store(), folder, rebuild)
+    except (OSError, ValueError) as e:
+        print(f"Oops! Couldn't export the games: {e}")
+        return 1
+    elapsed = timer.perf_counter() - start
+
+    print(f"Exported {written:,} players in {elapsed:.2f} seconds")
+    print(f"{folder} has {rows - dead_rows:,} games ({dead_rows:,} replaced rows to skip)")
+    return 0
+
+def save_site_snapshot(site, output=None):
+    """
+    Saves a snapshot of every player's totals at this branch of the club,
+    e.g. python main.py snapshot north, to be merged with other branches'
+    """
+    import snapshot
+
+    output = output or f"snapshot_{site}.json"
+    try:
+        site_snapshot = snapshot.Snapshot.from_store(get_store(), site)
+        snapshot.save_snapshot(output, site_snapshot)
+    except OSError as e:
+        print(f"Oops! Couldn't save the snapshot: {e}")
+        return 1
+    print(f"Saved {len(site_snapshot.players):,} players ({site_snapshot.games:,} games) "
+          f"from {site} to {output}")
+    return 0
+
+def merge_site_snapshots(paths, output=None, player_id=None):
+    """
+    Merges snapshots from several branches (or earlier merges) into one
+    and shows the totals for the whole club, or for one player
+    """
+    import snapshot
+
+    try:
+        merged = snapshot.merge_snapshots([snapshot.load_snapshot(path) for path in paths])
+        if output:
+            snapshot.save_snapshot(output, merged)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Oops! Couldn't merge the snapshots: {e}")
+        return 1
+
+    print(f"Branches: {', '.join(merged.sites)}")
+    print(f"Players: {len(merged.players):,} (about {merged.sketches.players.count():,} different "
+          f"by the sketch)")
+    print(f"Games: {merged.games:,}")
+    if merged.sketches.games:
+        print(f"Median score: {merged.sketches.scores.quantile(0.5):,.0f}")
+    if player_id is not None:
+        player_id = player_id.upper()
+        totals = merged.players.get(player_id)
+        if totals is None:
+            print(f"No games for player {player_id} at any of these branches")
+        else:
+            print(f"{player_id}: {totals.games:,} games, highest score {totals.highest_score:,}, "
+                  f"average time {totals.average_time} minutes")
+    if output:
+        print(f"Saved the merged snapshot to {output}")
+    return 0
+
+def migrate_reports(folder, checkpoint_path="migrate.checkpoint", workers=None, chunk_size=200,
+                    restart=False):
+    """
+    Moves an archive of player_<ID>.txt reports into the current store
+    Reports whose SUMMARY doesn't match their games are skipped and listed
+    Running it again after it was stopped carries on where it left off
+    """
+    import migrate
+
+    store = get_store()
+    if store.store_type == "files" and os.path.realpath(store.folder or ".") == os.path.realpath(folder or "."):
+        print("Those reports are already in the store, pick another one with --store")
+        return 1
+
+    def save_chunk(players):
+        # Each chunk is saved as one batch
+        with saving_players([player_id for player_id, _, _ in players]):
+            for player_id, scores, times in players:
+                save_player_data(player_id, scores, times, find_highest_score(scores),
+                                 calculate_average_time(times), RunningSummary.from_games(scores, times))
+
+    start = timer.perf_counter()
+    try:
+        checkpoint = migrate.migrate(folder, save_chunk, checkpoint_path, workers, chunk_size, restart)
+    except (OSError, ValueError) as e:
+        print(f"Oops! Couldn't migrate the reports: {e}")
+        return 1
+    elapsed = timer.perf_counter() - start
+
+    problems = checkpoint["problems"]
+    # Only show the first few bad reports so a messy archive doesn't flood the screen
+    for name, message in problems[:10]:
+        print(f"{name} skipped: {message}")
+    if checkpoint["skipped"] > 10:
+        print(f"...and {checkpoint['skipped'] - 10:,} more bad reports")
+
+    print(f"Migrated {checkpoint['migrated']:,} players into the {store.store_type} store "
+          f"({checkpoint['skipped']:,} skipped)")
+    print(f"Took {elapsed:.2f} seconds")
+    return 0
+
+def run_service(host="127.0.0.1", port=8080, workers=8):
+    """
+    Runs the web service so lots of terminals can record and read stats at once
+    """
+    import asyncio
+    import server
+
+    try:
+        asyncio.run(server.run_server(host, port, workers))
+    except KeyboardInterrupt:
+        print("\nStopped the stats service.")
+    return 0
+
+def build_parser():
+    """
+    Sets up the command line tools that run instead of the menu
+    """
+    parser = argparse.ArgumentParser(prog="main.py",
+                                     description="Games Club Statistics Program")
+    parser.add_argument("--store", choices=storage.STORE_TYPES,
+                        help="where player reports are kept (default: files, "
+                             "or the GAMES_CLUB_STORE environment variable)")
+    parser.add_argument("--fsync", action="store_true",
+                        help="make sure saves reach the disk, flushing once per batch of players")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="time each stage and write the timings to PATH on exit, as "
+                             "Prometheus text for a .prom file and JSON otherwise "
+                             f"(or set {metrics.METRICS_ENV})")
+    # Leaving out the command runs the menu, e.g. python main.py --metrics times.json
+    commands = parser.add_subparsers(dest="command")
+
+    ingest_parser = commands.add_parser("ingest", help="import games from a CSV or JSONL file")
+    ingest_parser.add_argument("path", help="file to import, or - to read from stdin")
+    ingest_parser.add_argument("--format", choices=["csv", "jsonl"], dest="file_format",
+                               help="file format (worked out from the file name if left out)")
+    ingest_parser.add_argument("--append", action="store_true",
+                               help="add the games to each player's saved games instead of replacing them")
+    ingest_parser.add_argument("--sketch", metavar="PATH", dest="sketch_path",
+                               help="also save the sketches for just this import to PATH")
+    ingest_parser.add_argument("--quarantine", metavar="PATH", dest="quarantine_path",
+                               help="write the bad rows to PATH (JSONL) so they can be fixed and imported again")
+
+    follow_parser = commands.add_parser("follow", help="save games from a JSONL log as they are added to it")
+    follow_parser.add_argument("path", help="the log to follow")
+    follow_parser.add_argument("--from-start", action="store_true",
+                               help="save the games already in the log too, not just new ones")
+    follow_parser.add_argument("--quarantine", metavar="PATH", dest="quarantine_path",
+                               help="add the bad lines to PATH (JSONL) so they can be fixed and saved again")
+
+    sketches_parser = commands.add_parser("sketches", help="show estimated percentiles and player counts")
+    sketches_parser.add_argument("--merge", nargs="+", default=[], metavar="PATH",
+                                 help="merge sketches saved by other imports into the club's first")
+
+    commands.add_parser("compact", help="free up space used by old reports in the indexed store")
+
+    stats_parser = commands.add_parser("stats", help="show a player's saved report")
+    stats_parser.add_argument("player_id", metavar="PLAYER", help="the player to show")
+    stats_parser.add_argument("--summary", action="store_true",
+                              help="only show their stats, without reading their games")
+    stats_parser.add_argument("--game", type=int, metavar="N", dest="start_game",
+                              help="start the report at game N")
+
+    leaderboard_parser = commands.add_parser("leaderboard", help="show the top players")
+    leaderboard_parser.add_argument("-k", "--top", type=parse_count, default=10, dest="count",
+                                    help="how many players to show (default: 10)")
+    leaderboard_parser.add_argument("--by", choices=SORT_KEYS, default="score",
+                                    help="rank on highest score or average time (default: score)")
+
+    query_parser = commands.add_parser("query", help="find players whose stats are in a range")
+    query_parser.add_argument("--score", type=lambda text: parse_range(text, int), metavar="LOW:HIGH",
+                              help="highest score, e.g. 50000:100000")
+    query_parser.add_argument("--time", type=lambda text: parse_range(text, float), metavar="LOW:HIGH",
+                              help="average time in minutes, e.g. :10 for 10 or less")
+    query_parser.add_argument("--games", type=lambda text: parse_range(text, int), metavar="LOW:HIGH",
+                              help="number of games played, e.g. 5: for 5 or more")
+    query_parser.add_argument("--total", type=lambda text: parse_range(text, float), metavar="LOW:HIGH",
+                              help="total minutes played")
+    query_parser.add_argument("--by", choices=INDEX_FIELDS, default="score",
+                              help="what to sort the players on, biggest first (default: score)")
+    query_parser.add_argument("-k", "--limit", type=int, help="only show this many players")
+
+    rollup_parser = commands.add_parser("rollup", help="show totals for this day, week, month or season")
+    rollup_parser.add_argument("player_id", metavar="PLAYER", nargs="?",
+                               help="the player to show (default: the whole club)")
+    rollup_parser.add_argument("--period", choices=PERIODS, default="week",
+                               help="which totals to show (default: week)")
+    rollup_parser.add_argument("--history", action="store_true",
+                               help="show every earlier day, week, month or season too")
+
+    render_parser = commands.add_parser("render-all", help="write a report file for every saved player")
+    render_parser.add_argument("--output", default="reports",
+                               help="folder to write the reports into (default: reports)")
+    render_parser.add_argument("--workers", type=int,
+                               help="number of worker processes (default: one per CPU core)")
+    render_parser.add_argument("--chunk-size", type=int, default=200,
+                               help="players handed to a worker at a time (default: 200)")
+
+    migrate_parser = commands.add_parser("migrate", help="move a folder of player_<ID>.txt reports into the store")
+    migrate_parser.add_argument("folder", help="folder with the reports in")
+    migrate_parser.add_argument("--checkpoint", default="migrate.checkpoint",
+                                help="file that keeps track of how far it got (default: migrate.checkpoint)")
+    migrate_parser.add_argument("--restart", action="store_true",
+                                help="ignore the checkpoint and start from the first report")
+    migrate_parser.add_argument("--workers", type=int,
+                                help="number of worker processes reading reports (default: one per CPU core)")
+    migrate_parser.add_argument("--chunk-size", type=int, default=200,
+                                help="reports handed to a worker at a time (default: 200)")
+
+    export_parser = commands.add_parser("export", help="write every game into binary columns for analysis")
+    export_parser.add_argument("folder", nargs="?", default="export",
+                               help="folder to write the columns into (default: export)")
+    export_parser.add_argument("--rebuild", action="store_true",
+                               help="write every player again, not just the ones that changed")
+
+    snapshot_parser = commands.add_parser("snapshot", help="save this branch's player totals for merging")
+    snapshot_parser.add_argument("site", help="name of this branch, e.g. north")
+    snapshot_parser.add_argument("--output", help="file to save it to (default: snapshot_<site>.json)")
+
+    merge_parser = commands.add_parser("merge-snapshots", help="combine snapshots from several branches")
+    merge_parser.add_argument("paths", nargs="+", metavar="PATH", help="snapshots to merge")
+    merge_parser.add_argument("--output", help="save the merged snapshot to this file")
+    merge_parser.add_argument("--player", help="also show this player's merged stats")
+
+    serve_parser = commands.add_parser("serve", help="run the web service for recording and reading stats")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    serve_parser.add_argument("--workers", type=int, default=8,
+                              help="threads used for loading and saving (default: 8)")
+
+    club_parser = commands.add_parser("club-stats", help="show statistics for the whole club (needs NumPy)")
+    club_parser.add_argument("--bins", type=int, default=10,
+                              help="number of bars in the score histogram (default: 10)")
+    club_parser.add_argument("--top", type=int, default=10,
+                              help="number of top players to list (default: 10)")
+
+    return parser
+
+def run_command(argv):
+    """
+    Runs one of the command line tools, e.g. python main.py ingest results.csv
+    Returns the exit code for the program
+    """
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        metrics.enable(args.metrics)
+    if args.store or args.fsync:
+        store_type = args.store or os.environ.get("GAMES_CLUB_STORE", "files")
+        set_store(storage.open_store(store_type, sync=args.fsync))
+
+    if args.command is None:
+        main()
+        return 0
+
+    if args.command == "ingest":
+        return ingest_file(args.path, args.file_format, args.append, args.sketch_path,
+                           args.quarantine_path)
+    if args.command == "follow":
+        return follow_log(args.path, args.from_start, quarantine_path=args.quarantine_path)
+    if args.command == "sketches":
+        return show_sketches(args.merge)
+    if args.command == "compact":
+        return compact_store()
+    if args.command == "stats":
+        return print_player_stats(args.player_id, args.summary, args.start_game)
+    if args.command == "leaderboard":
+        print_leaderboard(args.count, args.by)
+        return 0
+    if args.command == "query":
+        ranges = {field: getattr(args, field) for field in INDEX_FIELDS if getattr(args, field) is not None}
+        return print_query(ranges, args.by, args.limit)
+    if args.command == "rollup":
+        return print_rollup(args.period, args.player_id, args.history)
+    if args.command == "render-all":
+        return render_all_reports(args.output, args.workers, args.chunk_size)
+    if args.command == "migrate":
+        return migrate_reports(args.folder, args.checkpoint, args.workers, args.chunk_size, args.restart)
+    if args.command == "export":
+        return export_columns(args.folder, args.rebuild)
+    if args.command == "snapshot":
+        return save_site_snapshot(args.site, args.output)
+    if args.command == "merge-snapshots":
+        return merge_site_snapshots(args.paths, args.output, args.player)
+    if args.command == "serve":
+        return run_service(args.host, args.port, args.workers)
+    if args.command == "club-stats":
+        return show_club_stats(args.bins, args.top)
+    return 1
 
 # This line runs the program when you execute this file
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_command(sys.argv[1:]))
     main()
\ No newline at end of file
@@ -0,0 +1,266 @@
+"""
+Stage timings and counters for the Games Club Statistics Program
+Shows where the time goes when recording or looking up players is slow
+
+Turn it on by setting the GAMES_CLUB_METRICS environment variable (or the
+--metrics option) to a file name. When the program exits the timings are
+written there, in Prometheus text format if the name ends in .prom and as
+JSON otherwise. When it's off, stage() and count() return straight away
+
+    with metrics.stage("save"):
+        save_player_data(...)
+    metrics.count("players_saved")
+"""
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time as timer
+
+METRICS_ENV = "GAMES_CLUB_METRICS"
+
+# Histogram buckets go up by a quarter of a power of two from 1 microsecond
+# to a couple of minutes, so a percentile is never more than 19% out
+BUCKET_BOUNDS = [1e-6 * 2 ** (step / 4) for step in range(4 * 28)]
+PERCENTILES = [50, 95, 99]
+
+
+class Histogram:
+    """
+    How long a stage took each time, kept as counts per bucket so it stays
+    the same size however many times the stage runs
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)  # the last one is for anything longer
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds):
+        """
+        Adds one timing
+        """
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """
+        Returns roughly how long the given percent of timings took at most
+        It is the top of the bucket the percentile falls in (but never more
+        than the longest timing), or None if nothing has been timed
+        """
+        if self.count == 0:
+            return None
+        wanted = max(1, -(-self.count * percent // 100))  # rounded up
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= wanted:
+                break
+        bound = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+        return min(max(bound, self.min), self.max)
+
+    def to_dict(self):
+        stats = {"count": self.count, "total_seconds": self.total,
+                 "min_seconds": self.min, "max_seconds": self.max}
+        for percent in PERCENTILES:
+            stats[f"p{percent}_seconds"] = self.percentile(percent)
+        return stats
+
+
+class _Stage:
+    """
+    Times one run of a stage (returned by Registry.stage)
+    """
+
+    __slots__ = ("histogram", "lock", "start")
+
+    def __init__(self, histogram, lock):
+        self.histogram = histogram
+        self.lock = lock
+
+    def __enter__(self):
+        self.start = timer.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = timer.perf_counter() - self.start
+        with self.lock:
+            self.histogram.observe(seconds)
+        return False
+
+
+class Registry:
+    """
+    Every stage's timings and every counter, by name
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        # Stages can be timed from several threads (e.g. the web service)
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        """
+        Returns a context manager that times the block inside it
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return _Stage(histogram, self._lock)
+
+    def count(self, name, amount=1):
+        """
+        Adds to a counter
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "stages": {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def to_json(self):
+        """
+        Returns the timings and counters as JSON text
+        """
+        return json.dumps(self.to_dict(), indent=2) + "\n"
+
+    def to_prometheus(self):
+        """
+        Returns the timings and counters in Prometheus text format
+        Bucket lines are only written at whole powers of two to keep it short
+        """
+        lines = []
+        with self._lock:
+            lines.append("# HELP games_club_stage_seconds Time spent in each stage")
+            lines.append("# TYPE games_club_stage_seconds histogram")
+            for name, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for index, bound in enumerate(BUCKET_BOUNDS):
+                    cumulative += histogram.counts[index]
+                    if index % 4 == 0:
+                        lines.append(f'games_club_stage_seconds_bucket{{stage="{name}",le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'games_club_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'games_club_stage_seconds_sum{{stage="{name}"}} {histogram.total:.9g}')
+                lines.append(f'games_club_stage_seconds_count{{stage="{name}"}} {histogram.count}')
+
+            lines.append("# HELP games_club_stage_latency_seconds Percentiles of the time spent in each stage")
+            lines.append("# TYPE games_club_stage_latency_seconds summary")
+            for name, histogram in sorted(self.histograms.items()):
+                for percent in PERCENTILES:
+                    value = histogram.percentile(percent)
+                    lines.append(f'games_club_stage_latency_seconds{{stage="{name}",quantile="{percent / 100}"}} '
+                                 f'{value if value is not None else "NaN"}')
+                lines.append(f'games_club_stage_latency_seconds_sum{{stage="{name}"}} {histogram.total:.9g}')
+                lines.append(f'games_club_stage_latency_seconds_count{{stage="{name}"}} {histogram.count}')
+
+            lines.append("# HELP games_club_events_total Things counted while the program ran")
+            lines.append("# TYPE games_club_events_total counter")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'games_club_events_total{{event="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """
+        Writes the timings and counters to a file, as Prometheus text if the
+        name ends in .prom and as JSON otherwise
+        """
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        with open(path, 'w') as file:
+            file.write(text)
+
+
+# The registry in use, None while metrics are off
+_registry = None
+# Where the registry is written when the program exits
+_dump_path = None
+_exit_hook_added = False
+
+
+class _NoStage:
+    """
+    Stands in for a stage timer while metrics are off
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+def stage(name):
+    """
+    Times the block inside it as one run of the named stage
+    """
+    if _registry is None:
+        return _NO_STAGE
+    return _registry.stage(name)
+
+def count(name, amount=1):
+    """
+    Adds to the named counter
+    """
+    if _registry is not None:
+        _registry.count(name, amount)
+
+def enabled():
+    return _registry is not None
+
+def get_registry():
+    """
+    Returns the registry in use, or None if metrics are off
+    """
+    return _registry
+
+def enable(path=None):
+    """
+    Turns metrics on, writing them to path (if given) when the program exits
+    Timings recorded before are kept
+    """
+    global _registry, _dump_path, _exit_hook_added
+    if _registry is None:
+        _registry = Registry()
+    if path:
+        _dump_path = path
+        if not _exit_hook_added:
+            atexit.register(_dump_at_exit)
+            _exit_hook_added = True
+    return _registry
+
+def disable():
+    """
+    Turns metrics off and forgets everything recorded
+    """
+    global _registry, _dump_path
+    _registry = None
+    _dump_path = None
+
+def _dump_at_exit():
+    if _registry is not None and _dump_path:
+        try:
+            _registry.dump(_dump_path)
+        except OSError as error:
+            print(f"Couldn't write the metrics to {_dump_path}: {error}")
+
+if os.environ.get(METRICS_ENV):
+    enable(os.environ[METRICS_ENV])
@@ -0,0 +1,163 @@
+"""
+Moves an archive of player_<ID>.txt reports into another store
+Every report is read back (RAW DATA for the games, SUMMARY for the stats)
+and its stats are checked against the games before it is saved
+
+Reading and checking the reports is split into chunks that run on a pool of
+worker processes, while this process saves each chunk into the store in one
+batch. Only a few chunks are ever waiting to be saved, so memory stays the
+same however big the archive is
+
+After every chunk is saved, a checkpoint file records the last report done,
+so a migration that gets stopped part way carries on from there next time
+"""
+
+import json
+import math
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import storage
+from main import find_highest_score, calculate_average_time
+from report import parse_raw_data, parse_summary
+
+# Chunks each worker can have waiting to be saved before more are handed out
+CHUNKS_AHEAD = 2
+
+# Skipped reports kept in the checkpoint to show at the end (the rest are only counted)
+MAX_PROBLEMS_KEPT = 100
+
+def find_reports(folder):
+    """
+    Lists the player_<ID>.txt file names in a folder, sorted so every run
+    goes through them in the same order
+    """
+    names = []
+    with os.scandir(folder or ".") as entries:
+        for entry in entries:
+            if entry.name.startswith("player_") and entry.name.endswith(".txt") and entry.is_file():
+                names.append(entry.name)
+    names.sort()
+    return names
+
+def check_report(name, text):
+    """
+    Reads a report and checks its SUMMARY agrees with its RAW DATA
+    Returns (player_id, scores, times)
+    Raises ValueError saying what is wrong if it doesn't agree
+    """
+    player_id = name[len("player_"):-len(".txt")]
+    scores, times = parse_raw_data(text)
+    stats = parse_summary(text)
+
+    if len(scores) != len(times):
+        raise ValueError(f"has {len(scores)} scores but {len(times)} times")
+    problems = []
+    if stats["player_id"] != player_id:
+        problems.append(f"player ID {stats['player_id']} doesn't match the file name")
+    if stats["games"] != len(scores):
+        problems.append(f"says {stats['games']} games but has {len(scores)}")
+    if stats["highest_score"] != find_highest_score(scores):
+        problems.append(f"says highest score {stats['highest_score']} but it is {find_highest_score(scores)}")
+    # Reports saved with a running summary add the times up more exactly,
+    # which can very rarely round the average the other way
+    exact_average = round(math.fsum(times) / len(times), 2) if len(times) > 0 else 0.0
+    if stats["average_time"] not in (calculate_average_time(times), exact_average):
+        problems.append(f"says average time {stats['average_time']} but it is {calculate_average_time(times)}")
+    # Adding up in a different order can change the last few digits
+    if not math.isclose(stats["total_time"], math.fsum(times), rel_tol=1e-9, abs_tol=1e-6):
+        problems.append(f"says total time {stats['total_time']} but it is {math.fsum(times)}")
+    if problems:
+        raise ValueError(", ".join(problems))
+    return player_id, scores, times
+
+def read_chunk(folder, names):
+    """
+    Reads and checks a list of reports
+    Returns (players, problems) where players is a list of
+    (player_id, scores, times) and problems a list of (file name, message)
+    """
+    players = []
+    problems = []
+    for name in names:
+        try:
+            with open(os.path.join(folder, name), 'r') as file:
+                players.append(check_report(name, file.read()))
+        except (OSError, ValueError) as error:
+            problems.append((name, str(error)))
+    return players, problems
+
+def load_checkpoint(path):
+    """
+    Returns what an earlier run saved in the checkpoint file, or None if
+    there isn't one
+    """
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+def save_checkpoint(path, checkpoint):
+    storage.write_atomically(path, json.dumps(checkpoint) + "\n")
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def migrate(folder, save_chunk, checkpoint_path, workers=None, chunk_size=200, restart=False):
+    """
+    Moves every report in the folder into a store
+    save_chunk(players) is called in this process for each chunk of
+    (player_id, scores, times), in the same order every run
+    With workers set to 1 everything runs in this process
+    Returns the checkpoint, which has how many players were migrated, how
+    many reports were skipped and why (for the first MAX_PROBLEMS_KEPT)
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1 or chunk_size < 1:
+        raise ValueError("workers and chunk size must be at least 1")
+
+    source = os.path.realpath(folder or ".")
+    checkpoint = None if restart else load_checkpoint(checkpoint_path)
+    if checkpoint is not None and checkpoint.get("source") != source:
+        raise ValueError(f"{checkpoint_path} is for migrating {checkpoint.get('source')}, "
+                         f"use a different checkpoint or start again")
+    if checkpoint is None:
+        checkpoint = {"source": source, "last_done": "", "migrated": 0, "skipped": 0,
+                      "problems": [], "finished": False}
+
+    names = [name for name in find_reports(folder) if name > checkpoint["last_done"]]
+
+    def finish_chunk(names_in_chunk, players, problems):
+        save_chunk(players)
+        checkpoint["last_done"] = names_in_chunk[-1]
+        checkpoint["migrated"] += len(players)
+        checkpoint["skipped"] += len(problems)
+        room = MAX_PROBLEMS_KEPT - len(checkpoint["problems"])
+        checkpoint["problems"].extend(problems[:max(room, 0)])
+        save_checkpoint(checkpoint_path, checkpoint)
+
+    chunks = _chunks(names, chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            finish_chunk(chunk, *read_chunk(folder, chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Chunks are saved in the order they were handed out so the
+            # checkpoint only ever moves past reports that are all saved
+            waiting = deque()
+            for chunk in chunks:
+                waiting.append((chunk, executor.submit(read_chunk, folder, chunk)))
+                if len(waiting) >= workers * CHUNKS_AHEAD:
+                    chunk_done, future = waiting.popleft()
+                    finish_chunk(chunk_done, *future.result())
+            while waiting:
+                chunk_done, future = waiting.popleft()
+                finish_chunk(chunk_done, *future.result())
+
+    checkpoint["finished"] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+    return checkpoint
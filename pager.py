@@ -0,0 +1,156 @@
+"""
+Paged output for the Games Club Statistics Program
+Long reports and results are shown a screen at a time from a generator of
+pieces of text, so the whole text is never built. Each screen goes out in
+one write instead of a print for every line
+
+Between screens the user can press Enter for the next one, type a game
+number to jump to that game, s to see just the summary or q to stop
+Sessions that aren't a terminal (output sent to a file or a pipe, or a
+ScriptedSession) get everything with no stops, still written in big blocks
+"""
+
+import itertools
+
+PROMPT = "-- Enter for more, a game number to jump to, s for summary only, q to stop: "
+
+# Characters collected before each write when not stopping between screens
+WRITE_SIZE = 65536
+
+
+def screen_rows(pieces, width):
+    """
+    Splits pieces of text into the rows they take up on screen, cutting
+    lines longer than width so one huge line can't fill the memory
+    Yields each row without its newline
+    """
+    partial = ""
+    for piece in pieces:
+        text = partial + piece
+        start = 0
+        while True:
+            end = text.find("\n", start, start + width + 1)
+            if end != -1:
+                yield text[start:end]
+                start = end + 1
+            elif len(text) - start > width:
+                yield text[start:start + width]
+                start += width
+            else:
+                break
+        partial = text[start:]
+    if partial:
+        yield partial
+
+def skip_to_line(pieces, prefix):
+    """
+    Yields the pieces from the first line starting with prefix onwards
+    (nothing if there isn't one)
+    """
+    pieces = iter(pieces)
+    # Starting with a newline lets the very first line match too
+    text = "\n"
+    try:
+        for piece in pieces:
+            text += piece
+            position = text.find("\n" + prefix)
+            if position != -1:
+                yield text[position + 1:]
+                yield from pieces
+                return
+            # Keep enough of the end to find a prefix split between two pieces
+            text = text[-len(prefix):]
+    finally:
+        _close(pieces)
+
+def stop_at_line(pieces, prefix):
+    """
+    Yields the pieces up to (not including) the first line starting with prefix
+    """
+    text = ""
+    try:
+        for piece in pieces:
+            text += piece
+            position = text.find("\n" + prefix)
+            if position != -1:
+                yield text[:position + 1]
+                return
+            # Hold back enough of the end to find a prefix split between two pieces
+            cut = max(len(text) - len(prefix), 0)
+            yield text[:cut]
+            text = text[cut:]
+        yield text
+    finally:
+        _close(pieces)
+
+def write_all(pieces, say):
+    """
+    Writes every piece with no stops, WRITE_SIZE characters at a time
+    """
+    block = []
+    size = 0
+    for piece in pieces:
+        block.append(piece)
+        size += len(piece)
+        if size >= WRITE_SIZE:
+            say("".join(block), end="")
+            block = []
+            size = 0
+    if block:
+        say("".join(block), end="")
+
+def _close(pieces):
+    if hasattr(pieces, "close"):
+        pieces.close()
+
+def show_pages(session, pieces, jump=None, summary=None):
+    """
+    Shows pieces of text through a session a screen at a time
+    The session's page_rows is how many rows fit on a screen (None for no
+    stops) and width how wide they are
+    jump(game_number) returns the pieces starting at that game, or None if
+    there's no such game, and summary() returns the pieces for just the
+    summary. Either can be left out if it isn't possible
+    Generators that are left part way are closed, so files get closed
+    """
+    page_rows = getattr(session, "page_rows", None)
+    if not page_rows:
+        try:
+            write_all(pieces, session.say)
+        finally:
+            _close(pieces)
+        return
+
+    width = getattr(session, "width", 80)
+    try:
+        rows = screen_rows(pieces, width)
+        held = []  # the row after the last screen, if there is one
+        while True:
+            # One row more than fits, to know if there's anything after this screen
+            screen = held + list(itertools.islice(rows, page_rows + 1 - len(held)))
+            held = screen[page_rows:]
+            screen = screen[:page_rows]
+            if screen:
+                session.say("\n".join(screen) + "\n", end="")
+            if not held:
+                return
+
+            answer = session.ask(PROMPT).strip().lower()
+            if answer == "q":
+                return
+            if answer == "s" and summary is not None:
+                _close(pieces)
+                pieces = summary()
+                rows = screen_rows(pieces, width)
+                held = []
+            elif answer.isdigit() and jump is not None:
+                jumped = jump(int(answer))
+                if jumped is None:
+                    session.say(f"There's no game {answer}.")
+                else:
+                    _close(pieces)
+                    pieces = jumped
+                    rows = screen_rows(pieces, width)
+                    held = []
+    finally:
+        _close(pieces)
@@ -0,0 +1,107 @@
+"""
+Report rendering for the whole club
+Builds the player_<ID>.txt report for every saved player and writes them
+to a folder, either one after another or split into chunks that run on a
+pool of worker processes
+
+Each worker opens its own copy of the store, so loading the games is
+spread across the workers as well as building and writing the text.
+Each player's games are read while holding their lock, so a report is
+never built from a save that's only half done
+"""
+
+import os
+import time as timer
+from concurrent.futures import ProcessPoolExecutor
+
+import locks
+import storage
+from main import find_highest_score, calculate_average_time
+from report import build_report
+
+# The store each worker process reads from (set up by _start_worker)
+_worker_store = None
+
+def render_player(store, player_id, folder):
+    """
+    Writes one player's report into the folder
+    The stats are worked out the same way save_to_file's callers do, so the
+    file is exactly what recording the games would have written
+    Returns how many bytes were written
+    """
+    with locks.player_lock(store.folder, player_id):
+        scores, times = store.load_games(player_id)
+    text = build_report(player_id, scores, times, find_highest_score(scores),
+                        calculate_average_time(times))
+    storage.write_atomically(os.path.join(folder, f"player_{player_id}.txt"), text)
+    return len(text)
+
+def render_chunk(store, player_ids, folder):
+    """
+    Writes the reports for a list of players
+    Returns (process ID, players written, bytes written, seconds taken)
+    """
+    start = timer.perf_counter()
+    written = 0
+    for player_id in player_ids:
+        written += render_player(store, player_id, folder)
+    return os.getpid(), len(player_ids), written, timer.perf_counter() - start
+
+def _start_worker(store_type, store_folder):
+    """
+    Opens the store once when a worker process starts
+    """
+    global _worker_store
+    _worker_store = storage.open_store(store_type, store_folder)
+
+def _render_chunk_in_worker(player_ids, folder):
+    """
+    Renders a chunk with the worker's own store
+    """
+    return render_chunk(_worker_store, player_ids, folder)
+
+def chunk_list(items, size):
+    """
+    Splits a list into lists of up to size items
+    """
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def render_all(store, folder, workers=None, chunk_size=200):
+    """
+    Writes the report for every player in the store into the folder
+    With workers set to 1 everything runs in this process, otherwise the
+    players are split into chunks for a pool of worker processes
+    (workers=None uses one per CPU core)
+    Returns one (process ID, players, bytes, seconds) tuple per chunk
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1 or chunk_size < 1:
+        raise ValueError("workers and chunk size must be at least 1")
+
+    # Sorted so chunks come out the same whichever store is used
+    player_ids = sorted(store.player_ids())
+    chunks = chunk_list(player_ids, chunk_size)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    if workers == 1 or len(chunks) <= 1:
+        return [render_chunk(store, chunk, folder) for chunk in chunks]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_start_worker,
+                             initargs=(store.store_type, store.folder)) as executor:
+        futures = [executor.submit(_render_chunk_in_worker, chunk, folder) for chunk in chunks]
+        return [future.result() for future in futures]
+
+def worker_totals(results):
+    """
+    Adds up the chunk results for each worker process
+    Returns a dictionary of process ID -> [players, bytes, seconds]
+    """
+    totals = {}
+    for process_id, players, written, seconds in results:
+        total = totals.setdefault(process_id, [0, 0, 0.0])
+        total[0] += players
+        total[1] += written
+        total[2] += seconds
+    return totals
@@ -0,0 +1,230 @@
+"""
+Session replay for the Games Club Statistics Program
+Plays back thousands of made up menu sessions (record scores, add more
+games, show saved stats, show the leaderboard, then exit) through the real
+interactive flow, split across several processes, and reports how many
+sessions a second it managed and how long each one took
+
+Sessions are a mix of valid, invalid and extreme answers in the same
+proportions as test_table.md. A temporary folder is used for the store so
+no real player data is touched
+
+Run with: python replay.py --sessions 5000 --processes 4
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time as timer
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+import storage
+from load_test import latency_percentile
+from session import ScriptedSession, SessionOver
+
+# test_table.md has 40 tests: 20 with valid input, 14 with invalid input
+# (tests 2, 3, 5, 6, 8, 11-13, 15-18, 31 and 37) and 6 at the limits
+# (tests 7, 10, 27 and 38-40), so sessions are picked in the same proportions
+SESSION_MIX = {"valid": 20, "invalid": 14, "extreme": 6}
+
+# Wrong answers from test_table.md for each kind of question
+INVALID_ANSWERS = {
+    "player_id": ["", "THISPLAYERIDISTOOLONG123"],
+    "games": ["0", "-5", "abc"],
+    "score": ["-100", "2000000", "xyz"],
+    "time": ["0", "-10.5", "2000", "abc"],
+    "menu": ["6", "x"],
+}
+
+# Answers right at the limits from test_table.md
+EXTREME_ANSWERS = {
+    "games": ["100", "150"],
+    "score": ["0", "1000000"],
+    "time": ["1440", "1440.0"],
+}
+
+# Menu choices a session makes before exiting, most of them adding games
+MENU_CHOICES = ["1", "1", "4", "4", "2", "5"]
+
+# Sessions handed to a process in one go
+CHUNK_SIZE = 50
+
+
+def make_session(kind, rng, players=200, number=0):
+    """
+    Makes the answers for one session of the given kind ("valid",
+    "invalid" or "extreme")
+    Adding games goes to one of players shared player IDs, but recording
+    scores starts a player over, so each session number records new players
+    (otherwise the games saved would depend on which process went first)
+    Returns (answers, games saved by the session)
+    """
+    # Each question as (kind of question, good answer), with None for "Press Enter"
+    questions = []
+    games = 0
+    for visit in range(rng.randint(1, 3)):
+        choice = rng.choice(MENU_CHOICES)
+        questions.append(("menu", choice))
+        player_id = f"NEW{number}_{visit}" if choice == "1" else f"REPLAY{rng.randrange(players)}"
+        if choice in ("1", "4"):
+            questions.append(("player_id", player_id))
+            if kind == "extreme":
+                num_games = int(rng.choice(EXTREME_ANSWERS["games"]))
+            else:
+                num_games = rng.randint(1, 5)
+            questions.append(("games", str(num_games)))
+            for _ in range(num_games):
+                if kind == "extreme":
+                    questions.append(("score", rng.choice(EXTREME_ANSWERS["score"])))
+                    questions.append(("time", rng.choice(EXTREME_ANSWERS["time"])))
+                else:
+                    questions.append(("score", str(rng.randint(0, 50000))))
+                    questions.append(("time", str(round(rng.uniform(1, 90), 1))))
+            games += num_games
+        elif choice == "2":
+            # Test 31 looks up a player who was never saved
+            if kind == "invalid" and rng.random() < 0.5:
+                player_id = "NONEXISTENT"
+            questions.append(("player_id", player_id))
+        questions.append((None, ""))
+    questions.append(("menu", "3"))
+
+    # Invalid sessions get at least one wrong answer before a right one
+    wrong = set()
+    if kind == "invalid":
+        can_be_wrong = [number for number, (question, _) in enumerate(questions) if question is not None]
+        wrong.add(rng.choice(can_be_wrong))
+        wrong.update(number for number in can_be_wrong if rng.random() < 0.1)
+
+    answers = []
+    for number, (question, answer) in enumerate(questions):
+        if number in wrong:
+            answers.append(rng.choice(INVALID_ANSWERS[question]))
+            if question == "menu":
+                # "Press Enter to try again..."
+                answers.append("")
+        answers.append(answer)
+    return answers, games
+
+def make_sessions(count, seed=None, players=200):
+    """
+    Makes count sessions with kinds picked in the SESSION_MIX proportions
+    Returns a list of (kind, answers, games)
+    """
+    rng = random.Random(seed)
+    kinds = rng.choices(list(SESSION_MIX), weights=list(SESSION_MIX.values()), k=count)
+    sessions = []
+    for number, kind in enumerate(kinds):
+        answers, games = make_session(kind, rng, players, number)
+        sessions.append((kind, answers, games))
+    return sessions
+
+def _start_worker(folder, store_type):
+    """
+    Opens the store in each process before it plays any sessions
+    """
+    main.set_store(storage.open_store(store_type, folder))
+
+def play_sessions(sessions):
+    """
+    Plays each session through main.main in this process
+    Returns (latencies in seconds, errors, sessions that ran out of answers)
+    """
+    latencies = []
+    errors = 0
+    unfinished = 0
+    try:
+        for _, answers, _ in sessions:
+            session = ScriptedSession(answers)
+            main.set_session(session)
+            start = timer.perf_counter()
+            try:
+                main.main()
+            except SessionOver:
+                unfinished += 1
+            except Exception:
+                errors += 1
+            latencies.append(timer.perf_counter() - start)
+            if session.answers_left:
+                unfinished += 1
+    finally:
+        main.set_session(None)
+    return latencies, errors, unfinished
+
+def count_saved_games(store):
+    """
+    Returns the number of games saved in a store
+    """
+    return sum(len(store.load_games(player_id)[0]) for player_id in store.player_ids())
+
+def run_replay(sessions, processes=4, store_type="files", folder=None):
+    """
+    Plays the sessions against a store in folder (a temporary one if not
+    given), split between processes
+    Returns a dictionary with the latencies, errors, unfinished sessions,
+    time taken and the games expected and actually saved
+    """
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        folder = folder or temporary_folder
+        chunks = [sessions[start:start + CHUNK_SIZE] for start in range(0, len(sessions), CHUNK_SIZE)]
+        results = {"latencies": [], "errors": 0, "unfinished": 0}
+
+        start = timer.perf_counter()
+        if processes <= 1:
+            _start_worker(folder, store_type)
+            try:
+                outcomes = [play_sessions(chunk) for chunk in chunks]
+            finally:
+                main.set_store(None)
+        else:
+            with ProcessPoolExecutor(processes, initializer=_start_worker,
+                                     initargs=(folder, store_type)) as pool:
+                outcomes = list(pool.map(play_sessions, chunks))
+        results["elapsed"] = timer.perf_counter() - start
+
+        for latencies, errors, unfinished in outcomes:
+            results["latencies"] += latencies
+            results["errors"] += errors
+            results["unfinished"] += unfinished
+
+        store = storage.open_store(store_type, folder)
+        try:
+            results["saved_games"] = count_saved_games(store)
+        finally:
+            store.close()
+        results["expected_games"] = sum(games for _, _, games in sessions)
+    return results
+
+def main_program(argv):
+    parser = argparse.ArgumentParser(prog="replay.py", description="Play back made up menu sessions")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--players", type=int, default=200, help="different player IDs to use")
+    parser.add_argument("--store", choices=storage.STORE_TYPES, default="files")
+    parser.add_argument("--seed", type=int, help="makes the same sessions every time")
+    args = parser.parse_args(argv)
+
+    sessions = make_sessions(args.sessions, args.seed, args.players)
+    results = run_replay(sessions, args.processes, args.store)
+
+    kinds = {kind: 0 for kind in SESSION_MIX}
+    for kind, _, _ in sessions:
+        kinds[kind] += 1
+    rate = len(sessions) / results["elapsed"] if results["elapsed"] > 0 else 0.0
+    latencies = results["latencies"]
+    print(f"{len(sessions):,} sessions ({', '.join(f'{count:,} {kind}' for kind, count in kinds.items())}) "
+          f"over {args.processes} processes in {results['elapsed']:.2f} seconds ({rate:,.0f} sessions/sec)")
+    print(f"Latency: p50 {latency_percentile(latencies, 50):.1f} ms, "
+          f"p95 {latency_percentile(latencies, 95):.1f} ms, "
+          f"p99 {latency_percentile(latencies, 99):.1f} ms, "
+          f"max {max(latencies, default=0) * 1000:.1f} ms")
+    missing = results["expected_games"] - results["saved_games"]
+    print(f"Errors: {results['errors']:,}, unfinished sessions: {results['unfinished']:,}, "
+          f"missing games: {missing:,}")
+    return 1 if results["errors"] or results["unfinished"] or missing else 0
+
+if __name__ == "__main__":
+    sys.exit(main_program(sys.argv[1:]))
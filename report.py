@@ -0,0 +1,177 @@
+"""
+Report formatting for the Games Club Statistics Program
+Builds the text that goes into a player's saved stats report, and reads
+the numbers back out of a saved one
+"""
+
+import os
+from array import array
+from functools import lru_cache
+
+# How many parsed report files are kept in memory by read_raw_data
+REPORT_CACHE_SIZE = 256
+
+# The SUMMARY part at the top of every report fits in this many bytes
+# (it is about 350 bytes even with a 20 character ID and long numbers)
+SUMMARY_READ_SIZE = 1024
+
+# How many numbers go in each piece of the RAW DATA lines from report_pieces
+RAW_PIECE_VALUES = 4096
+
+def build_report(player_id, scores, times, highest_score, average_time, total_time=None):
+    """
+    Builds the full text of a player's report
+    Everything is collected from report_pieces and joined once at the end
+    Pass total_time if it is already known so the times aren't added up again
+    """
+    return "".join(report_pieces(player_id, scores, times, highest_score, average_time, total_time))
+
+def report_pieces(player_id, scores, times, highest_score, average_time, total_time=None):
+    """
+    Yields the text of a player's report a piece at a time, so it can be
+    shown or written without ever holding all of it
+    The RAW DATA lines are split into pieces of RAW_PIECE_VALUES numbers
+    """
+    if total_time is None:
+        total_time = sum(times)
+
+    # Write a nice header
+    yield "GAMES CLUB STATISTICS REPORT\n"
+    yield "=" * 40 + "\n"
+    yield f"Report for Player: {player_id}\n"
+    yield "=" * 40 + "\n\n"
+
+    # Write the main statistics
+    yield "SUMMARY:\n"
+    yield "-" * 20 + "\n"
+    yield f"Player ID: {player_id}\n"
+    yield f"Number of Games: {len(scores)}\n"
+    yield f"Highest Score: {highest_score:,}\n"
+    yield f"Average Time: {average_time} minutes\n"
+    yield f"Total Time Played: {total_time} minutes\n\n"
+
+    # write game data
+    yield "DETAILED GAME DATA:\n"
+    yield "-" * 20 + "\n"
+
+    # write each games data
+    for game_num, (score, time) in enumerate(zip(scores, times), start=1):
+        yield f"Game {game_num}: Score = {score:,}, Time = {time} minutes\n"
+
+    yield "\n" + "=" * 40 + "\n"
+
+    # write raw data (useful if someone wants to use it in another program)
+    yield "RAW DATA:\n"
+    # Convert all numbers to text and join them with commas
+    yield "Scores: "
+    yield from _joined_pieces(scores)
+    yield "\nTimes: "
+    yield from _joined_pieces(times)
+    yield "\n"
+
+def _joined_pieces(values):
+    """
+    Yields ', '.join(values) in pieces of RAW_PIECE_VALUES numbers
+    """
+    for start in range(0, len(values), RAW_PIECE_VALUES):
+        text = ', '.join([str(value) for value in values[start:start + RAW_PIECE_VALUES]])
+        yield ", " + text if start else text
+
+def parse_raw_data(text):
+    """
+    Reads the scores and times back out of the RAW DATA part of a report
+    Returns two typed arrays like (array('i', [1200, 1500]), array('d', [25.0, 20.5]))
+    """
+    start = text.rfind("RAW DATA:")
+    if start == -1:
+        raise ValueError("This report has no RAW DATA section")
+
+    scores = array('i')
+    times = array('d')
+    raw_data = text[start:]
+
+    for line in raw_data.splitlines():
+        if line.startswith("Scores:"):
+            values = line[len("Scores:"):].strip()
+            scores = array('i', map(int, values.split(", "))) if values else array('i')
+        elif line.startswith("Times:"):
+            values = line[len("Times:"):].strip()
+            times = array('d', map(float, values.split(", "))) if values else array('d')
+    return scores, times
+
+def parse_summary(text):
+    """
+    Reads the stats out of the SUMMARY part at the top of a report
+    Only the start of the report is needed, everything after is ignored
+    Returns a dictionary with player_id, games, highest_score, average_time
+    and total_time
+    """
+    stats = {}
+    # The last line might have been cut off part way, so it is left out
+    for line in text[:text.rfind("\n") + 1].splitlines():
+        name, _, value = line.partition(":")
+        value = value.strip()
+        if name == "Player ID":
+            stats["player_id"] = value
+        elif name == "Number of Games":
+            stats["games"] = int(value)
+        elif name == "Highest Score":
+            stats["highest_score"] = int(value.replace(",", ""))
+        elif name == "Average Time":
+            stats["average_time"] = float(value.split()[0])
+        elif name == "Total Time Played":
+            stats["total_time"] = float(value.split()[0])
+        elif name == "DETAILED GAME DATA":
+            break
+
+    if len(stats) != 5:
+        raise ValueError("This report has no SUMMARY section")
+    return stats
+
+def read_summary(path):
+    """
+    Reads the stats from the SUMMARY part of a report file
+    Only the first SUMMARY_READ_SIZE bytes are read (with one pread), so it
+    takes the same time however many games the player has
+    Raises FileNotFoundError if the file doesn't exist
+    """
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        if hasattr(os, "pread"):
+            head = os.pread(descriptor, SUMMARY_READ_SIZE, 0)
+        else:
+            # Windows has no pread
+            head = os.read(descriptor, SUMMARY_READ_SIZE)
+    finally:
+        os.close(descriptor)
+    return parse_summary(head.decode('utf-8', errors='ignore'))
+
+@lru_cache(maxsize=REPORT_CACHE_SIZE)
+def _read_raw_data_cached(path, modified, size, inode):
+    """
+    Parses a report file, remembering the answer for this exact version of it
+    modified, size and inode are only here so a changed file gets a new
+    cache entry (saving a report swaps in a new file, so the inode changes
+    even if two saves land in the same clock tick)
+    """
+    with open(path, 'r') as file:
+        return parse_raw_data(file.read())
+
+def read_raw_data(path):
+    """
+    Returns the (scores, times) arrays saved in a report file
+    Recently read files are kept in a cache keyed on the file's path,
+    modification time and size, so a hot player's report is only read and
+    parsed again after it has been saved again
+    Raises FileNotFoundError if the file doesn't exist
+    """
+    details = os.stat(path)
+    scores, times = _read_raw_data_cached(path, details.st_mtime_ns, details.st_size, details.st_ino)
+    # Copies are handed out so changing them can't change the cached arrays
+    return scores[:], times[:]
+
+def clear_report_cache():
+    """
+    Forgets every report read_raw_data has cached
+    """
+    _read_raw_data_cached.cache_clear()
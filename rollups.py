@@ -0,0 +1,195 @@
+"""
+Time-bucketed rollups for the Games Club Statistics Program
+Every game is stamped with when it was recorded, and running totals are
+kept for each player and for the whole club per day, week, month and season
+
+The totals are updated as games are saved, so questions like "highest
+score this week" are one lookup in the rollups table, however many games
+have been played. Everything is kept in rollups.db (SQLite) next to the
+store's other files
+"""
+
+import contextlib
+import datetime
+import sqlite3
+import threading
+import time as timer
+
+from summary import RunningSummary
+
+PERIODS = ["day", "week", "month", "season"]
+
+# Seasons run from September to August, like the school year
+SEASON_START_MONTH = 9
+
+# The scope used for the whole club's totals (player IDs are never empty)
+CLUB = ""
+
+def bucket_keys(when):
+    """
+    Works out which day, week, month and season a time falls in
+    when is seconds since the epoch, and buckets use the local time zone
+    Returns a dictionary like {"day": "2026-10-18", "week": "2026-W42",
+    "month": "2026-10", "season": "2026-27"}
+    """
+    moment = datetime.datetime.fromtimestamp(when)
+    iso_year, iso_week, _ = moment.isocalendar()
+    season_start = moment.year if moment.month >= SEASON_START_MONTH else moment.year - 1
+    return {
+        "day": moment.strftime("%Y-%m-%d"),
+        "week": f"{iso_year}-W{iso_week:02d}",
+        "month": moment.strftime("%Y-%m"),
+        "season": f"{season_start}-{(season_start + 1) % 100:02d}",
+    }
+
+
+class Rollups:
+    """
+    The game stamps and the rollup totals, kept in an SQLite database
+    The stamps table is only ever added to, queries only read rollups
+    """
+
+    def __init__(self, path="rollups.db", timeout=30.0):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                                          check_same_thread=False)
+        # Games can be saved from several threads (e.g. the web service)
+        self._lock = threading.RLock()
+        self._in_batch = False
+        with self._lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS game_stamps ("
+                " player_id TEXT NOT NULL,"
+                " recorded_at REAL NOT NULL,"
+                " score INTEGER NOT NULL,"
+                " time REAL NOT NULL)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS rollups ("
+                " scope TEXT NOT NULL,"
+                " period TEXT NOT NULL,"
+                " bucket TEXT NOT NULL,"
+                " games INTEGER NOT NULL,"
+                " highest_score INTEGER NOT NULL,"
+                " time_sum REAL NOT NULL,"
+                " time_squares REAL NOT NULL,"
+                " PRIMARY KEY (scope, period, bucket)) WITHOUT ROWID")
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Runs every add_games inside it as one transaction, so saving lots
+        of players at once only commits once
+        BEGIN IMMEDIATE so two programs saving at once take turns
+        """
+        with self._lock:
+            if self._in_batch:
+                yield
+                return
+
+            self.connection.execute("BEGIN IMMEDIATE")
+            self._in_batch = True
+            try:
+                yield
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            else:
+                self.connection.execute("COMMIT")
+            finally:
+                self._in_batch = False
+
+    def add_games(self, player_id, scores, times, when=None):
+        """
+        Stamps newly recorded games and adds them to the player's and the
+        club's totals for the day, week, month and season they were played in
+        when is seconds since the epoch, and defaults to now
+        """
+        self.add_many({player_id: (scores, times)}, when)
+
+    def add_many(self, games, when=None):
+        """
+        Does add_games for lots of players at once, given as
+        {player_id: (scores, times)}
+        The club's totals are only updated once for all of them
+        """
+        if when is None:
+            when = timer.time()
+
+        buckets = bucket_keys(when)
+        club = RunningSummary()
+        stamps = []
+        rows = []
+        for player_id, (scores, times) in games.items():
+            if len(scores) == 0:
+                continue
+            player = RunningSummary.from_games(scores, times)
+            club.add_games(scores, times)
+            stamps.extend((player_id, when, score, time) for score, time in zip(scores, times))
+            rows.extend((player_id, period, bucket, player.games, player.highest_score,
+                         player.total_time, player.time_squares)
+                        for period, bucket in buckets.items())
+        if club.games == 0:
+            return
+        rows.extend((CLUB, period, bucket, club.games, club.highest_score, club.total_time,
+                     club.time_squares)
+                    for period, bucket in buckets.items())
+
+        with self.batch():
+            self.connection.executemany(
+                "INSERT INTO game_stamps (player_id, recorded_at, score, time) VALUES (?, ?, ?, ?)",
+                stamps)
+            self.connection.executemany(
+                "INSERT INTO rollups (scope, period, bucket, games, highest_score, time_sum, time_squares)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (scope, period, bucket) DO UPDATE SET"
+                " games = games + excluded.games,"
+                " highest_score = MAX(highest_score, excluded.highest_score),"
+                " time_sum = time_sum + excluded.time_sum,"
+                " time_squares = time_squares + excluded.time_squares", rows)
+
+    def totals(self, period, player_id=None, when=None):
+        """
+        Returns a RunningSummary of the games in the period (e.g. "week")
+        that when falls in (now by default), for one player or, with no
+        player, the whole club
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period: {period}")
+        if when is None:
+            when = timer.time()
+        return self.totals_for_bucket(period, bucket_keys(when)[period], player_id)
+
+    def totals_for_bucket(self, period, bucket, player_id=None):
+        """
+        Returns a RunningSummary of the games in one bucket, e.g. ("month", "2026-10")
+        """
+        scope = CLUB if player_id is None else player_id
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT games, highest_score, time_sum, time_squares FROM rollups"
+                " WHERE scope = ? AND period = ? AND bucket = ?",
+                (scope, period, bucket)).fetchone()
+        if row is None:
+            return RunningSummary()
+        games, highest_score, time_sum, time_squares = row
+        return RunningSummary(games, highest_score, time_sum, 0.0, time_squares)
+
+    def history(self, period, player_id=None):
+        """
+        Returns every bucket of a period in order, as a list of (bucket, RunningSummary)
+        """
+        scope = CLUB if player_id is None else player_id
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT bucket, games, highest_score, time_sum, time_squares FROM rollups"
+                " WHERE scope = ? AND period = ? ORDER BY bucket",
+                (scope, period)).fetchall()
+        return [(bucket, RunningSummary(games, highest, time_sum, 0.0, squares))
+                for bucket, games, highest, time_sum, squares in rows]
+
+    def close(self):
+        """
+        Closes the database connection
+        """
+        self.connection.close()
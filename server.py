@@ -0,0 +1,303 @@
+"""
+Web service for the Games Club Statistics Program
+Lets lots of club terminals record and look up stats at the same time
+
+    POST /players/<ID>/games   body: {"games": [{"score": 1500, "time": 25.5}, ...]}
+                               (or just one {"score": ..., "time": ...})
+    GET  /players/<ID>/stats
+
+IDs with spaces or other odd characters are sent percent-encoded, e.g.
+/players/JOHN%20SMITH/stats. Both answer with the player's stats as JSON. The service runs on asyncio
+streams so one thread can hold thousands of connections open, and every
+load or save is handed to a pool of threads so the event loop never waits
+for the disk. Saves for the same player wait their turn, saves for
+different players run side by side
+"""
+
+import asyncio
+import contextlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+import main
+from validation import validate_player_id, validate_score, validate_time
+
+# Requests bigger than this are turned away
+MAX_BODY_SIZE = 1024 * 1024
+
+STATUS_TEXT = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class RequestError(Exception):
+    """
+    A request that can't be answered, with the HTTP status to send back
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_games(body):
+    """
+    Reads the games out of a POST body
+    Every score and time is checked with the same rules as get_score and
+    get_time, so the messages are the ones the menu shows
+    Returns (scores, times)
+    """
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise RequestError(400, "The body must be JSON")
+
+    if isinstance(data, dict) and "games" in data:
+        games = data["games"]
+    else:
+        games = [data]
+    if not isinstance(games, list) or len(games) == 0:
+        raise RequestError(400, "Send at least one game")
+
+    scores = []
+    times = []
+    for game in games:
+        if not isinstance(game, dict):
+            raise RequestError(400, "Each game needs a score and a time")
+        try:
+            # Turned into text first so 12.5 as a score is rejected like
+            # typing "12.5" at the prompt would be
+            scores.append(validate_score(str(game.get("score"))))
+            times.append(validate_time(str(game.get("time"))))
+        except ValueError as error:
+            raise RequestError(400, str(error))
+    return scores, times
+
+
+def player_stats(player_id):
+    """
+    Looks up a player's stats without loading their games
+    Raises FileNotFoundError if the player hasn't been saved
+    """
+    return main.get_store().load_stats(player_id)
+
+
+def record_games(player_id, new_scores, new_times):
+    """
+    Adds games to a player's history and saves it
+    Other programs saving the same player at the same time (e.g. a second
+    copy of the service) can't make these games go missing
+    Returns the player's updated stats
+    """
+    _, _, summary = main.save_new_games(player_id, new_scores, new_times)
+    return {
+        "player_id": player_id,
+        "games": summary.games,
+        "highest_score": summary.highest_score,
+        "average_time": summary.average_time,
+        "total_time": summary.total_time,
+    }
+
+
+class StatsServer:
+    """
+    The HTTP service, one coroutine per open connection
+    """
+
+    def __init__(self, workers=8):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stats-io")
+        self.player_locks = {}   # player ID -> [asyncio.Lock, saves using or waiting for it]
+        self.connections = {}    # writer -> task answering that connection
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """
+        Starts listening, port 0 picks any free port
+        Returns the (host, port) actually used
+        """
+        self.server = await asyncio.start_server(self.handle_connection, host, port, backlog=4096)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        """
+        Answers requests until the program is stopped
+        """
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def stop(self):
+        """
+        Stops listening, hangs up on clients that are still connected and
+        waits for the thread pool to finish its work
+        """
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        # Closing the connection makes the next read see the end of the
+        # stream, so each connection finishes off normally
+        for writer in list(self.connections):
+            writer.close()
+        await asyncio.gather(*self.connections.values(), return_exceptions=True)
+        self.executor.shutdown(wait=True)
+
+    @contextlib.asynccontextmanager
+    async def _player_lock(self, player_id):
+        """
+        Holds a player's lock so their saves take turns
+        The lock is thrown away once no save is using or waiting for it, so
+        only players being saved right now have one
+        """
+        entry = self.player_locks.get(player_id)
+        if entry is None:
+            entry = self.player_locks[player_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.player_locks[player_id]
+
+    def _run_in_thread(self, function, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def handle_connection(self, reader, writer):
+        """
+        Answers requests on one connection until the client hangs up
+        Connections are kept open between requests (HTTP/1.1 keep-alive)
+        """
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except RequestError as error:
+                    await send_response(writer, error.status, {"error": str(error)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                status, data = await self.handle_request(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await send_response(writer, status, data, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self.connections[writer]
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def handle_request(self, method, path, body):
+        """
+        Works out the answer to one request
+        Returns (status, data to send as JSON)
+        """
+        try:
+            player_id, action = route(path)
+            if action == "stats":
+                if method != "GET":
+                    raise RequestError(405, "Use GET to read stats")
+                try:
+                    return 200, await self._run_in_thread(player_stats, player_id)
+                except FileNotFoundError:
+                    raise RequestError(404, f"No data found for player {player_id}")
+
+            if method != "POST":
+                raise RequestError(405, "Use POST to add games")
+            scores, times = parse_games(body)
+            async with self._player_lock(player_id):
+                stats = await self._run_in_thread(record_games, player_id, scores, times)
+            return 201, stats
+
+        except RequestError as error:
+            return error.status, {"error": str(error)}
+        except Exception as error:
+            return 500, {"error": f"Couldn't handle the request: {error}"}
+
+
+def route(path):
+    """
+    Works out which player and action a path is for
+    The player ID is percent-decoded after the path is split up, so a %2F
+    in it can't change which part of the path is the ID
+    Returns (player_id, "games" or "stats")
+    """
+    parts = path.split("?", 1)[0].strip("/").split("/")
+    if len(parts) != 3 or parts[0] != "players" or parts[2] not in ("games", "stats"):
+        raise RequestError(404, f"Nothing at {path}")
+    try:
+        player_id = validate_player_id(unquote(parts[1]))
+    except ValueError as error:
+        raise RequestError(400, str(error))
+    return player_id, parts[2]
+
+
+async def read_request(reader):
+    """
+    Reads one HTTP request
+    Returns (method, path, headers, body), or None if the client hung up
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, path, _ = request_line.decode('latin-1').split()
+    except ValueError:
+        raise RequestError(400, "Bad request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise RequestError(400, "Bad Content-Length")
+    if length > MAX_BODY_SIZE:
+        raise RequestError(413, "The body is too big")
+    body = await reader.readexactly(length) if length > 0 else b""
+    return method.upper(), path, headers, body
+
+
+async def send_response(writer, status, data, keep_alive=True):
+    """
+    Sends a JSON response
+    """
+    body = json.dumps(data).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'Unknown')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+
+
+async def run_server(host="127.0.0.1", port=8080, workers=8):
+    """
+    Runs the service until the program is stopped
+    """
+    server = StatsServer(workers)
+    host, port = await server.start(host, port)
+    print(f"Games Club stats service running on http://{host}:{port}")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.stop()
@@ -0,0 +1,89 @@
+"""
+Session I/O for the Games Club Statistics Program
+The menu and its questions ask and answer through a session object
+instead of calling input and print themselves, so the same flow can be
+typed in at the terminal or played back from a script (see replay.py)
+
+A session has two methods:
+    ask(prompt)        shows the prompt and returns the answer as a string
+    say(*parts, ...)   shows a line, taking the same arguments as print
+and two settings for long output (see pager.py):
+    page_rows          rows that fit on one screen, or None to show it all
+    width              how many characters fit on a row
+"""
+
+import shutil
+import sys
+
+
+class SessionOver(EOFError):
+    """
+    Raised when a scripted session runs out of answers
+    It's an EOFError, the same as input gives when there's nothing left to read
+    """
+
+
+class ConsoleSession:
+    """
+    The normal session, asking at the terminal with input and answering with print
+    Long output stops after each screen, unless it's going to a file or a pipe
+    """
+
+    @property
+    def page_rows(self):
+        if not sys.stdout.isatty():
+            return None
+        # Leave the bottom row for the question
+        return max(shutil.get_terminal_size().lines - 1, 1)
+
+    @property
+    def width(self):
+        return shutil.get_terminal_size().columns
+
+    def ask(self, prompt):
+        return input(prompt)
+
+    def say(self, *parts, **options):
+        print(*parts, **options)
+
+
+class ScriptedSession:
+    """
+    A session that answers from a list of strings instead of the keyboard
+    Everything said is still turned into text, so playing a session back
+    does the same work as a real one, and is kept in output if keep_output is set
+    """
+
+    def __init__(self, answers, keep_output=False, page_rows=None, width=80):
+        self.answers = list(answers)
+        self.keep_output = keep_output
+        self.page_rows = page_rows
+        self.width = width
+        self.output = []
+        self.questions = 0
+        self._next = 0
+
+    def ask(self, prompt):
+        if self._next >= len(self.answers):
+            raise SessionOver(f"No answer left for {prompt!r}")
+        answer = self.answers[self._next]
+        self._next += 1
+        self.questions += 1
+        if self.keep_output:
+            self.output.append(prompt + answer + "\n")
+        return answer
+
+    def say(self, *parts, sep=" ", end="\n", **options):
+        text = sep.join(str(part) for part in parts) + end
+        if self.keep_output:
+            self.output.append(text)
+
+    @property
+    def answers_left(self):
+        return len(self.answers) - self._next
+
+    def text(self):
+        """
+        Returns everything shown so far as one string (needs keep_output)
+        """
+        return "".join(self.output)
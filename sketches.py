@@ -0,0 +1,289 @@
+"""
+Streaming sketches for the Games Club Statistics Program
+Small summaries that answer "what is the median score?" or "how many
+different players were active?" for any number of games, using the same
+small amount of memory however many games go in
+
+TDigest estimates quantiles (median, 95th percentile, ...) of scores or
+times. With the default compression of 100 it keeps about a hundred
+centroids, and the rank of an estimate is within 1% of the rank asked for
+(usually within 0.1%, and closer still near the ends like the 99th percentile)
+
+HyperLogLog estimates how many different players there are. With the
+default 2^14 registers it uses 16 KB and the standard error is 0.8%, so
+nearly every estimate is within 2.5% of the real count
+
+Both can be saved as JSON and merged, so sketches from separate imports
+(or separate computers) can be combined into one for the whole club
+"""
+
+import base64
+import hashlib
+import json
+import math
+
+import storage
+
+
+class TDigest:
+    """
+    A merging t-digest (Dunning and Ertl) for estimating quantiles
+    New values go in a buffer that is sorted into the centroids once it
+    fills up, so adding a value is just an append most of the time
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.means = []     # centroid means, smallest first
+        self.weights = []   # how many values each centroid stands for
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._buffer = []
+        self._buffer_size = 10 * compression
+
+    def add(self, value, weight=1):
+        """
+        Adds a value (or a centroid of weight values with this mean)
+        """
+        self._buffer.append((value, weight))
+        self.count += weight
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self._buffer) >= self._buffer_size:
+            self._compress()
+
+    def add_all(self, values):
+        """
+        Adds every value in a list or array
+        """
+        for value in values:
+            self.add(value)
+
+    def _scale(self, quantile):
+        # k1 from the t-digest paper, it makes centroids small near the ends
+        return self.compression / (2 * math.pi) * math.asin(2 * quantile - 1)
+
+    def _scale_inverse(self, k):
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self):
+        """
+        Sorts the buffer into the centroids, joining neighbours while the
+        joined centroid stays within its size limit
+        """
+        if not self._buffer:
+            return
+        points = sorted(list(zip(self.means, self.weights)) + self._buffer)
+        self._buffer = []
+
+        means = []
+        weights = []
+        mean, weight = points[0]
+        weight_before = 0
+        limit = self._scale_inverse(self._scale(0.0) + 1) * self.count
+        for next_mean, next_weight in points[1:]:
+            if weight_before + weight + next_weight <= limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                weight_before += weight
+                limit = self._scale_inverse(self._scale(weight_before / self.count) + 1) * self.count
+                mean, weight = next_mean, next_weight
+        means.append(mean)
+        weights.append(weight)
+        self.means = means
+        self.weights = weights
+
+    def quantile(self, quantile):
+        """
+        Estimates the value below which the given fraction of values fall,
+        e.g. quantile(0.5) is the median
+        Returns None if nothing has been added
+        """
+        if not 0 <= quantile <= 1:
+            raise ValueError("quantile must be between 0 and 1")
+        self._compress()
+        if self.count == 0:
+            return None
+        if len(self.means) == 1:
+            return self.means[0]
+
+        target = quantile * self.count
+        # Each centroid's mean is taken to sit at the middle of its values,
+        # and the answer is worked out along the line between two of them
+        previous_mean = self.min
+        previous_middle = 0.0
+        seen = 0
+        for mean, weight in zip(self.means, self.weights):
+            middle = seen + weight / 2
+            if target < middle:
+                span = middle - previous_middle
+                fraction = (target - previous_middle) / span if span > 0 else 0.0
+                return previous_mean + (mean - previous_mean) * fraction
+            previous_mean = mean
+            previous_middle = middle
+            seen += weight
+        span = self.count - previous_middle
+        fraction = (target - previous_middle) / span if span > 0 else 1.0
+        return previous_mean + (self.max - previous_mean) * fraction
+
+    def merge(self, other):
+        """
+        Adds everything in another digest into this one
+        """
+        other._compress()
+        for mean, weight in zip(other.means, other.weights):
+            self.add(mean, weight)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def to_dict(self):
+        self._compress()
+        return {"compression": self.compression, "count": self.count, "min": self.min,
+                "max": self.max, "means": self.means, "weights": self.weights}
+
+    @classmethod
+    def from_dict(cls, data):
+        digest = cls(data["compression"])
+        digest.count = data["count"]
+        digest.min = data["min"]
+        digest.max = data["max"]
+        digest.means = list(data["means"])
+        digest.weights = list(data["weights"])
+        return digest
+
+
+class HyperLogLog:
+    """
+    Estimates how many different things (e.g. player IDs) have been added
+    Each thing is hashed and only the longest run of leading zero bits seen
+    in each register is kept, so memory doesn't grow with the count
+    """
+
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, item):
+        """
+        Adds one thing, adding the same thing again changes nothing
+        """
+        hashed = int.from_bytes(hashlib.blake2b(str(item).encode('utf-8'), digest_size=8).digest(), 'big')
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        # Position of the first 1 bit in the remaining bits, counting from 1
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        """
+        Returns the estimated number of different things added
+        """
+        registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / registers)
+        estimate = alpha * registers * registers / sum(2.0 ** -rank for rank in self.registers)
+        empty = self.registers.count(0)
+        if estimate <= 2.5 * registers and empty > 0:
+            # Small counts are more exact worked out from the empty registers
+            estimate = registers * math.log(registers / empty)
+        return round(estimate)
+
+    @property
+    def standard_error(self):
+        """
+        The relative standard error of count()
+        """
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def merge(self, other):
+        """
+        Adds everything in another HyperLogLog with the same precision
+        """
+        if other.precision != self.precision:
+            raise ValueError("Can't merge HyperLogLogs with different precisions")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def to_dict(self):
+        return {"precision": self.precision,
+                "registers": base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["precision"])
+        sketch.registers = bytearray(base64.b64decode(data["registers"]))
+        return sketch
+
+
+class ClubSketches:
+    """
+    The sketches for a whole club: score and time quantiles and the number
+    of different players
+    """
+
+    def __init__(self, scores=None, times=None, players=None, games=0):
+        self.scores = scores if scores is not None else TDigest()
+        self.times = times if times is not None else TDigest()
+        self.players = players if players is not None else HyperLogLog()
+        self.games = games
+
+    def add_games(self, player_id, scores, times):
+        """
+        Adds one player's games
+        """
+        self.players.add(player_id)
+        self.scores.add_all(scores)
+        self.times.add_all(times)
+        self.games += len(scores)
+
+    def merge(self, other):
+        """
+        Adds everything in another set of sketches into these ones
+        """
+        self.scores.merge(other.scores)
+        self.times.merge(other.times)
+        self.players.merge(other.players)
+        self.games += other.games
+
+    def to_text(self):
+        """
+        Turns the sketches into JSON text for saving
+        """
+        return json.dumps({"games": self.games, "scores": self.scores.to_dict(),
+                           "times": self.times.to_dict(), "players": self.players.to_dict()})
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        Builds the sketches from JSON text made by to_text
+        """
+        data = json.loads(text)
+        return cls(TDigest.from_dict(data["scores"]), TDigest.from_dict(data["times"]),
+                   HyperLogLog.from_dict(data["players"]), data["games"])
+
+def save_sketches(path, sketches):
+    """
+    Saves sketches to a JSON file, swapping the whole file in at once
+    """
+    storage.write_atomically(path, sketches.to_text() + "\n")
+
+def load_sketches(path):
+    """
+    Reads sketches saved with save_sketches, or returns empty ones if the
+    file doesn't exist yet
+    """
+    try:
+        with open(path, 'r') as file:
+            return ClubSketches.from_text(file.read())
+    except FileNotFoundError:
+        return ClubSketches()
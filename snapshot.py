@@ -0,0 +1,237 @@
+"""
+Site snapshots for the Games Club Statistics Program
+A club with several branches runs the program on separate computers. Each
+branch saves a snapshot of its players' totals, and snapshots from any
+number of branches can be merged into one for the whole club
+
+Every player's totals (games, highest score, total time and total of the
+times squared) are kept exactly, with the time totals as whole numbers
+over a power of two instead of floats. Adding floats in a different order
+can give a slightly different answer, but adding these exactly can't, so
+merging snapshots in any order, or in a tree with merged snapshots merged
+again, always gives the same totals. They are the totals of every game at
+every branch, so the highest score and average time match what
+find_highest_score and calculate_average_time give for all the games at once
+
+The snapshot also keeps the club's sketches (see sketches.py) so the
+score and time percentiles and the number of different players can be
+merged as well. Those are estimates, within the bounds given in sketches.py
+
+Merging goes through each player once, so it takes time in proportion to
+the number of players (not games)
+"""
+
+import json
+from fractions import Fraction
+
+import storage
+from sketches import ClubSketches
+
+FORMAT_VERSION = 1
+
+
+class ExactSum:
+    """
+    A total of floats with no rounding, kept as numerator / 2 ** shift
+    Every float is a whole number over a power of two, so adding them
+    up this way is exact
+    """
+
+    def __init__(self, numerator=0, shift=0):
+        self.numerator = numerator
+        self.shift = shift
+
+    def add_fraction(self, numerator, shift):
+        """
+        Adds numerator / 2 ** shift
+        """
+        # Bring both to the bigger power of two, then add the numerators
+        if shift > self.shift:
+            self.numerator <<= shift - self.shift
+            self.shift = shift
+        self.numerator += numerator << (self.shift - shift)
+
+    def add(self, value):
+        """
+        Adds one float (or int)
+        """
+        numerator, denominator = value.as_integer_ratio()
+        self.add_fraction(numerator, denominator.bit_length() - 1)
+
+    def add_all(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """
+        Adds another ExactSum to this one
+        """
+        self.add_fraction(other.numerator, other.shift)
+
+    def __float__(self):
+        return float(Fraction(self.numerator, 1 << self.shift))
+
+    def __eq__(self, other):
+        return Fraction(self.numerator, 1 << self.shift) == Fraction(other.numerator, 1 << other.shift)
+
+    def to_list(self):
+        """
+        Returns [numerator, shift] with the shift as small as it can be
+        """
+        numerator, shift = self.numerator, self.shift
+        if numerator:
+            # Drop the powers of two the numerator and denominator share
+            trailing_zeros = min((numerator & -numerator).bit_length() - 1, shift)
+            numerator >>= trailing_zeros
+            shift -= trailing_zeros
+        else:
+            shift = 0
+        return [numerator, shift]
+
+    @classmethod
+    def from_list(cls, data):
+        return cls(data[0], data[1])
+
+
+class PlayerTotals:
+    """
+    One player's totals, exact and mergeable
+    """
+
+    def __init__(self, games=0, highest_score=0, time_total=None, time_squares=None):
+        self.games = games
+        self.highest_score = highest_score
+        self.time_total = time_total if time_total is not None else ExactSum()
+        self.time_squares = time_squares if time_squares is not None else ExactSum()
+
+    @classmethod
+    def from_games(cls, scores, times):
+        totals = cls()
+        if len(scores) > 0:
+            totals.games = len(scores)
+            totals.highest_score = max(scores)
+        totals.time_total.add_all(times)
+        for time in times:
+            # The square of a float is exact as a fraction even when the float product isn't
+            numerator, denominator = time.as_integer_ratio()
+            totals.time_squares.add_fraction(numerator * numerator, 2 * (denominator.bit_length() - 1))
+        return totals
+
+    def merge(self, other):
+        """
+        Adds another branch's totals for the same player
+        """
+        if other.games == 0:
+            return
+        if self.games == 0 or other.highest_score > self.highest_score:
+            self.highest_score = other.highest_score
+        self.games += other.games
+        self.time_total.merge(other.time_total)
+        self.time_squares.merge(other.time_squares)
+
+    @property
+    def total_time(self):
+        return float(self.time_total)
+
+    @property
+    def average_time(self):
+        """
+        Average minutes per game rounded to 2 decimal places, like calculate_average_time
+        """
+        if self.games == 0:
+            return 0.0
+        return round(self.total_time / self.games, 2)
+
+    def to_list(self):
+        return [self.games, self.highest_score, self.time_total.to_list(), self.time_squares.to_list()]
+
+    @classmethod
+    def from_list(cls, data):
+        games, highest_score, time_total, time_squares = data
+        return cls(games, highest_score, ExactSum.from_list(time_total), ExactSum.from_list(time_squares))
+
+
+class Snapshot:
+    """
+    Every player's totals from one or more branches, plus the club's sketches
+    """
+
+    def __init__(self, sites=None, players=None, sketches=None):
+        self.sites = sorted(sites or [])
+        self.players = players if players is not None else {}  # player ID -> PlayerTotals
+        self.sketches = sketches if sketches is not None else ClubSketches()
+
+    @classmethod
+    def from_store(cls, store, site):
+        """
+        Takes a snapshot of every player saved in a store
+        """
+        snapshot = cls([site])
+        for player_id in store.player_ids():
+            scores, times = store.load_games(player_id)
+            snapshot.players[player_id] = PlayerTotals.from_games(scores, times)
+            snapshot.sketches.add_games(player_id, scores, times)
+        return snapshot
+
+    @property
+    def games(self):
+        return sum(totals.games for totals in self.players.values())
+
+    def merge(self, other):
+        """
+        Adds another snapshot into this one
+        Merging is the same whichever order it's done in, but a branch can
+        only be counted once, so snapshots that share a branch can't be merged
+        """
+        shared = set(self.sites) & set(other.sites)
+        if shared:
+            raise ValueError(f"Both snapshots already include {', '.join(sorted(shared))}")
+
+        for player_id, other_totals in other.players.items():
+            totals = self.players.get(player_id)
+            if totals is None:
+                totals = self.players[player_id] = PlayerTotals()
+            totals.merge(other_totals)
+        self.sketches.merge(other.sketches)
+        self.sites = sorted(self.sites + other.sites)
+
+    def to_text(self):
+        """
+        Turns the snapshot into JSON text for saving
+        """
+        return json.dumps({
+            "format": FORMAT_VERSION,
+            "sites": self.sites,
+            "players": {player_id: totals.to_list() for player_id, totals in self.players.items()},
+            "sketches": json.loads(self.sketches.to_text()),
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        Builds a snapshot from JSON text made by to_text
+        """
+        data = json.loads(text)
+        if data.get("format") != FORMAT_VERSION:
+            raise ValueError("Not a snapshot this version of the program can read")
+        players = {player_id: PlayerTotals.from_list(totals) for player_id, totals in data["players"].items()}
+        return cls(data["sites"], players, ClubSketches.from_text(json.dumps(data["sketches"])))
+
+def save_snapshot(path, snapshot):
+    """
+    Saves a snapshot to a JSON file, swapping the whole file in at once
+    """
+    storage.write_atomically(path, snapshot.to_text() + "\n")
+
+def load_snapshot(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return Snapshot.from_text(file.read())
+
+def merge_snapshots(snapshots):
+    """
+    Merges a list of snapshots into a new one, leaving them as they were
+    """
+    merged = Snapshot()
+    for snapshot in snapshots:
+        merged.merge(snapshot)
+    return merged
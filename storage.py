@@ -0,0 +1,1030 @@
+"""
+Storage backends for the Games Club Statistics Program
+A store saves player reports (plus each player's running summary) and
+loads them back again
+
+TextFileStore keeps the original layout of one player_<ID>.txt per player
+IndexedStore keeps every report in one append-only data file plus an index
+of where each player's latest report starts, and reads it through mmap
+SqliteStore keeps players and their games in an SQLite database and builds
+the report text when it is asked for. It can also add new games on their
+own with add_games, without loading the player's older games
+
+Every store has a batch() context manager, saves made inside one are
+grouped together (one transaction for SQLite). Stores opened with sync=True
+make sure saves have reached the disk, once per batch where they can
+
+Every store also has version(player_id), which changes whenever the
+player is saved again, so a program can check nobody else saved the
+player between it loading their games and saving them back
+
+load_stats(player_id) returns just the player's stats (ID, games, highest
+score, average and total time) without loading any of their games, so it
+takes the same time however long their history is
+
+report_pieces(player_id) gives the report text a piece at a time, so a
+long report can be shown without holding all of its text at once
+"""
+
+import codecs
+import contextlib
+import itertools
+import mmap
+import os
+import sqlite3
+import threading
+from array import array
+from urllib.parse import quote, unquote
+
+import locks
+from report import (build_report, parse_raw_data, parse_summary, read_raw_data, read_summary,
+                    report_pieces, SUMMARY_READ_SIZE)
+from summary import RunningSummary
+
+STORE_TYPES = ["files", "indexed", "sqlite"]
+
+# Characters (or bytes) in each piece from report_pieces
+PIECE_SIZE = 65536
+
+def open_store(store_type="files", folder="", sync=False):
+    """
+    Opens the kind of store asked for ("files", "indexed" or "sqlite")
+    All the store's files go in the given folder (the current one by default)
+    Set sync to True to fsync saves so they survive a crash or power cut
+    """
+    if store_type == "files":
+        return TextFileStore(folder, sync)
+    if store_type == "indexed":
+        return IndexedStore(os.path.join(folder, "players.dat"),
+                            os.path.join(folder, "players.idx"), sync)
+    if store_type == "sqlite":
+        return SqliteStore(os.path.join(folder, "players.db"), sync=sync)
+    raise ValueError(f"Unknown store type: {store_type}")
+
+def write_atomically(path, text, sync=False):
+    """
+    Replaces a file's text in one go
+    The text is written with a single write to a temporary file next to it
+    which is then renamed over the old file, so anyone reading the file
+    (or looking at it after a crash) sees the old text or the new text,
+    never half of it
+    Set sync to True to fsync the text before the rename
+    """
+    # The process and thread ID keep two writers from sharing a temp file
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'w') as file:
+            file.write(text)
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+def _encode_id(player_id):
+    """
+    Writes a player ID so it can go in a space separated line
+    Spaces, newlines and % are written as %XX, so "JOHN SMITH" becomes
+    "JOHN%20SMITH" while plain IDs like P1 stay the same
+    """
+    return quote(player_id, safe="")
+
+def _split_line(line, where):
+    """
+    Splits an IndexedStore header or index line into (kind, player ID, number)
+    Raises ValueError naming where the line came from if it's broken
+    """
+    parts = line.split(" ")
+    if len(parts) != 3 or not parts[2].isdigit():
+        raise ValueError(f"Broken line in {where}: {line!r}")
+    return parts[0], unquote(parts[1]), int(parts[2])
+
+def _file_pieces(file):
+    """
+    Yields an open text file PIECE_SIZE characters at a time, closing it at the end
+    """
+    with file:
+        while True:
+            piece = file.read(PIECE_SIZE)
+            if not piece:
+                return
+            yield piece
+
+def _view_pieces(view):
+    """
+    Yields the UTF-8 text in a memoryview PIECE_SIZE bytes at a time,
+    releasing the view at the end
+    """
+    # A character can be split between two pieces, the decoder holds on to it
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for start in range(0, len(view), PIECE_SIZE):
+            piece = decoder.decode(view[start:start + PIECE_SIZE])
+            if piece:
+                yield piece
+        piece = decoder.decode(b"", final=True)
+        if piece:
+            yield piece
+    finally:
+        view.release()
+
+def fsync_path(path):
+    """
+    Flushes a file or folder to disk
+    A folder has to be flushed for a file renamed into it to be kept safe
+    """
+    if os.name == "nt":
+        # Windows can't open folders like this, and flushes renames itself
+        return
+    descriptor = os.open(path or ".", os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class TextFileStore:
+    """
+    Keeps every player in their own player_<ID>.txt file
+    Running summaries go next to it in player_<ID>.summary
+    """
+
+    store_type = "files"
+
+    def __init__(self, folder="", sync=False):
+        self.folder = folder
+        self.sync = sync
+        # Each thread has its own batch (e.g. the web service saves from
+        # several), so one thread's batch never holds back another's flush
+        self._batch = threading.local()
+
+    def location(self, player_id):
+        """
+        Returns the file name a player's report is saved in
+        """
+        return os.path.join(self.folder, f"player_{player_id}.txt")
+
+    def summary_location(self, player_id):
+        """
+        Returns the file name a player's running summary is saved in
+        """
+        return os.path.join(self.folder, f"player_{player_id}.summary")
+
+    def save_player(self, player_id, scores, times, highest_score, average_time, total_time=None,
+                    kept_games=0):
+        """
+        Writes the player's report, replacing any older one
+        The whole report is written every time, so kept_games isn't needed
+        """
+        text = build_report(player_id, scores, times, highest_score, average_time, total_time)
+        self._write(self.location(player_id), text)
+
+    def _write(self, path, text):
+        """
+        Writes a file atomically, flushing the folder afterwards when
+        syncing (or once at the end of the batch, if there is one)
+        """
+        write_atomically(path, text, self.sync)
+        if self.sync:
+            if getattr(self._batch, "active", False):
+                self._batch.folder_changed = True
+            else:
+                fsync_path(self.folder)
+
+    def load_report(self, player_id):
+        """
+        Returns the text of the player's report
+        Raises FileNotFoundError if they haven't been saved yet
+        """
+        with open(self.location(player_id), 'r') as file:
+            return file.read()
+
+    def report_pieces(self, player_id):
+        """
+        Returns the player's report as an iterator of pieces of text
+        The file is opened straight away, so FileNotFoundError is raised here
+        if they haven't been saved yet
+        """
+        return _file_pieces(open(self.location(player_id), 'r'))
+
+    def load_games(self, player_id):
+        """
+        Returns the player's saved (scores, times) from the report's RAW DATA
+        The parsed numbers are cached until the report file changes
+        """
+        return read_raw_data(self.location(player_id))
+
+    def load_stats(self, player_id):
+        """
+        Returns the player's stats from the SUMMARY part at the top of their
+        report, reading only the first few hundred bytes of the file
+        """
+        return read_summary(self.location(player_id))
+
+    def version(self, player_id):
+        """
+        Returns something that changes every time the player's report is
+        saved, or None if they haven't been saved yet
+        Every save swaps in a new file, so the file's details are enough
+        """
+        try:
+            stat = os.stat(self.location(player_id))
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)
+
+    def save_summary(self, player_id, summary):
+        """
+        Writes the player's running summary
+        Passing None deletes any older summary so it can't go out of date
+        """
+        if summary is None:
+            try:
+                os.remove(self.summary_location(player_id))
+            except FileNotFoundError:
+                pass
+            return
+
+        self._write(self.summary_location(player_id), summary.to_text())
+
+    def load_summary(self, player_id):
+        """
+        Returns the player's running summary, or None if there isn't one
+        """
+        try:
+            with open(self.summary_location(player_id), 'r') as file:
+                return RunningSummary.from_text(file.read())
+        except FileNotFoundError:
+            return None
+
+    def player_ids(self):
+        """
+        Lists the IDs of every saved player
+        """
+        player_ids = []
+        with os.scandir(self.folder or ".") as entries:
+            for entry in entries:
+                if entry.name.startswith("player_") and entry.name.endswith(".txt"):
+                    player_ids.append(entry.name[len("player_"):-len(".txt")])
+        return player_ids
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Every file is still written on its own, but when syncing the folder
+        is only flushed once at the end instead of after every file
+        The batch only covers files written by the thread that started it
+        """
+        if getattr(self._batch, "active", False):
+            yield
+            return
+
+        self._batch.active = True
+        self._batch.folder_changed = False
+        try:
+            yield
+        finally:
+            self._batch.active = False
+            if self._batch.folder_changed:
+                self._batch.folder_changed = False
+                fsync_path(self.folder)
+
+    def close(self):
+        """
+        Nothing to tidy up, every file is closed straight after use
+        """
+
+
+class IndexedStore:
+    """
+    Keeps every record in one data file that only ever gets added to
+    Each record is a header line "<KIND> <ID> <length>" followed by the data,
+    where KIND is PLAYER for a report or SUMMARY for a running summary
+    The index file has one "<KIND> <ID> <offset>" line per saved record and
+    the last line for a player wins, so looking a player up is one dictionary get
+    IDs are written with _encode_id so ones with spaces in still split properly
+
+    A compacted data file starts with a "STORE <generation> 0" record and its
+    index with the same line. If the two don't match (a compaction stopped
+    between swapping in the files) the index is worked out again
+
+    Several programs can share the files. Records are added while holding a
+    lock on the data file, and each program reads the index lines the
+    others added before it looks a player up
+    """
+
+    store_type = "indexed"
+
+    def __init__(self, data_path="players.dat", index_path="players.idx", sync=False):
+        self.data_path = data_path
+        self.folder = os.path.dirname(data_path)
+        self.index_path = index_path
+        self.lock_path = locks.lock_path(self.folder, os.path.basename(data_path) + ".lock")
+        self.sync = sync
+        self._in_batch = False
+        self._batch_files = None  # (data, index) kept open during a batch
+        self._unsynced = False
+        # Saves and loads can come from several threads (e.g. the web service)
+        self._lock = threading.RLock()
+        self.index = {}          # player ID -> offset of their latest report
+        self.summary_index = {}  # player ID -> offset of their latest summary
+        self._map = None         # read-only mmap of the data file
+        self._map_size = 0
+        self._index_file = None  # (inode, bytes read) of the index file
+        self._map_inode = None
+        self._load_index()
+
+    def location(self, player_id):
+        """
+        Returns the file the player's report is saved in
+        """
+        return self.data_path
+
+    def _index_for(self, kind):
+        """
+        Returns the index dictionary for a kind of record
+        """
+        if kind == "PLAYER":
+            return self.index
+        if kind == "SUMMARY":
+            return self.summary_index
+        raise ValueError(f"Unknown record kind in {self.data_path}: {kind}")
+
+    def _data_generation(self):
+        """
+        Returns the generation in the STORE record at the start of the data
+        file, or None if it hasn't been compacted since generations were added
+        """
+        try:
+            with open(self.data_path, 'rb') as data:
+                first = data.readline()
+        except FileNotFoundError:
+            return None
+        if first.startswith(b"STORE "):
+            return _split_line(first.decode('utf-8').rstrip("\n"), self.data_path)[2]
+        return None
+
+    def _load_index(self):
+        """
+        Reads the index file into memory
+        If the index is missing it is rebuilt by scanning the data file
+        """
+        self.index = {}
+        self.summary_index = {}
+        self._index_file = None
+        if not os.path.exists(self.index_path):
+            if os.path.exists(self.data_path):
+                self._rebuild_index()
+            return
+        self._refresh_index()
+
+    def _refresh_index(self):
+        """
+        Reads any index lines added since the last time, e.g. by another
+        program saving to the same files
+        If the index file was replaced (by a compaction) it is read again
+        from the start
+        """
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return
+        if self._index_file is None or self._index_file[0] != stat.st_ino or stat.st_size < self._index_file[1]:
+            self.index = {}
+            self.summary_index = {}
+            self._index_file = (stat.st_ino, 0)
+        inode, position = self._index_file
+        if stat.st_size == position:
+            return
+
+        from_start = position == 0
+        generation = None
+        with open(self.index_path, 'rb') as file:
+            file.seek(position)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    # Another program is still writing this line
+                    break
+                position += len(line)
+                text = line.decode('utf-8').rstrip("\n")
+                if text.count(" ") == 1:
+                    # Index lines written before summaries were added
+                    player_id, _, offset = text.partition(" ")
+                    if not offset.isdigit():
+                        raise ValueError(f"Broken line in {self.index_path}: {text!r}")
+                    self.index[unquote(player_id)] = int(offset)
+                    continue
+                kind, player_id, offset = _split_line(text, self.index_path)
+                if kind == "STORE":
+                    generation = int(unquote(player_id))
+                else:
+                    self._index_for(kind)[player_id] = offset
+        self._index_file = (inode, position)
+
+        if from_start and generation != self._data_generation():
+            # The index belongs to another version of the data file
+            self._rebuild_index()
+
+    def _rebuild_index(self):
+        """
+        Works out the index again from the record headers in the data file
+        """
+        with locks.file_lock(self.lock_path):
+            self.index = {}
+            self.summary_index = {}
+            lines = []
+            offset = 0
+            with open(self.data_path, 'rb') as data:
+                while True:
+                    header = data.readline()
+                    if not header:
+                        break
+                    if not header.endswith(b"\n"):
+                        raise ValueError(f"Broken record header in {self.data_path} at byte {offset}")
+                    kind, player_id, length = _split_line(header.decode('utf-8').rstrip("\n"),
+                                                          self.data_path)
+                    if kind == "STORE":
+                        lines.append(header.decode('utf-8'))
+                    else:
+                        self._index_for(kind)[player_id] = offset
+                        lines.append(f"{kind} {_encode_id(player_id)} {offset}\n")
+                    data.seek(length, os.SEEK_CUR)
+                    offset = data.tell()
+
+            self._close_batch_files()
+            write_atomically(self.index_path, "".join(lines))
+            stat = os.stat(self.index_path)
+            self._index_file = (stat.st_ino, stat.st_size)
+
+    def save_player(self, player_id, scores, times, highest_score, average_time, total_time=None,
+                    kept_games=0):
+        """
+        Adds the player's new report to the end of the data file
+        The older report stays in the file until the store is compacted
+        The whole report is added every time, so kept_games isn't needed
+        """
+        text = build_report(player_id, scores, times, highest_score, average_time, total_time)
+        self._append_record("PLAYER", player_id, text.encode('utf-8'))
+
+    def save_summary(self, player_id, summary):
+        """
+        Adds the player's new running summary to the end of the data file
+        Passing None saves an empty summary, which hides any older one
+        """
+        if summary is None:
+            with self._lock:
+                self._refresh_index()
+                if player_id in self.summary_index:
+                    self._append_record("SUMMARY", player_id, b"")
+            return
+        self._append_record("SUMMARY", player_id, summary.to_text().encode('utf-8'))
+
+    def _append_record(self, kind, player_id, body):
+        """
+        Writes one record to the end of the data file and indexes it
+        The file lock keeps other programs from adding a record at the same
+        offset before this one's index line is written
+        """
+        with self._lock, locks.file_lock(self.lock_path):
+            # Lines other programs added before this one are read first, so
+            # the last line for each player still wins
+            self._refresh_index()
+            if self._in_batch:
+                if self._batch_files is None:
+                    self._batch_files = (open(self.data_path, 'ab'), open(self.index_path, 'ab'))
+                self._write_record(*self._batch_files, kind, player_id, body)
+            else:
+                with open(self.data_path, 'ab') as data, open(self.index_path, 'ab') as index_file:
+                    self._write_record(data, index_file, kind, player_id, body)
+
+            if self.sync:
+                if self._in_batch:
+                    self._unsynced = True
+                else:
+                    self._sync_files()
+
+    def _write_record(self, data, index_file, kind, player_id, body):
+        """
+        Adds a record to the open data file and its line to the open index
+        file (needs the file lock), and puts it in the index straight away
+        """
+        header = f"{kind} {_encode_id(player_id)} {len(body)}\n".encode('utf-8')
+        offset = data.seek(0, os.SEEK_END)
+        data.write(header + body)
+        data.flush()
+
+        line = f"{kind} {_encode_id(player_id)} {offset}\n".encode('utf-8')
+        index_end = index_file.seek(0, os.SEEK_END)
+        index_file.write(line)
+        index_file.flush()
+        self._index_for(kind)[player_id] = offset
+        if self._index_file is not None and self._index_file[1] == index_end:
+            # Everything before this line has been read, so there's no need to read it back
+            self._index_file = (self._index_file[0], index_end + len(line))
+
+    def _sync_files(self):
+        """
+        Flushes the data file, the index and their folder to disk
+        """
+        fsync_path(self.data_path)
+        fsync_path(self.index_path)
+        fsync_path(self.folder)
+
+    def _view(self):
+        """
+        Returns a memoryview over the whole data file, mapping it again
+        if it has grown since the last time
+        """
+        stat = os.stat(self.data_path)
+        if self._map is None or stat.st_size != self._map_size or stat.st_ino != self._map_inode:
+            # Grown, or swapped for a compacted file by another program
+            self._close_map()
+            with open(self.data_path, 'rb') as data:
+                self._map = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+            self._map_size = stat.st_size
+            self._map_inode = stat.st_ino
+        return memoryview(self._map)
+
+    def _read_record(self, offset):
+        """
+        Reads the record header at the offset
+        Returns the kind and player ID in it and a memoryview of the body,
+        or None if there isn't a whole record there (the offset came from
+        an index that doesn't match the data file)
+        """
+        view = self._view()
+        # Headers can be long, a 20 character ID of emoji is 240 bytes once
+        # encoded, so look for the end of the line however far away it is
+        header_end = self._map.find(b"\n", offset)
+        try:
+            if header_end == -1:
+                raise ValueError("no header")
+            kind, saved_id, length = _split_line(
+                bytes(view[offset:header_end]).decode('utf-8'), self.data_path)
+        except ValueError:
+            view.release()
+            return None
+        start = header_end + 1
+        if start + length > len(view):
+            view.release()
+            return None
+        return kind, saved_id, view[start:start + length]
+
+    def _load_view(self, kind, player_id):
+        """
+        Returns a memoryview of the player's latest record of this kind,
+        or None if there isn't one
+        """
+        with self._lock:
+            self._refresh_index()
+            offset = self._index_for(kind).get(player_id)
+            if offset is None:
+                return None
+
+            record = self._read_record(offset)
+            if record is None or record[:2] != (kind, player_id):
+                # The index doesn't match the data file (e.g. a compaction was
+                # cut short) so work it out again from the data file itself
+                if record is not None:
+                    record[2].release()
+                self._rebuild_index()
+                offset = self._index_for(kind).get(player_id)
+                if offset is None:
+                    return None
+                record = self._read_record(offset)
+                if record is None or record[:2] != (kind, player_id):
+                    if record is not None:
+                        record[2].release()
+                    return None
+            return record[2]
+
+    def load_report_view(self, player_id):
+        """
+        Returns the player's report as a memoryview straight into the mapped
+        data file, so nothing is copied
+        Raises FileNotFoundError if the player hasn't been saved yet
+        """
+        body = self._load_view("PLAYER", player_id)
+        if body is None:
+            raise FileNotFoundError(f"No saved report for player {player_id}")
+        return body
+
+    def load_report(self, player_id):
+        """
+        Returns the text of the player's report
+        """
+        return str(self.load_report_view(player_id), 'utf-8')
+
+    def report_pieces(self, player_id):
+        """
+        Returns the player's report as an iterator of pieces of text, each
+        one decoded from the mapped data file only when it's needed
+        Raises FileNotFoundError here if they haven't been saved yet
+        """
+        return _view_pieces(self.load_report_view(player_id))
+
+    def load_games(self, player_id):
+        """
+        Returns the player's saved (scores, times) from the report's RAW DATA
+        """
+        return parse_raw_data(self.load_report(player_id))
+
+    def load_stats(self, player_id):
+        """
+        Returns the player's stats from the SUMMARY part at the top of their
+        report, so only the first page of the record is read
+        """
+        body = self.load_report_view(player_id)
+        try:
+            head = bytes(body[:SUMMARY_READ_SIZE])
+        finally:
+            body.release()
+        return parse_summary(head.decode('utf-8', errors='ignore'))
+
+    def load_summary(self, player_id):
+        """
+        Returns the player's running summary, or None if there isn't one
+        """
+        body = self._load_view("SUMMARY", player_id)
+        if body is None or len(body) == 0:
+            return None
+        return RunningSummary.from_text(str(body, 'utf-8'))
+
+    def player_ids(self):
+        """
+        Lists the IDs of every saved player
+        """
+        with self._lock:
+            self._refresh_index()
+            return list(self.index)
+
+    def version(self, player_id):
+        """
+        Returns where the player's latest report starts in the data file,
+        or None if they haven't been saved yet
+        Every save adds a new record further on, so this changes each time
+        """
+        with self._lock:
+            self._refresh_index()
+            return self.index.get(player_id)
+
+    def compact(self):
+        """
+        Rewrites the data file with only the latest records for each player
+        Returns how many bytes were freed up
+        """
+        with self._lock, locks.file_lock(self.lock_path):
+            if not os.path.exists(self.data_path):
+                return 0
+            self._refresh_index()
+
+            old_size = os.path.getsize(self.data_path)
+            new_data_path = self.data_path + ".compact"
+            new_index_path = self.index_path + ".compact"
+            new_indexes = {"PLAYER": {}, "SUMMARY": {}}
+            # Both new files are stamped with the next generation
+            stamp = f"STORE {(self._data_generation() or 0) + 1} 0\n"
+
+            with open(new_data_path, 'wb') as data, open(new_index_path, 'w', encoding='utf-8') as index_file:
+                data.write(stamp.encode('utf-8'))
+                index_file.write(stamp)
+                for kind, new_index in new_indexes.items():
+                    for player_id in list(self._index_for(kind)):
+                        body = self._load_view(kind, player_id)
+                        new_index[player_id] = data.tell()
+                        data.write(f"{kind} {_encode_id(player_id)} {len(body)}\n".encode('utf-8'))
+                        data.write(body)
+                        index_file.write(f"{kind} {_encode_id(player_id)} {new_index[player_id]}\n")
+                        body.release()
+
+            # Swap the new files in. If it stops in between, the generations
+            # don't match and the index is worked out again from the data file
+            self._close_map()
+            self._close_batch_files()
+            os.replace(new_data_path, self.data_path)
+            os.replace(new_index_path, self.index_path)
+            self.index = new_indexes["PLAYER"]
+            self.summary_index = new_indexes["SUMMARY"]
+            stat = os.stat(self.index_path)
+            self._index_file = (stat.st_ino, stat.st_size)
+            return old_size - os.path.getsize(self.data_path)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        The data file stays locked and the data and index files stay open
+        until the end, so each record is just two writes. When syncing the
+        files are only flushed once at the end instead of after every record
+        Other threads (and programs) wait for the whole batch to finish
+        before saving, so their records are never left for this batch to flush
+        """
+        with self._lock:
+            if self._in_batch:
+                yield
+                return
+
+            self._in_batch = True
+            try:
+                with locks.file_lock(self.lock_path):
+                    yield
+            finally:
+                self._in_batch = False
+                self._close_batch_files()
+                if self._unsynced:
+                    self._unsynced = False
+                    self._sync_files()
+
+    def _close_batch_files(self):
+        """
+        Closes the files a batch kept open, e.g. before they're swapped for new ones
+        """
+        if self._batch_files is not None:
+            for file in self._batch_files:
+                file.close()
+            self._batch_files = None
+
+    def _close_map(self):
+        """
+        Closes the mmap of the data file if there is one
+        """
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A memoryview handed out earlier is still in use, so leave
+                # this map for the garbage collector to close later
+                pass
+            self._map = None
+            self._map_size = 0
+
+    def close(self):
+        """
+        Lets go of the mmap of the data file
+        """
+        self._close_map()
+
+
+class SqliteStore:
+    """
+    Keeps players and games in an SQLite database
+    The players table has each player's stats and running summary and the
+    games table has one row per game, so reports are built from a query
+    The database uses WAL journaling so several programs can read while
+    one of them writes, and writers wait their turn instead of failing
+    """
+
+    store_type = "sqlite"
+
+    def __init__(self, path="players.db", timeout=30.0, sync=False):
+        self.path = path
+        self.folder = os.path.dirname(path)
+        # isolation_level=None means transactions are started by hand (in batch)
+        # The connection can be used from several threads (e.g. the web
+        # service), _lock makes sure only one of them uses it at a time
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                                          check_same_thread=False)
+        self._lock = threading.RLock()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # FULL flushes the log at every commit, which is once per batch
+        self.connection.execute(f"PRAGMA synchronous={'FULL' if sync else 'NORMAL'}")
+        self._in_batch = False
+        self._create_tables()
+
+    def _create_tables(self):
+        """
+        Makes the players and games tables if they aren't there yet
+        """
+        with self.batch():
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS players ("
+                " player_id TEXT PRIMARY KEY,"
+                " highest_score INTEGER NOT NULL,"
+                " average_time REAL NOT NULL,"
+                " total_time REAL NOT NULL,"
+                " summary TEXT,"
+                " version INTEGER NOT NULL DEFAULT 0,"
+                " games INTEGER)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS games ("
+                " player_id TEXT NOT NULL,"
+                " game_number INTEGER NOT NULL,"
+                " score INTEGER NOT NULL,"
+                " time REAL NOT NULL,"
+                " PRIMARY KEY (player_id, game_number))")
+            # Databases made before these columns were added get them now,
+            # games stays empty for old players until they are saved again
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(players)")]
+            for column, definition in [("version", "INTEGER NOT NULL DEFAULT 0"), ("games", "INTEGER")]:
+                if column not in columns:
+                    self.connection.execute(f"ALTER TABLE players ADD COLUMN {column} {definition}")
+
+    def location(self, player_id):
+        """
+        Returns the database file the player is saved in
+        """
+        return self.path
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Runs everything inside it as one transaction
+        BEGIN IMMEDIATE takes the write lock straight away, so two programs
+        saving at once take turns instead of deadlocking part way through
+        Other threads wait for the whole batch to finish before using the
+        connection, so they never end up inside someone else's transaction
+        """
+        with self._lock:
+            if self._in_batch:
+                yield
+                return
+
+            self.connection.execute("BEGIN IMMEDIATE")
+            self._in_batch = True
+            try:
+                yield
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            else:
+                self.connection.execute("COMMIT")
+            finally:
+                self._in_batch = False
+
+    def save_player(self, player_id, scores, times, highest_score, average_time, total_time=None,
+                    kept_games=0):
+        """
+        Saves the player's stats and replaces their games
+        kept_games says how many of the first games are already saved and
+        haven't changed, so only the games after them are written again
+        (adding one game to a long history is then one row, not all of them)
+        """
+        if total_time is None:
+            total_time = sum(times)
+
+        with self.batch():
+            self.connection.execute(
+                "INSERT INTO players (player_id, highest_score, average_time, total_time, games)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (player_id) DO UPDATE SET highest_score = excluded.highest_score,"
+                " average_time = excluded.average_time, total_time = excluded.total_time,"
+                " games = excluded.games, version = players.version + 1",
+                (player_id, highest_score, average_time, total_time, len(scores)))
+            self.connection.execute("DELETE FROM games WHERE player_id = ? AND game_number > ?",
+                                    (player_id, kept_games))
+            self.connection.executemany(
+                "INSERT INTO games (player_id, game_number, score, time) VALUES (?, ?, ?, ?)",
+                ((player_id, game_number, scores[game_number - 1], times[game_number - 1])
+                 for game_number in range(kept_games + 1, len(scores) + 1)))
+
+    def add_games(self, player_id, new_scores, new_times, summary):
+        """
+        Adds games to the end of the player's saved games without loading or
+        writing the older ones, so it takes the same time however long their
+        history is. summary is their running summary with the new games in
+        Returns False and changes nothing unless they are saved with exactly
+        the games the summary had before the new ones (or, if it had none,
+        they haven't been saved yet)
+        """
+        kept_games = summary.games - len(new_scores)
+        values = (player_id, summary.highest_score, summary.average_time, summary.total_time,
+                  summary.to_text(), summary.games, kept_games)
+        with self.batch():
+            if kept_games == 0:
+                cursor = self.connection.execute(
+                    "INSERT INTO players (player_id, highest_score, average_time, total_time, summary, games)"
+                    " VALUES (?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (player_id) DO UPDATE SET highest_score = excluded.highest_score,"
+                    " average_time = excluded.average_time, total_time = excluded.total_time,"
+                    " summary = excluded.summary, games = excluded.games, version = players.version + 1"
+                    " WHERE players.games = ?", values)
+            else:
+                cursor = self.connection.execute(
+                    "UPDATE players SET highest_score = ?2, average_time = ?3, total_time = ?4,"
+                    " summary = ?5, games = ?6, version = version + 1 WHERE player_id = ?1 AND games = ?7",
+                    values)
+            if cursor.rowcount != 1:
+                return False
+            self.connection.executemany(
+                "INSERT INTO games (player_id, game_number, score, time) VALUES (?, ?, ?, ?)",
+                ((player_id, game_number, score, time)
+                 for game_number, score, time in zip(itertools.count(kept_games + 1), new_scores, new_times)))
+        return True
+
+    def load_games(self, player_id):
+        """
+        Returns the player's saved (scores, times)
+        Raises FileNotFoundError if they haven't been saved yet
+        """
+        with self._lock:
+            self._check_saved(player_id)
+            scores = array('i')
+            times = array('d')
+            for score, time in self.connection.execute(
+                    "SELECT score, time FROM games WHERE player_id = ? ORDER BY game_number",
+                    (player_id,)):
+                scores.append(score)
+                times.append(time)
+            return scores, times
+
+    def _check_saved(self, player_id):
+        """
+        Returns the player's row from the players table
+        Raises FileNotFoundError if there isn't one
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT highest_score, average_time, total_time, summary FROM players WHERE player_id = ?",
+                (player_id,)).fetchone()
+            if row is None:
+                raise FileNotFoundError(f"No saved report for player {player_id}")
+            return row
+
+    def load_stats(self, player_id):
+        """
+        Returns the player's stats from their row in the players table
+        Raises FileNotFoundError if they haven't been saved yet
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT highest_score, average_time, total_time, games FROM players WHERE player_id = ?",
+                (player_id,)).fetchone()
+            if row is None:
+                raise FileNotFoundError(f"No saved report for player {player_id}")
+            highest_score, average_time, total_time, games = row
+            if games is None:
+                # Saved before the games column was added
+                games = self.connection.execute("SELECT COUNT(*) FROM games WHERE player_id = ?",
+                                                (player_id,)).fetchone()[0]
+        return {"player_id": player_id, "games": games, "highest_score": highest_score,
+                "average_time": average_time, "total_time": total_time}
+
+    def load_report(self, player_id):
+        """
+        Builds the text of the player's report from the database
+        It is exactly the same text the other stores save
+        """
+        # Both reads happen in one transaction so a save in between can't mix
+        # the stats from one version with the games from another
+        with self.batch():
+            highest_score, average_time, total_time, _ = self._check_saved(player_id)
+            scores, times = self.load_games(player_id)
+        return build_report(player_id, scores, times, highest_score, average_time, total_time)
+
+    def report_pieces(self, player_id):
+        """
+        Returns the player's report as an iterator of pieces of text
+        The games are loaded straight away (as compact arrays) and the text
+        is only made as each piece is asked for
+        Raises FileNotFoundError here if they haven't been saved yet
+        """
+        with self.batch():
+            highest_score, average_time, total_time, _ = self._check_saved(player_id)
+            scores, times = self.load_games(player_id)
+        return report_pieces(player_id, scores, times, highest_score, average_time, total_time)
+
+    def save_summary(self, player_id, summary):
+        """
+        Saves the player's running summary
+        Passing None clears it so it can't go out of date
+        """
+        text = summary.to_text() if summary is not None else None
+        with self.batch():
+            self.connection.execute("UPDATE players SET summary = ? WHERE player_id = ?",
+                                    (text, player_id))
+
+    def load_summary(self, player_id):
+        """
+        Returns the player's running summary, or None if there isn't one
+        """
+        with self._lock:
+            row = self.connection.execute("SELECT summary FROM players WHERE player_id = ?",
+                                          (player_id,)).fetchone()
+            if row is None or row[0] is None:
+                return None
+            return RunningSummary.from_text(row[0])
+
+    def version(self, player_id):
+        """
+        Returns how many times the player has been saved over,
+        or None if they haven't been saved yet
+        """
+        with self._lock:
+            row = self.connection.execute("SELECT version FROM players WHERE player_id = ?",
+                                          (player_id,)).fetchone()
+            return row[0] if row is not None else None
+
+    def player_ids(self):
+        """
+        Lists the IDs of every saved player
+        """
+        with self._lock:
+            return [row[0] for row in self.connection.execute("SELECT player_id FROM players")]
+
+    def close(self):
+        """
+        Closes the database connection
+        """
+        self.connection.close()
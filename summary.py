@@ -0,0 +1,126 @@
+"""
+Running summaries for the Games Club Statistics Program
+A summary keeps a few totals for a player so adding new games only
+needs the new games, not the player's whole history
+"""
+
+import json
+import sys
+
+# Python 3.12 made sum() add floats with Neumaier's compensated method, so
+# running totals do the same there to give exactly what sum(times) gives
+COMPENSATED_SUM = sys.version_info >= (3, 12)
+
+def add_to_total(total, compensation, value):
+    """
+    Adds a value to a running float total the same way sum() would
+    Returns the new (total, compensation) pair
+    """
+    new_total = total + value
+    if COMPENSATED_SUM:
+        if abs(total) >= abs(value):
+            compensation += (total - new_total) + value
+        else:
+            compensation += (value - new_total) + total
+    return new_total, compensation
+
+
+class RunningSummary:
+    """
+    Keeps the number of games, highest score and time totals for a player
+    """
+
+    def __init__(self, games=0, highest_score=0, time_sum=0.0, time_compensation=0.0,
+                 time_squares=0.0):
+        self.games = games
+        self.highest_score = highest_score
+        self.time_sum = time_sum
+        self.time_compensation = time_compensation
+        self.time_squares = time_squares  # sum of time * time, for the variance
+
+    @classmethod
+    def from_games(cls, scores, times):
+        """
+        Builds a summary from a full list of scores and times
+        """
+        summary = cls()
+        summary.add_games(scores, times)
+        return summary
+
+    def add_game(self, score, time):
+        """
+        Adds one game to the totals
+        """
+        if self.games == 0 or score > self.highest_score:
+            self.highest_score = score
+        self.games += 1
+        self.time_sum, self.time_compensation = add_to_total(self.time_sum, self.time_compensation, time)
+        self.time_squares += time * time
+
+    def add_games(self, scores, times):
+        """
+        Adds several games to the totals
+        """
+        for score, time in zip(scores, times):
+            self.add_game(score, time)
+
+    @property
+    def total_time(self):
+        """
+        Total minutes played, the same number sum(times) would give
+        """
+        if self.time_compensation:
+            return self.time_sum + self.time_compensation
+        return self.time_sum
+
+    @property
+    def average_time(self):
+        """
+        Average minutes per game rounded to 2 decimal places
+        Matches calculate_average_time in main.py
+        """
+        if self.games == 0:
+            return 0.0
+        return round(self.total_time / self.games, 2)
+
+    @property
+    def time_variance(self):
+        """
+        How spread out the game times are (population variance)
+        """
+        if self.games == 0:
+            return 0.0
+        mean = self.total_time / self.games
+        return max(self.time_squares / self.games - mean * mean, 0.0)
+
+    def to_dict(self):
+        """
+        Turns the summary into a dictionary so it can be saved as JSON
+        """
+        return {
+            "games": self.games,
+            "highest_score": self.highest_score,
+            "time_sum": self.time_sum,
+            "time_compensation": self.time_compensation,
+            "time_squares": self.time_squares,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Builds a summary from a dictionary made by to_dict
+        """
+        return cls(**data)
+
+    def to_text(self):
+        """
+        Turns the summary into JSON text for saving
+        """
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        Builds a summary from JSON text made by to_text
+        """
+        return cls.from_dict(json.loads(text))
@@ -0,0 +1,54 @@
+"""
+Unit tests for the benchmarks
+"""
+
+import unittest
+import json
+import benchmarks
+
+
+class TestHistoryMemory(unittest.TestCase):
+    """Test cases for the game history memory benchmark"""
+
+    def test_arrays_use_about_12_bytes_per_game(self):
+        """Test an array history uses 12 bytes a game (plus a little spare room)"""
+        list_per_game, array_per_game = benchmarks.bench_history_memory(20000)
+        self.assertLess(array_per_game, 13)
+        self.assertGreater(list_per_game, 4 * array_per_game)
+
+
+
+class TestTimingBenchmarks(unittest.TestCase):
+    """Test cases for the timing benchmarks and comparing runs"""
+
+    def test_run_gives_json_results(self):
+        """Test a small run times every function with every store"""
+        run = benchmarks.run_benchmarks([10, 100], [10], ["files", "sqlite"], min_time=0.001)
+        run = json.loads(json.dumps(run))
+        names = {(result["name"], result["store"]) for result in run["results"]}
+        self.assertEqual(names, {("find_highest_score", None), ("calculate_average_time", None),
+                                 ("show_results", None), ("save_to_file", "files"),
+                                 ("save_to_file", "sqlite"), ("show_saved_stats", "files"),
+                                 ("show_saved_stats", "sqlite"), ("rollup_query", None),
+                                 ("rescan_query", None), ("range_query", None), ("range_scan", None)})
+        for result in run["results"]:
+            self.assertGreater(result["best_seconds"], 0)
+            self.assertLessEqual(result["best_seconds"], result["median_seconds"])
+
+    def test_follow_saves_every_event(self):
+        """Test the live mode benchmark saves every event it writes"""
+        result = benchmarks.bench_follow(2000, seconds=0.2, num_players=20)
+        self.assertEqual(result["events"], 400)
+        self.assertLessEqual(result["median_latency"], result["worst_latency"])
+
+    def test_compare_finds_slower_benchmarks(self):
+        """Test only benchmarks past the threshold are reported"""
+        def run(*seconds):
+            return {"results": [benchmarks._result(name, (best, best), games=10)
+                                for name, best in zip(["a", "b", "c"], seconds)]}
+        slower = benchmarks.compare_runs(run(1.0, 1.0, 1.0), run(1.1, 2.0, 0.5), threshold=1.25)
+        self.assertEqual([(result["name"], ratio) for result, _, ratio in slower], [("b", 2.0)])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,130 @@
+"""
+Unit tests for the club-wide statistics engine
+"""
+
+import unittest
+import random
+import tempfile
+from unittest.mock import patch
+import main
+import storage
+
+try:
+    import numpy as np
+    import club_stats
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "club stats need NumPy")
+class TestPlayerStats(unittest.TestCase):
+    """Test cases for the per-player numbers"""
+
+    def setUp(self):
+        rng = random.Random(4)
+        self.players = []
+        for number in range(30):
+            num_games = rng.randint(1, 100)
+            scores = [rng.randint(0, 1000000) for _ in range(num_games)]
+            times = [round(rng.uniform(0.1, 1440), rng.randint(0, 3)) for _ in range(num_games)]
+            self.players.append((f"P{number}", scores, times))
+        self.games = club_stats.ClubGames.from_players(self.players)
+
+    def test_matches_scalar_functions(self):
+        """Test every player's stats are exactly what main.py works out"""
+        stats = club_stats.player_stats(self.games)
+        for number, (_, scores, times) in enumerate(self.players):
+            self.assertEqual(stats["highest_score"][number], main.find_highest_score(scores))
+            self.assertEqual(stats["average_time"][number], main.calculate_average_time(times))
+            self.assertEqual(stats["total_time"][number], sum(times))
+
+    def test_spread_and_rate(self):
+        """Test standard deviation and points per minute for each player"""
+        stats = club_stats.player_stats(self.games)
+        for number, (_, scores, times) in enumerate(self.players):
+            self.assertAlmostEqual(stats["score_std"][number], np.std(scores), delta=1e-6)
+            self.assertAlmostEqual(stats["time_std"][number], np.std(times), delta=1e-9)
+            self.assertAlmostEqual(stats["score_per_minute"][number], sum(scores) / sum(times))
+
+    def test_player_percentiles(self):
+        """Test per-player percentiles match np.percentile"""
+        result = club_stats.player_percentiles(self.games, self.games.scores, [0, 50, 90, 100])
+        for number, (_, scores, _) in enumerate(self.players):
+            np.testing.assert_allclose(result[number], np.percentile(scores, [0, 50, 90, 100]))
+
+    def test_long_histories(self):
+        """Test players with more games than SHORT_GAMES still match sum() exactly"""
+        rng = random.Random(5)
+        players = [("LONG", [1] * 5000, [rng.uniform(0.1, 1440) for _ in range(5000)]),
+                   ("SHORT", [2, 3], [1.5, 2.25])]
+        games = club_stats.ClubGames.from_players(players)
+        totals = club_stats.sequential_sums(games.times, games.starts, games.counts)
+        self.assertEqual(totals[0], sum(players[0][2]))
+        self.assertEqual(totals[1], 3.75)
+
+    def test_top_players(self):
+        """Test the top players are the ones with the most points per minute"""
+        top = club_stats.top_players(self.games, 3, (50,))
+        rates = [sum(scores) / sum(times) for _, scores, times in self.players]
+        best = sorted(range(len(rates)), key=lambda number: -rates[number])[:3]
+        self.assertEqual([player[0] for player in top], [f"P{number}" for number in best])
+        self.assertAlmostEqual(top[0][4][0], np.percentile(self.players[best[0]][1], 50))
+
+    def test_player_with_no_games(self):
+        """Test a player with no games gets the same zeros as the scalar functions"""
+        games = club_stats.ClubGames.from_players([("A", [5], [2.0]), ("B", [], []), ("C", [7], [1.0])])
+        stats = club_stats.player_stats(games)
+        self.assertEqual(list(stats["highest_score"]), [5, 0, 7])
+        self.assertEqual(list(stats["average_time"]), [2.0, 0.0, 1.0])
+
+
+@unittest.skipIf(np is None, "club stats need NumPy")
+class TestClubStats(unittest.TestCase):
+    """Test cases for the whole-club numbers and command"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        main.set_store(storage.open_store("files", self.temp_dir.name))
+
+    def tearDown(self):
+        main.set_store(None)
+        self.temp_dir.cleanup()
+
+    def test_load_from_store(self):
+        """Test every saved game ends up in the arrays"""
+        main.save_to_file("B", [10, 30], [1.0, 3.0], 30, 2.0, quiet=True)
+        main.save_to_file("A", [20], [2.0], 20, 2.0, quiet=True)
+
+        games = club_stats.load_club_games(main.get_store())
+        stats = club_stats.club_stats(games, percentiles=[50], bins=2)
+
+        self.assertEqual(games.player_ids, ["A", "B"])
+        self.assertEqual(list(games.scores), [20, 10, 30])
+        self.assertEqual(stats["highest_score"], 30)
+        self.assertEqual(stats["average_time"], 2.0)
+        self.assertEqual(list(stats["score_percentiles"]), [20.0])
+        self.assertEqual(list(stats["score_histogram"][0]), [1, 2])
+
+    def test_one_player_matches_scalar_functions(self):
+        """Test the club's total and average time are exactly main.py's for one player"""
+        rng = random.Random(6)
+        for _ in range(200):
+            times = [round(rng.uniform(0.1, 1440), 2) for _ in range(rng.randint(1, 100))]
+            games = club_stats.ClubGames.from_players([("A", [1] * len(times), times)])
+            stats = club_stats.club_stats(games)
+            self.assertEqual(stats["total_time"], sum(times))
+            self.assertEqual(stats["average_time"], main.calculate_average_time(times))
+
+    @patch('builtins.print')
+    def test_club_stats_command(self, mock_print):
+        """Test the club-stats command prints the club's numbers"""
+        main.save_to_file("A", [1200, 1500], [25.0, 20.5], 1500, 22.75, quiet=True)
+
+        self.assertEqual(main.run_command(["club-stats"]), 0)
+        mock_print.assert_any_call("Highest Score: 1,500")
+        mock_print.assert_any_call("Average Time per Game: 22.75 minutes")
+        mock_print.assert_any_call("  1. A: 59.34 points/min over 2 games, highest 1,500, median 1,350.0, 90th 1,470.0")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
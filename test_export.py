@@ -0,0 +1,118 @@
+"""
+Unit tests for the columnar export
+"""
+
+import unittest
+import json
+import os
+import tempfile
+from unittest.mock import patch
+import export
+import main
+import storage
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class TestExport(unittest.TestCase):
+    """Test cases for exporting every game into columns"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self.temp_dir.name, "export")
+        self.store = storage.open_store("sqlite", self.temp_dir.name)
+        self.games = {}
+        for number in range(5):
+            self.save(f"P{number}", [number * 100 + game for game in range(number + 1)],
+                      [game + 0.5 for game in range(number + 1)])
+
+    def tearDown(self):
+        self.store.close()
+        self.temp_dir.cleanup()
+
+    def save(self, player_id, scores, times):
+        self.store.save_player(player_id, scores, times, max(scores), sum(times) / len(times))
+        self.games[player_id] = (scores, times)
+
+    def exported_games(self):
+        """Reads the export back the way an analyst would, skipping replaced rows"""
+        scores = export.load_column(os.path.join(self.folder, "scores.npy"))
+        times = export.load_column(os.path.join(self.folder, "times.npy"))
+        players = export.load_column(os.path.join(self.folder, "players.npy"))
+        with open(os.path.join(self.folder, "player_ids.txt")) as file:
+            player_ids = file.read().splitlines()
+        games = {}
+        for score, time, player in zip(scores, times, players):
+            if player != export.DEAD_ROW:
+                player_scores, player_times = games.setdefault(player_ids[player], ([], []))
+                player_scores.append(score)
+                player_times.append(time)
+        return games
+
+    def test_every_game_is_exported(self):
+        """Test the columns hold every player's games"""
+        self.assertEqual(export.export_games(self.store, self.folder), (5, 15, 0))
+        self.assertEqual(self.exported_games(), self.games)
+        self.assertEqual(export.read_header(os.path.join(self.folder, "times.npy")), ('<f8', 15))
+
+    def test_only_changed_players_are_written(self):
+        """Test exporting again only adds the players saved since"""
+        export.export_games(self.store, self.folder)
+        self.assertEqual(export.export_games(self.store, self.folder), (0, 15, 0))
+
+        self.save("P4", [1, 2], [3.0, 4.0])
+        self.save("NEW", [7], [7.5])
+        self.assertEqual(export.export_games(self.store, self.folder), (2, 18, 5))
+        self.assertEqual(self.exported_games(), self.games)
+
+    def test_rebuilt_once_mostly_replaced(self):
+        """Test the export is written from scratch once most rows are replaced"""
+        export.export_games(self.store, self.folder)
+        self.save("P4", [1], [1.0])
+        self.save("P3", [2], [2.0])
+        self.assertEqual(export.export_games(self.store, self.folder), (2, 8, 0))
+        self.assertEqual(self.exported_games(), self.games)
+        self.assertFalse(os.path.exists(self.folder + ".new"))
+
+    def test_stopped_export_is_tidied_up(self):
+        """Test rows added after the manifest was saved are dropped next time"""
+        export.export_games(self.store, self.folder)
+        with open(os.path.join(self.folder, "scores.npy"), 'ab') as file:
+            file.write(b"\0" * 40)
+        with open(os.path.join(self.folder, "player_ids.txt"), 'a') as file:
+            file.write("HALF\n")
+
+        self.save("NEW", [7], [7.5])
+        export.export_games(self.store, self.folder)
+        self.assertEqual(self.exported_games(), self.games)
+        with open(os.path.join(self.folder, "manifest.json")) as file:
+            self.assertEqual(json.load(file)["rows"], 16)
+
+    @unittest.skipIf(np is None, "reading with memmap needs NumPy")
+    def test_numpy_can_map_the_columns(self):
+        """Test numpy.load and numpy.memmap read the columns without copying them"""
+        export.export_games(self.store, self.folder)
+        scores = np.load(os.path.join(self.folder, "scores.npy"), mmap_mode='r')
+        self.assertIsInstance(scores, np.memmap)
+        self.assertEqual(int(scores.sum()), sum(sum(games[0]) for games in self.games.values()))
+        players = np.memmap(os.path.join(self.folder, "players.npy"), dtype='<i4', mode='r',
+                            offset=export.HEADER_SIZE)
+        self.assertEqual(np.bincount(players).tolist(), [1, 2, 3, 4, 5])
+
+    @patch('builtins.print')
+    def test_export_command(self, mock_print):
+        """Test the export command with the program's store"""
+        main.set_store(self.store)
+        try:
+            self.assertEqual(main.run_command(["export", self.folder]), 0)
+            self.assertEqual(main.run_command(["export", self.folder, "--rebuild"]), 0)
+        finally:
+            main.set_store(None)
+        mock_print.assert_any_call(f"{self.folder} has 15 games (0 replaced rows to skip)")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,201 @@
+"""
+Unit tests for live mode (following a JSONL log)
+"""
+
+import unittest
+import io
+import json
+import os
+import tempfile
+from unittest.mock import patch
+import follow
+import ingest
+import main
+import storage
+
+
+def event(player_id, score, time):
+    return json.dumps({"player_id": player_id, "score": score, "time": time}) + "\n"
+
+
+class TestLogFollower(unittest.TestCase):
+    """Test cases for reading new lines from a log"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "events.jsonl")
+        self.write("old line\n")
+        self.follower = follow.LogFollower(self.path)
+
+    def tearDown(self):
+        self.follower.close()
+        self.temp_dir.cleanup()
+
+    def write(self, text, mode='a'):
+        with open(self.path, mode) as file:
+            file.write(text)
+
+    def test_only_new_lines(self):
+        """Test lines already in the log are skipped unless asked for"""
+        self.assertEqual(self.follower.read_lines(), [])
+        self.write("one\ntwo\n")
+        self.assertEqual(self.follower.read_lines(), [b"one", b"two"])
+        self.assertEqual(self.follower.read_lines(), [])
+
+        from_start = follow.LogFollower(self.path, from_start=True)
+        self.assertEqual(from_start.read_lines(), [b"old line", b"one", b"two"])
+        from_start.close()
+
+    def test_half_written_line_waits(self):
+        """Test a line is only handed out once its newline is written"""
+        self.write('{"player_id": "P1", ')
+        self.assertEqual(self.follower.read_lines(), [])
+        self.write('"score": 5, "time": 1.5}\n')
+        self.assertEqual(self.follower.read_lines(), [b'{"player_id": "P1", "score": 5, "time": 1.5}'])
+
+    def test_rotated_log(self):
+        """Test the end of the old log is read before the new one"""
+        self.write("last old\nno newline")
+        os.rename(self.path, self.path + ".1")
+        self.assertEqual(self.follower.read_lines(), [b"last old"])
+        # Nothing new yet, and the new log hasn't been made
+        self.assertEqual(self.follower.read_lines(), [])
+
+        self.write("first new\n", 'w')
+        self.assertEqual(self.follower.read_lines(), [b"no newline"])
+        self.assertEqual(self.follower.read_lines(), [b"first new"])
+
+    def test_truncated_log(self):
+        """Test a log cut back to nothing is read again from the start"""
+        self.write("before\n")
+        self.assertEqual(self.follower.read_lines(), [b"before"])
+        self.write("", 'w')
+        self.assertEqual(self.follower.read_lines(), [])
+        self.write("after\n")
+        self.assertEqual(self.follower.read_lines(), [b"after"])
+
+    def test_log_made_later(self):
+        """Test a log that doesn't exist yet is read from its start once it does"""
+        follower = follow.LogFollower(self.path + ".new")
+        self.assertEqual(follower.read_lines(), [])
+        with open(self.path + ".new", 'w') as file:
+            file.write("first\n")
+        self.assertEqual(follower.read_lines(), [b"first"])
+        follower.close()
+
+
+class TestParseEvents(unittest.TestCase):
+    """Test cases for checking and grouping new lines"""
+
+    def test_grouped_by_player_in_order(self):
+        """Test games are grouped by player and bad lines are reported"""
+        lines = [event("P1", 10, 1.5), event("P2", 20, 2.5), "not json\n", event("P1", 30, 3.5),
+                 event("P3", -5, 1.0)]
+        report = ingest.new_report()
+        games = follow.parse_events([line.rstrip("\n").encode() for line in lines], report)
+        self.assertEqual(games, {"P1": ([10, 30], [1.5, 3.5]), "P2": ([20], [2.5])})
+        self.assertEqual(report["rows"], 5)
+        self.assertEqual(report["rejected"], 2)
+        self.assertEqual(report["examples"], ["Oops! You can't leave this empty. Try again.",
+                                              "Scores can't be negative! Try again."])
+        follow.parse_events([b"oops"], report)
+        self.assertEqual(report["errors"], {"empty_id": 2, "score_negative": 1})
+
+
+
+class ListFollower:
+    """
+    Hands out lines from a list of reads instead of a real log
+    """
+
+    def __init__(self, reads):
+        self.reads = list(reads)
+
+    def read_lines(self):
+        return self.reads.pop(0) if self.reads else []
+
+
+class TestFollow(unittest.TestCase):
+    """Test cases for gathering lines into batches"""
+
+    def run_follow(self, reads, **options):
+        follower = ListFollower([[line.rstrip("\n").encode() for line in lines] for lines in reads])
+        saves = []
+        report = ingest.new_report()
+        follow.follow(follower, saves.append, report, should_stop=lambda: not follower.reads,
+                      poll_interval=0, **options)
+        return saves, report
+
+    def test_lines_close_together_are_saved_once(self):
+        """Test a player's games from several reads are saved in one go"""
+        saves, report = self.run_follow([[event("P1", 1, 1.0)], [event("P1", 2, 1.0), event("P2", 3, 1.0)],
+                                         [event("P1", 4, 1.0)], []], batch_interval=10)
+        self.assertEqual(saves, [{"P1": ([1, 2, 4], [1.0, 1.0, 1.0]), "P2": ([3], [1.0])}])
+        self.assertEqual(report["rows"], 4)
+
+    def test_bad_lines_go_to_quarantine(self):
+        """Test bad lines are written out with their line number instead of being kept"""
+        quarantine = io.StringIO()
+        saves, report = self.run_follow([[event("P1", 1, 1.0), "oops\n"], [], [event("P1", -2, 1.0)], []],
+                                        quarantine=quarantine)
+        self.assertEqual(len(saves), 1)
+        self.assertEqual(report["rejected"], 2)
+        bad = [json.loads(line) for line in quarantine.getvalue().splitlines()]
+        self.assertEqual([(line["row"], line["error"]) for line in bad],
+                         [(2, "empty_id"), (3, "score_negative")])
+
+
+class TestFollowLog(unittest.TestCase):
+    """Test cases for the follow command"""
+
+    def setUp(self):
+        self.old_dir = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        main.set_store(storage.open_store("sqlite", "."))
+
+    def tearDown(self):
+        main.set_store(None)
+        os.chdir(self.old_dir)
+        self.temp_dir.cleanup()
+
+    @patch('builtins.print')
+    def test_games_are_saved_as_they_arrive(self, mock_print):
+        """Test games added to the log end up in the reports, summaries and rollups"""
+        main.save_new_games("P1", [100], [10.0])
+        with open("events.jsonl", 'w') as log:
+            log.write(event("P1", 300, 20.0) + event("P2", 50, 5.0) + "oops\n" + event("P1", 200, 30.0))
+
+        store = main.get_store()
+        checks = [0]
+
+        def all_saved():
+            checks[0] += 1
+            summary = store.load_summary("P1")
+            return (summary is not None and summary.games == 3) or checks[0] > 1000
+
+        self.assertEqual(main.follow_log("events.jsonl", from_start=True, should_stop=all_saved), 0)
+        self.assertEqual(list(store.load_games("P1")[0]), [100, 300, 200])
+        self.assertEqual(store.load_summary("P1").highest_score, 300)
+        self.assertEqual(store.load_stats("P2")["games"], 1)
+        self.assertEqual(main.get_rollups().totals("day").games, 4)
+        self.assertEqual(main.get_leaderboard().top(1)[0][0], "P1")
+        mock_print.assert_any_call("Saved 3 games (1 bad lines, 0 players couldn't be saved)")
+        mock_print.assert_any_call("  empty_id: 1 lines")
+
+    def test_sqlite_saves_only_the_new_games(self):
+        """Test followed games for a player with a summary are added without loading their old games"""
+        main.save_new_games("P1", [100, 200], [10.0, 20.0])
+        store = main.get_store()
+        with patch.object(store, "load_games", side_effect=AssertionError("loaded old games")):
+            with main.saving_players(["P1", "P2"]):
+                main.add_locked_games("P1", [300], [30.0])
+                main.add_locked_games("P2", [50], [5.0])
+        self.assertEqual(list(store.load_games("P1")[0]), [100, 200, 300])
+        self.assertEqual(store.load_stats("P1")["average_time"], 20.0)
+        self.assertEqual(store.load_stats("P2")["games"], 1)
+        self.assertEqual(main.get_leaderboard().top(1)[0][0], "P1")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
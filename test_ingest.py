@@ -0,0 +1,145 @@
+"""
+Unit tests for the bulk ingestion pipeline
+"""
+
+import unittest
+import io
+import json
+import os
+import tempfile
+from array import array
+from unittest.mock import patch
+import ingest
+import main
+
+
+class TestReadingRecords(unittest.TestCase):
+    """Test cases for reading CSV and JSONL files"""
+
+    def test_read_csv_records(self):
+        """Test CSV rows come out as dictionaries"""
+        file = io.StringIO("player_id,score,time\nplayer001,1500,25.5\n")
+        records = list(ingest.read_records(file, "csv"))
+        self.assertEqual(records, [{"player_id": "player001", "score": "1500", "time": "25.5"}])
+
+    def test_read_jsonl_records(self):
+        """Test JSONL lines come out as dictionaries and bad lines as empty ones"""
+        file = io.StringIO('{"player_id": "A", "score": 10, "time": 1.5}\n\nnot json\n')
+        records = list(ingest.read_records(file, "jsonl"))
+        self.assertEqual(records, [{"player_id": "A", "score": 10, "time": 1.5}, {}])
+
+    def test_guess_format(self):
+        """Test the format is worked out from the file name"""
+        self.assertEqual(ingest.guess_format("results.JSONL"), "jsonl")
+        self.assertEqual(ingest.guess_format("results.csv"), "csv")
+
+
+class TestValidationAndGrouping(unittest.TestCase):
+    """Test cases for validating and grouping rows"""
+
+    def test_bad_rows_are_rejected_with_menu_messages(self):
+        """Test bad rows use the same messages as the menu"""
+        records = [
+            {"player_id": "a", "score": "100", "time": "10"},
+            {"player_id": "", "score": "100", "time": "10"},
+            {"player_id": "b", "score": "-5", "time": "10"},
+            {"player_id": "c", "score": 12.5, "time": "10"},
+            {"player_id": "d", "score": "1", "time": "2000"},
+        ]
+        report = ingest.new_report()
+        rows = list(ingest.validate_records(records, report))
+
+        self.assertEqual(rows, [(1, "A", 100, 10.0)])
+        self.assertEqual(report["rows"], 5)
+        self.assertEqual(report["errors"], {"empty_id": 1, "score_negative": 1, "score_not_number": 1,
+                                            "time_too_long": 1})
+        self.assertEqual(report["rejected"], 4)
+        self.assertEqual(report["examples"], [
+            (2, "Oops! You can't leave this empty. Try again."),
+            (3, "Scores can't be negative! Try again."),
+            (4, "Please enter a number for the score!"),
+            (5, "That's more than 24 hours! Are you sure?"),
+        ])
+
+    def test_only_a_few_bad_rows_are_kept(self):
+        """Test a file of bad rows is counted without keeping every one"""
+        records = ({"player_id": "a", "score": "-1", "time": "1"} for _ in range(25000))
+        report = ingest.new_report()
+        self.assertEqual(list(ingest.validate_records(records, report)), [])
+        self.assertEqual(report["rejected"], 25000)
+        self.assertEqual(len(report["examples"]), ingest.REJECTED_EXAMPLES)
+        self.assertEqual(report["errors"], {"score_negative": 25000})
+
+    def test_group_by_player(self):
+        """Test rows next to each other are grouped per player"""
+        rows = [(1, "A", 10, 1.0), (2, "A", 20, 2.0), (3, "B", 30, 3.0)]
+        groups = list(ingest.group_by_player(iter(rows)))
+        self.assertEqual(groups, [("A", array('i', [10, 20]), array('d', [1.0, 2.0])),
+                                  ("B", array('i', [30]), array('d', [3.0]))])
+
+
+class TestIngestCommand(unittest.TestCase):
+    """Test cases for the ingest command"""
+
+    def setUp(self):
+        self.old_dir = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        # A new store (and leaderboard) for this folder, not one left by another test
+        main.set_store(None)
+
+    def tearDown(self):
+        main.set_store(None)
+        os.chdir(self.old_dir)
+        self.temp_dir.cleanup()
+
+    @patch('builtins.print')
+    def test_ingest_csv_writes_each_player(self, mock_print):
+        """Test a CSV import saves a report per player"""
+        with open("results.csv", "w") as file:
+            file.write("player_id,score,time\n")
+            file.write("alice,100,10.0\nalice,300,20.0\nbob,50,5.5\nbob,oops,1\n")
+
+        result = main.run_command(["ingest", "results.csv"])
+
+        self.assertEqual(result, 0)
+        with open("player_ALICE.txt") as file:
+            content = file.read()
+        self.assertIn("Highest Score: 300\n", content)
+        self.assertIn("Average Time: 15.0 minutes\n", content)
+        self.assertTrue(os.path.exists("player_BOB.txt"))
+        mock_print.assert_any_call("Row 4 skipped: Please enter a number for the score!")
+        mock_print.assert_any_call("Imported 3 rows for 2 players (1 rejected)")
+
+    @patch('builtins.print')
+    def test_bad_rows_are_quarantined(self, mock_print):
+        """Test bad rows are written to the quarantine file with their problem"""
+        with open("results.csv", "w") as file:
+            file.write("player_id,score,time\n")
+            file.write("alice,100,10.0\nbob,-1,5.5\ncarl,7,3000\ndave,-4,1\n")
+
+        result = main.run_command(["ingest", "results.csv", "--quarantine", "bad.jsonl"])
+
+        self.assertEqual(result, 0)
+        with open("bad.jsonl") as file:
+            bad_rows = [json.loads(line) for line in file]
+        self.assertEqual([row["row"] for row in bad_rows], [2, 3, 4])
+        self.assertEqual(bad_rows[1], {"row": 3, "error": "time_too_long",
+                                       "message": "That's more than 24 hours! Are you sure?",
+                                       "record": {"player_id": "carl", "score": "7", "time": "3000"}})
+        mock_print.assert_any_call("  score_negative: 2 rows")
+        mock_print.assert_any_call("Bad rows written to bad.jsonl")
+
+    @patch('builtins.print')
+    def test_ingest_jsonl_from_stdin(self, mock_print):
+        """Test JSONL can be piped in on stdin"""
+        data = io.StringIO('{"player_id": "carl", "score": 7, "time": 3}\n')
+        with patch('sys.stdin', data):
+            result = main.run_command(["ingest", "-", "--format", "jsonl"])
+
+        self.assertEqual(result, 0)
+        self.assertTrue(os.path.exists("player_CARL.txt"))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,220 @@
+"""
+Unit tests for the leaderboard
+"""
+
+import unittest
+import os
+import tempfile
+from unittest.mock import patch
+import main
+import storage
+import leaderboard
+from leaderboard import Leaderboard
+
+
+class TestLeaderboard(unittest.TestCase):
+    """Test cases for keeping the top players in order"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        main.set_store(storage.open_store("files", self.temp_dir.name))
+
+    def tearDown(self):
+        main.set_store(None)
+        self.temp_dir.cleanup()
+
+    def save(self, player_id, scores, times):
+        main.save_to_file(player_id, scores, times, main.find_highest_score(scores),
+                          main.calculate_average_time(times), quiet=True)
+
+    def test_built_from_existing_reports(self):
+        """Test a store saved before the leaderboard existed gets ranked"""
+        self.save("A", [100], [10.0])
+        self.save("B", [300], [5.0])
+        self.save("C", [200], [20.0])
+
+        leaderboard = main.get_leaderboard()
+        self.assertEqual([row[0] for row in leaderboard.top(2)], ["B", "C"])
+        self.assertEqual(leaderboard.top(1, by="time"), [("C", 200, 20.0)])
+        self.assertTrue(os.path.exists(leaderboard.path))
+
+    def test_updated_on_save(self):
+        """Test saving a player moves them without re-sorting everything"""
+        self.save("A", [100], [10.0])
+        self.save("B", [300], [5.0])
+        main.get_leaderboard().top(10)
+
+        self.save("A", [500], [1.0])
+        self.save("B", [50], [2.0])
+
+        self.assertEqual(main.get_leaderboard().top(10), [("A", 500, 1.0), ("B", 50, 2.0)])
+
+    def test_batch_writes_once(self):
+        """Test saves inside a batch reach the log in one write when it ends"""
+        self.save("A", [100], [10.0])
+        leaderboard = main.get_leaderboard()
+        leaderboard.top(10)
+        with patch("os.write", wraps=os.write) as mock_write:
+            with main.saving_players(["A", "B", "C"]):
+                for player_id, score in [("A", 500), ("B", 300), ("C", 200)]:
+                    self.save(player_id, [score], [1.0])
+                self.assertEqual(mock_write.call_count, 0)
+            self.assertEqual(mock_write.call_count, 1)
+        self.assertEqual([row[0] for row in leaderboard.top(3)], ["A", "B", "C"])
+
+    def test_log_survives_reopening(self):
+        """Test a new leaderboard reads the saves from the log"""
+        self.save("A", [100], [10.0])
+        main.get_leaderboard().top(10)
+        self.save("A", [700], [10.0])
+
+        reopened = Leaderboard(main.get_store(), main.get_leaderboard().path)
+        self.assertEqual(reopened.top(10), [("A", 700, 10.0)])
+
+    def test_old_log_is_worked_out_again(self):
+        """Test a log from before games and total time were kept is rebuilt"""
+        self.save("A", [100, 200], [10.0, 20.0])
+        with open(main.get_leaderboard().path, 'w') as file:
+            file.write("A 200 15.0\n")
+        self.assertEqual(main.get_leaderboard().find({}), [("A", 200, 15.0, 2, 30.0)])
+
+    def test_id_with_space(self):
+        """Test a player ID with a space in it is kept in the log and read back"""
+        self.save("A", [100], [10.0])
+        main.get_leaderboard().top(10)
+        main.get_leaderboard().update("JOHN SMITH", 900, 5.0, 1, 5.0)
+
+        reopened = Leaderboard(main.get_store(), main.get_leaderboard().path)
+        self.assertEqual(reopened.top(1), [("JOHN SMITH", 900, 5.0)])
+        reopened.close()
+
+    def test_broken_log_line_is_an_error(self):
+        """Test a line that can't be read in the log raises instead of being skipped"""
+        self.save("A", [100], [10.0])
+        main.get_leaderboard().top(10)
+        with open(main.get_leaderboard().path, 'a') as file:
+            file.write("B 1 2.0 3\n")
+        with self.assertRaises(ValueError):
+            Leaderboard(main.get_store(), main.get_leaderboard().path).top(10)
+
+    def test_other_programs_saves_are_seen(self):
+        """Test lines another program adds to the log show up without reopening"""
+        self.save("A", [100], [10.0])
+        first = main.get_leaderboard()
+        self.assertEqual(first.top(10), [("A", 100, 10.0)])
+
+        other = Leaderboard(main.get_store(), first.path)
+        other.update("B", 300, 2.0, 1, 2.0)
+        self.assertEqual(first.top(10), [("B", 300, 2.0), ("A", 100, 10.0)])
+        other.close()
+
+    def test_log_is_merged_into_snapshot(self):
+        """Test a long log is merged into a new snapshot and started again"""
+        self.save("A", [100], [10.0])
+        board = main.get_leaderboard()
+        board.top(10)
+        with patch.object(leaderboard, "TAIL_LINES", 3):
+            for score in range(1, 6):
+                board.update(f"P{score}", score, 1.0, 1, 1.0)
+                board.top(1)
+        with open(board.path) as file:
+            self.assertLessEqual(len(file.readlines()), 4)
+
+        self.assertEqual([row[0] for row in board.top(10)], ["A", "P5", "P4", "P3", "P2", "P1"])
+        reopened = Leaderboard(main.get_store(), board.path)
+        self.assertEqual(reopened.top(2), [("A", 100, 10.0), ("P5", 5, 1.0)])
+        reopened.close()
+
+    @patch('builtins.print')
+    def test_leaderboard_command(self, mock_print):
+        """Test the leaderboard command prints players best first"""
+        self.save("A", [1500], [10.0])
+        self.save("B", [200], [30.0])
+
+        self.assertEqual(main.run_command(["leaderboard", "-k", "1", "--by", "time"]), 0)
+        mock_print.assert_any_call("LEADERBOARD - LONGEST AVERAGE TIMES")
+        printed = [call.args[0] for call in mock_print.call_args_list if call.args]
+        self.assertTrue(any(line.strip().startswith("1. B") for line in printed))
+        self.assertFalse(any(line.strip().startswith("2.") for line in printed))
+
+
+
+class TestFind(unittest.TestCase):
+    """Test cases for finding players whose stats are in a range"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        main.set_store(storage.open_store("sqlite", self.temp_dir.name))
+        # Player i scores i * 1000 in each of their i games, taking i minutes a game
+        for number in range(1, 101):
+            scores = [number * 1000] * number
+            times = [float(number)] * number
+            main.save_player_data(f"P{number:03d}", scores, times, max(scores), float(number))
+        self.leaderboard = main.get_leaderboard()
+
+    def tearDown(self):
+        main.set_store(None)
+        self.temp_dir.cleanup()
+
+    def test_single_range_includes_both_ends(self):
+        """Test a range finds the players from its low end to its high end"""
+        found = self.leaderboard.find({"score": (50000, 53000)})
+        self.assertEqual([row[0] for row in found], ["P053", "P052", "P051", "P050"])
+        self.assertEqual(found[0], ("P053", 53000, 53.0, 53, 2809.0))
+
+    def test_open_ended_and_combined(self):
+        """Test ranges with one end left open, combined with other ranges"""
+        found = self.leaderboard.find({"time": (None, 10), "games": (8, None)}, by="games")
+        self.assertEqual([row[0] for row in found], ["P010", "P009", "P008"])
+        self.assertEqual(self.leaderboard.find({"total": (9000.5, None)}, limit=2)[0][0], "P100")
+        self.assertEqual(self.leaderboard.find({"score": (200000, None)}), [])
+
+    def test_same_as_checking_everyone(self):
+        """Test the answers match checking every player one at a time"""
+        everyone = self.leaderboard.find({})
+        ranges = {"score": (20000, 80000), "time": (30, 90), "total": (None, 4000)}
+        positions = {"score": 1, "time": 2, "games": 3, "total": 4}
+        expected = [row for row in everyone
+                    if all((low is None or row[positions[field]] >= low) and
+                           (high is None or row[positions[field]] <= high)
+                           for field, (low, high) in ranges.items())]
+        self.assertEqual(self.leaderboard.find(ranges), expected)
+
+    def test_only_the_range_is_read(self):
+        """Test find reads the players in the range from the snapshot, not every player"""
+        reopened = Leaderboard(main.get_store(), self.leaderboard.path)
+        reopened.top(1)
+        with patch.object(leaderboard.Snapshot, "entry", autospec=True,
+                          side_effect=leaderboard.Snapshot.entry) as entry:
+            found = reopened.find({"score": (50000, 53000), "games": (None, 52)})
+        self.assertEqual([row[0] for row in found], ["P052", "P051", "P050"])
+        # Only the smaller range (4 players) is walked
+        self.assertEqual(entry.call_count, 4)
+        reopened.close()
+
+    def test_saves_move_players(self):
+        """Test a save moves the player in every sorted list"""
+        self.leaderboard.find({})
+        main.save_player_data("P001", [999999], [0.5], 999999, 0.5)
+        self.assertEqual(self.leaderboard.find({"score": (900000, None)}), [("P001", 999999, 0.5, 1, 0.5)])
+        self.assertEqual(len(self.leaderboard.find({"score": (1000, 1000)})), 0)
+
+    @patch('builtins.print')
+    def test_query_command(self, mock_print):
+        """Test the query command parses ranges and prints the players found"""
+        self.assertEqual(main.run_command(["query", "--score", "95000:", "--time", ":96.5"]), 0)
+        mock_print.assert_any_call("PLAYERS FOUND: 2")
+        with self.assertRaises(SystemExit), patch('sys.stderr'):
+            main.run_command(["query", "--score", "lots"])
+
+    def test_leaderboard_count_below_one(self):
+        """Test the leaderboard command turns down counts below 1"""
+        for count in ["-1", "0", "lots"]:
+            with self.subTest(count=count):
+                with self.assertRaises(SystemExit) as caught, patch('sys.stderr'):
+                    main.run_command(["leaderboard", "-k", count])
+                self.assertEqual(caught.exception.code, 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,221 @@
+"""
+Unit tests for saving the same players from several programs at once
+"""
+
+import unittest
+import contextlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+import main
+import locks
+import storage
+
+NUM_PROCESSES = 4
+SAVES_PER_PROCESS = 15
+PLAYERS = ["P1", "P2", "P3"]
+
+
+def add_games_in_process(store_type, folder, process_number, start):
+    """
+    Adds one game at a time to a few shared players, like a club terminal
+    Every game gets its own score so the test can tell which ones were kept
+    """
+    main.set_store(storage.open_store(store_type, folder))
+    start.wait()
+    for save_number in range(SAVES_PER_PROCESS):
+        player_id = PLAYERS[save_number % len(PLAYERS)]
+        score = process_number * 1000 + save_number
+        main.save_new_games(player_id, [score], [1.5])
+    main.set_store(None)
+
+
+def ingest_in_process(folder, csv_path, start, rounds):
+    """
+    Imports the same few players again and again, each time as one batch
+    A short SQLite timeout makes a deadlock show up as an error quickly
+    """
+    main.set_store(storage.SqliteStore(os.path.join(folder, "players.db"), timeout=3.0))
+    start.wait()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(rounds):
+            if main.ingest_file(csv_path, append=True) != 0:
+                raise RuntimeError("import failed")
+    main.set_store(None)
+
+def save_in_process(folder, start, rounds):
+    """
+    Saves the players one at a time, the way the menu does
+    """
+    main.set_store(storage.SqliteStore(os.path.join(folder, "players.db"), timeout=3.0))
+    start.wait()
+    for number in range(rounds):
+        for player_id in reversed(PLAYERS):
+            main.save_player_data(player_id, [number], [1.0], number, 1.0)
+    main.set_store(None)
+
+
+class TestFileLock(unittest.TestCase):
+    """Test cases for the file locks"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_lock_can_be_taken_again(self):
+        """Test a thread can take a lock it already holds without waiting forever"""
+        with locks.player_lock(self.temp_dir.name, "P1"):
+            with locks.player_lock(self.temp_dir.name, "P1"):
+                pass
+
+    def test_lock_files_stay_out_of_the_folder(self):
+        """Test lock files go in the store's .locks folder, not next to the players"""
+        with locks.player_lock(self.temp_dir.name, "P1"):
+            pass
+        with locks.player_lock(self.temp_dir.name, "JOHN/SMITH"):
+            pass
+        self.assertEqual(os.listdir(self.temp_dir.name), [".locks"])
+
+    def test_lock_files_dont_grow_with_players(self):
+        """Test locking lots of players only ever makes PLAYER_STRIPES lock files"""
+        with locks.player_locks(self.temp_dir.name, [f"P{number}" for number in range(1000)]):
+            pass
+        for number in range(1000, 1100):
+            with locks.player_lock(self.temp_dir.name, f"P{number}"):
+                pass
+        self.assertEqual(len(os.listdir(os.path.join(self.temp_dir.name, ".locks"))),
+                         locks.PLAYER_STRIPES)
+
+    def test_same_folder_same_lock(self):
+        """Test two spellings of the same folder share their lock files"""
+        relative = os.path.relpath(self.temp_dir.name)
+        self.assertEqual(locks.lock_path(self.temp_dir.name, "x.lock"),
+                         locks.lock_path(relative, "x.lock"))
+
+    def test_other_threads_wait(self):
+        """Test another thread waits while the player is locked"""
+        order = []
+        with locks.player_lock(self.temp_dir.name, "P1"):
+            def take_lock():
+                with locks.player_lock(self.temp_dir.name, "P1"):
+                    order.append("thread")
+            thread = threading.Thread(target=take_lock)
+            thread.start()
+            thread.join(0.2)
+            order.append("main")
+        thread.join()
+        self.assertEqual(order, ["main", "thread"])
+
+
+class TestConcurrentSaves(unittest.TestCase):
+    """Test cases for several programs adding games to the same players"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        main.set_store(None)
+        self.temp_dir.cleanup()
+
+    def check_no_games_lost(self, store_type):
+        context = multiprocessing.get_context("spawn")
+        start = context.Event()
+        processes = [context.Process(target=add_games_in_process,
+                                     args=(store_type, self.temp_dir.name, number, start))
+                     for number in range(NUM_PROCESSES)]
+        for process in processes:
+            process.start()
+        start.set()
+        for process in processes:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+
+        store = storage.open_store(store_type, self.temp_dir.name)
+        main.set_store(store)
+        saved_scores = []
+        for player_id in PLAYERS:
+            scores, times = store.load_games(player_id)
+            saved_scores.extend(scores)
+            _, _, summary = main.load_player_history(player_id)
+            self.assertEqual(store.load_summary(player_id).games, len(scores))
+            self.assertEqual(summary.highest_score, max(scores))
+
+        expected = [number * 1000 + save_number for number in range(NUM_PROCESSES)
+                    for save_number in range(SAVES_PER_PROCESS)]
+        self.assertEqual(sorted(saved_scores), expected)
+
+    def test_files_store(self):
+        """Test no games go missing with one file per player"""
+        self.check_no_games_lost("files")
+
+    def test_indexed_store(self):
+        """Test no games go missing with the indexed store"""
+        self.check_no_games_lost("indexed")
+
+    def test_sqlite_store(self):
+        """Test no games go missing with the SQLite store"""
+        self.check_no_games_lost("sqlite")
+
+    def test_batch_and_single_saves_take_turns(self):
+        """Test an import saving players in one batch doesn't deadlock with single saves"""
+        csv_path = os.path.join(self.temp_dir.name, "games.csv")
+        with open(csv_path, 'w') as file:
+            file.write("player_id,score,time\n")
+            file.writelines(f"{player_id},10,1.0\n" for player_id in PLAYERS)
+
+        context = multiprocessing.get_context("spawn")
+        start = context.Event()
+        processes = [context.Process(target=ingest_in_process, args=(self.temp_dir.name, csv_path, start, 30)),
+                     context.Process(target=save_in_process, args=(self.temp_dir.name, start, 30))]
+        for process in processes:
+            process.start()
+        began = time.perf_counter()
+        start.set()
+        for process in processes:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+        # A deadlock would only end when the 3 second SQLite timeout ran out
+        self.assertLess(time.perf_counter() - began, 3.0)
+
+    def test_version_changes_on_save(self):
+        """Test every store gives a new version each time a player is saved"""
+        for store_type in storage.STORE_TYPES:
+            folder = os.path.join(self.temp_dir.name, store_type)
+            os.mkdir(folder)
+            main.set_store(storage.open_store(store_type, folder))
+            store = main.get_store()
+            self.assertIsNone(store.version("P1"))
+            main.save_new_games("P1", [10], [1.0])
+            first = store.version("P1")
+            main.save_new_games("P1", [20], [2.0])
+            self.assertNotEqual(store.version("P1"), first)
+            self.assertEqual(list(store.load_games("P1")[0]), [10, 20])
+
+    def test_stale_save_is_retried(self):
+        """Test games saved by someone else in between are kept"""
+        main.set_store(storage.open_store("files", self.temp_dir.name))
+        main.save_new_games("P1", [10], [1.0])
+        real_extend_history = main.extend_history
+        calls = []
+
+        def extend_then_clash(player_id, new_scores, new_times):
+            loaded = real_extend_history(player_id, new_scores, new_times)
+            if not calls:
+                # Another terminal saves a game after this one loaded the history
+                calls.append(player_id)
+                main.save_player_data(player_id, [10, 99], [1.0, 9.0], 99, 5.0)
+            return loaded
+
+        with patch('main.extend_history', side_effect=extend_then_clash):
+            main.save_new_games("P1", [20], [2.0])
+        self.assertEqual(list(main.get_store().load_games("P1")[0]), [10, 99, 20])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
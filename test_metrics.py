@@ -0,0 +1,138 @@
+"""
+Unit tests for the stage timings and counters
+"""
+
+import unittest
+import json
+import os
+import tempfile
+from unittest.mock import patch
+import main
+import metrics
+import storage
+
+
+class TestHistogram(unittest.TestCase):
+    """Test cases for the latency histogram"""
+
+    def test_empty_histogram(self):
+        """Test percentiles of nothing are None"""
+        self.assertIsNone(metrics.Histogram().percentile(50))
+
+    def test_percentiles_are_close(self):
+        """Test percentiles come out within a bucket of the real value"""
+        histogram = metrics.Histogram()
+        for millisecond in range(1, 1001):
+            histogram.observe(millisecond / 1000)
+        for percent in metrics.PERCENTILES:
+            real = percent / 100
+            self.assertGreaterEqual(histogram.percentile(percent), real)
+            self.assertLess(histogram.percentile(percent), real * 1.2)
+        self.assertEqual(histogram.count, 1000)
+        self.assertAlmostEqual(histogram.total, 500.5)
+
+    def test_percentile_never_past_the_longest(self):
+        """Test a percentile is never more than the longest timing"""
+        histogram = metrics.Histogram()
+        histogram.observe(0.0011)
+        self.assertEqual(histogram.percentile(99), 0.0011)
+
+    def test_very_long_timing(self):
+        """Test timings past the last bucket are still counted"""
+        histogram = metrics.Histogram()
+        histogram.observe(100000.0)
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertEqual(histogram.percentile(50), 100000.0)
+
+
+class TestMetrics(unittest.TestCase):
+    """Test cases for turning metrics on and writing them out"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        metrics.disable()
+
+    def tearDown(self):
+        metrics.disable()
+        main.set_store(None)
+        self.temp_dir.cleanup()
+
+    def test_off_by_default(self):
+        """Test nothing is recorded while metrics are off"""
+        with metrics.stage("save"):
+            pass
+        metrics.count("players_saved")
+        self.assertFalse(metrics.enabled())
+        self.assertIsNone(metrics.get_registry())
+
+    def test_stage_and_count(self):
+        """Test stages are timed and counters add up once turned on"""
+        registry = metrics.enable()
+        with metrics.stage("save"):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.stage("save"):
+                raise ValueError("still timed")
+        metrics.count("players_saved")
+        metrics.count("players_saved", 2)
+        self.assertEqual(registry.histograms["save"].count, 2)
+        self.assertEqual(registry.counters, {"players_saved": 3})
+
+    def test_dump_json(self):
+        """Test the timings are written as JSON with percentiles"""
+        registry = metrics.enable()
+        with metrics.stage("stats"):
+            pass
+        path = os.path.join(self.temp_dir.name, "metrics.json")
+        registry.dump(path)
+        with open(path) as file:
+            data = json.load(file)
+        self.assertEqual(data["stages"]["stats"]["count"], 1)
+        self.assertIn("p95_seconds", data["stages"]["stats"])
+
+    def test_dump_prometheus(self):
+        """Test a .prom file gets Prometheus text format"""
+        registry = metrics.enable()
+        with metrics.stage("stats"):
+            pass
+        metrics.count("games_recorded", 3)
+        path = os.path.join(self.temp_dir.name, "metrics.prom")
+        registry.dump(path)
+        with open(path) as file:
+            text = file.read()
+        self.assertIn('games_club_stage_seconds_bucket{stage="stats",le="+Inf"} 1', text)
+        self.assertIn('games_club_stage_seconds_count{stage="stats"} 1', text)
+        self.assertIn('games_club_stage_latency_seconds{stage="stats",quantile="0.99"}', text)
+        self.assertIn('games_club_events_total{event="games_recorded"} 3', text)
+
+    @patch('builtins.input', side_effect=["TEST001", "2", "1500", "25.5", "abc", "1800", "30.0", ""])
+    @patch('builtins.print')
+    def test_record_scores_stages(self, mock_print, mock_input):
+        """Test recording a player times every stage"""
+        main.set_store(storage.open_store("files", self.temp_dir.name))
+        registry = metrics.enable()
+        main.record_scores()
+
+        stages = registry.histograms
+        self.assertEqual(set(stages), {"validation", "stats", "show_results", "save"})
+        # Player ID, number of games, two scores (one typed wrong) and two times
+        self.assertEqual(stages["validation"].count, 7)
+        self.assertEqual(registry.counters, {"games_recorded": 2, "players_saved": 1})
+
+    @patch('builtins.print')
+    def test_show_saved_stats_stages(self, mock_print):
+        """Test looking players up times the load and the printing"""
+        main.set_store(storage.open_store("files", self.temp_dir.name))
+        main.save_to_file("TEST001", [10], [1.0], 10, 1.0, quiet=True)
+        registry = metrics.enable()
+        with patch('builtins.input', side_effect=["TEST001", "", "NOBODY", ""]):
+            main.show_saved_stats()
+            main.show_saved_stats()
+
+        self.assertEqual(registry.histograms["load_report"].count, 2)
+        self.assertEqual(registry.histograms["print_report"].count, 1)
+        self.assertEqual(registry.counters, {"reports_shown": 1, "reports_not_found": 1})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,121 @@
+"""
+Unit tests for moving player_<ID>.txt reports into another store
+"""
+
+import unittest
+import json
+import os
+import tempfile
+from unittest.mock import patch
+import main
+import migrate
+import storage
+
+
+class TestMigrate(unittest.TestCase):
+    """Test cases for migrating an archive of reports"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.archive = os.path.join(self.temp_dir.name, "archive")
+        self.target = os.path.join(self.temp_dir.name, "target")
+        self.checkpoint = os.path.join(self.temp_dir.name, "migrate.checkpoint")
+        os.mkdir(self.archive)
+        os.mkdir(self.target)
+
+        # Write the archive the same way the program always has
+        main.set_store(storage.open_store("files", self.archive))
+        self.games = {}
+        for number in range(9):
+            scores = [number * 100 + game for game in range(number + 1)]
+            times = [round(1.25 + game * 0.5, 2) for game in range(number + 1)]
+            main.save_to_file(f"P{number}", scores, times, main.find_highest_score(scores),
+                              main.calculate_average_time(times), quiet=True)
+            self.games[f"P{number}"] = (scores, times)
+        main.set_store(None)
+
+    def tearDown(self):
+        main.set_store(None)
+        self.temp_dir.cleanup()
+
+    def saved_games(self, store):
+        return {player_id: tuple(list(values) for values in store.load_games(player_id))
+                for player_id in store.player_ids()}
+
+    def break_report(self, player_id):
+        path = os.path.join(self.archive, f"player_{player_id}.txt")
+        with open(path) as file:
+            text = file.read()
+        with open(path, 'w') as file:
+            file.write(text.replace("Number of Games: ", "Number of Games: 1", 1))
+
+    def test_find_reports(self):
+        """Test only report files are found, in order"""
+        with open(os.path.join(self.archive, "notes.txt"), 'w') as file:
+            file.write("not a report")
+        self.assertEqual(migrate.find_reports(self.archive), [f"player_P{number}.txt" for number in range(9)])
+
+    def test_mismatched_summary_is_skipped(self):
+        """Test a report whose SUMMARY disagrees with its games isn't migrated"""
+        self.break_report("P3")
+        players, problems = migrate.read_chunk(self.archive, ["player_P2.txt", "player_P3.txt"])
+        self.assertEqual([player[0] for player in players], ["P2"])
+        self.assertEqual(problems, [("player_P3.txt", "says 14 games but has 4")])
+
+    @patch('builtins.print')
+    def test_migrate_into_sqlite_with_workers(self, mock_print):
+        """Test every report ends up in the new store with the same games"""
+        main.set_store(storage.open_store("sqlite", self.target))
+        result = main.run_command(["migrate", self.archive, "--workers", "2", "--chunk-size", "2",
+                                   "--checkpoint", self.checkpoint])
+        self.assertEqual(result, 0)
+        store = main.get_store()
+        self.assertEqual(self.saved_games(store), self.games)
+        self.assertEqual(store.load_summary("P8").games, 9)
+        mock_print.assert_any_call("Migrated 9 players into the sqlite store (0 skipped)")
+
+    def test_resume_after_stopping(self):
+        """Test a migration stopped part way carries on from the checkpoint"""
+        saved_chunks = []
+
+        def save_then_stop(players):
+            if len(saved_chunks) == 2:
+                raise KeyboardInterrupt
+            saved_chunks.append([player[0] for player in players])
+
+        with self.assertRaises(KeyboardInterrupt):
+            migrate.migrate(self.archive, save_then_stop, self.checkpoint, workers=1, chunk_size=2)
+        with open(self.checkpoint) as file:
+            self.assertEqual(json.load(file)["last_done"], "player_P3.txt")
+
+        saved_chunks.clear()
+        checkpoint = migrate.migrate(self.archive, lambda players: saved_chunks.append(
+            [player[0] for player in players]), self.checkpoint, workers=1, chunk_size=2)
+        self.assertEqual(saved_chunks, [["P4", "P5"], ["P6", "P7"], ["P8"]])
+        self.assertEqual(checkpoint["migrated"], 9)
+        self.assertTrue(checkpoint["finished"])
+
+    def test_checkpoint_for_another_folder(self):
+        """Test a checkpoint from a different archive isn't used by mistake"""
+        migrate.save_checkpoint(self.checkpoint, {"source": "/somewhere/else", "last_done": ""})
+        with self.assertRaises(ValueError):
+            migrate.migrate(self.archive, lambda players: None, self.checkpoint, workers=1)
+
+    @patch('builtins.print')
+    def test_skipped_reports_are_listed(self, mock_print):
+        """Test bad reports are shown at the end and the rest still migrated"""
+        self.break_report("P5")
+        main.set_store(storage.open_store("sqlite", self.target))
+        main.migrate_reports(self.archive, self.checkpoint, workers=1)
+        mock_print.assert_any_call("player_P5.txt skipped: says 16 games but has 6")
+        mock_print.assert_any_call("Migrated 8 players into the sqlite store (1 skipped)")
+
+    @patch('builtins.print')
+    def test_same_folder_is_refused(self, mock_print):
+        """Test migrating the files store's own folder into itself is refused"""
+        main.set_store(storage.open_store("files", self.archive))
+        self.assertEqual(main.migrate_reports(self.archive, self.checkpoint), 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,129 @@
+"""
+Unit tests for paged output
+"""
+
+import unittest
+import tempfile
+from unittest.mock import patch
+import main
+import pager
+import storage
+from session import ScriptedSession
+
+
+class TestPieces(unittest.TestCase):
+    """Test cases for splitting pieces of text into rows and lines"""
+
+    text = "top\nGame 1: a\nGame 10: b\n" + "x" * 25 + "\nDETAILED GAME DATA:\nend\n"
+
+    def pieces(self, size):
+        return [self.text[start:start + size] for start in range(0, len(self.text), size)]
+
+    def test_rows_are_cut_to_the_width(self):
+        """Test long lines are split into rows however the pieces are cut up"""
+        expected = ["top", "Game 1: a", "Game 10: b", "x" * 10, "x" * 10, "x" * 5,
+                    "DETAILED G", "AME DATA:", "end"]
+        for size in (1, 3, 7, 1000):
+            self.assertEqual(list(pager.screen_rows(self.pieces(size), 10)), expected)
+
+    def test_skip_and_stop_at_lines(self):
+        """Test skipping to a line and stopping at one, even split between pieces"""
+        for size in (1, 4, 1000):
+            self.assertEqual("".join(pager.skip_to_line(self.pieces(size), "Game 10:")),
+                             self.text[self.text.index("Game 10:"):])
+            self.assertEqual("".join(pager.skip_to_line(self.pieces(size), "top")), self.text)
+            self.assertEqual("".join(pager.stop_at_line(self.pieces(size), "DETAILED")),
+                             self.text[:self.text.index("DETAILED")])
+            self.assertEqual("".join(pager.skip_to_line(self.pieces(size), "Game 2:")), "")
+
+
+class TestShowPages(unittest.TestCase):
+    """Test cases for showing text a screen at a time"""
+
+    def lines(self, start=1):
+        for number in range(start, 21):
+            yield f"line {number}\n"
+
+    def test_no_stops_without_a_screen(self):
+        """Test everything is written in one go when the session has no page size"""
+        session = ScriptedSession([], keep_output=True)
+        pager.show_pages(session, self.lines())
+        self.assertEqual(session.output, ["".join(self.lines())])
+
+    def test_one_write_per_screen(self):
+        """Test each screen is one write and Enter shows the next"""
+        session = ScriptedSession(["", ""], keep_output=True, page_rows=8)
+        pager.show_pages(session, self.lines())
+        screens = [text for text in session.output if text.startswith("line")]
+        self.assertEqual(len(screens), 3)
+        self.assertEqual(screens[2], "line 17\nline 18\nline 19\nline 20\n")
+        self.assertEqual(session.answers_left, 0)
+
+    def test_jump_summary_and_stop(self):
+        """Test jumping to a game, asking for the summary and stopping"""
+        session = ScriptedSession(["99", "15", "s"], keep_output=True, page_rows=5)
+        pager.show_pages(session, self.lines(), jump=lambda number: self.lines(number) if number <= 20 else None,
+                         summary=lambda: iter(["summary\n"]))
+        text = session.text()
+        self.assertIn("There's no game 99.", text)
+        self.assertIn("line 15\nline 16\nline 17\nline 18\nline 19\n", text)
+        self.assertTrue(text.endswith("summary\n"))
+
+        session = ScriptedSession(["q"], page_rows=5)
+        lines = self.lines()
+        pager.show_pages(session, lines)
+        self.assertEqual(list(lines), [])
+
+
+class TestPagedReports(unittest.TestCase):
+    """Test cases for paging results and saved reports"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        main.set_session(None)
+        main.set_store(None)
+        self.temp_dir.cleanup()
+
+    def test_results_jump_to_a_game(self):
+        """Test the results can start again from a later game"""
+        session = ScriptedSession(["95"], keep_output=True, page_rows=14)
+        main.set_session(session)
+        scores = list(range(100))
+        main.show_results("P1", scores, [1.5] * 100, 99, 1.5)
+        text = session.text()
+        self.assertIn("  Game 2: 1 points, 1.5 minutes\n", text)
+        self.assertNotIn("Game 50:", text)
+        self.assertIn("  Game 95: 94 points, 1.5 minutes\n", text)
+        self.assertIn("Total Time Played: 150.0 minutes\n", text)
+
+    def test_saved_report_in_every_store(self):
+        """Test a saved report can be paged, jumped through and cut to the summary in each store"""
+        for store_type in storage.STORE_TYPES:
+            with self.subTest(store_type=store_type), tempfile.TemporaryDirectory() as folder:
+                main.set_store(storage.open_store(store_type, folder))
+                main.save_to_file("P1", list(range(50)), [2.0] * 50, 49, 2.0, quiet=True)
+                session = ScriptedSession(["P1", "40", "s", ""], keep_output=True, page_rows=14)
+                main.set_session(session)
+                main.show_saved_stats()
+                text = session.text()
+                self.assertIn("Game 40: Score = 39, Time = 2.0 minutes\n", text)
+                self.assertNotIn("Game 30:", text)
+                self.assertTrue(text.endswith("Total Time Played: 100.0 minutes\n\n"
+                                              "\nPress Enter to go back to the main menu...\n"))
+
+    @patch('builtins.print')
+    def test_stats_command_from_a_game(self, mock_print):
+        """Test the stats command can start from a game and rejects one that isn't there"""
+        main.set_store(storage.open_store("files", self.temp_dir.name))
+        main.save_to_file("P1", [10, 20, 30], [1.0, 2.0, 3.0], 30, 2.0, quiet=True)
+        self.assertEqual(main.run_command(["stats", "p1", "--game", "2"]), 0)
+        text = "".join(call.args[0] for call in mock_print.call_args_list)
+        self.assertTrue(text.startswith("Game 2: Score = 20, Time = 2.0 minutes\n"))
+        self.assertEqual(main.run_command(["stats", "p1", "--game", "4"]), 1)
+        mock_print.assert_any_call("P1 doesn't have a game 4")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,119 @@
+"""
+Unit tests for rendering every player's report
+"""
+
+import unittest
+import os
+import tempfile
+import threading
+from unittest.mock import patch
+import locks
+import main
+import render
+import storage
+
+
+class TestRenderAll(unittest.TestCase):
+    """Test cases for the serial and parallel report writers"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store_folder = os.path.join(self.temp_dir.name, "store")
+        os.mkdir(self.store_folder)
+
+    def tearDown(self):
+        main.set_store(None)
+        self.temp_dir.cleanup()
+
+    def fill_store(self, store_type):
+        main.set_store(storage.open_store(store_type, self.store_folder))
+        for number in range(25):
+            scores = [number * 1000 + game for game in range(number % 7 + 1)]
+            times = [round(1.5 + game * 0.25 + number, 2) for game in range(number % 7 + 1)]
+            main.save_to_file(f"P{number}", scores, times, main.find_highest_score(scores),
+                              main.calculate_average_time(times), quiet=True)
+        return main.get_store()
+
+    def read_folder(self, folder):
+        contents = {}
+        for name in os.listdir(folder):
+            if name == locks.LOCK_FOLDER:
+                continue
+            with open(os.path.join(folder, name), 'rb') as file:
+                contents[name] = file.read()
+        return contents
+
+    def check_parallel_matches_serial(self, store_type):
+        store = self.fill_store(store_type)
+        serial = os.path.join(self.temp_dir.name, "serial")
+        parallel = os.path.join(self.temp_dir.name, "parallel")
+
+        render.render_all(store, serial, workers=1, chunk_size=4)
+        results = render.render_all(store, parallel, workers=3, chunk_size=4)
+
+        self.assertEqual(len(results), 7)
+        self.assertEqual(sum(result[1] for result in results), 25)
+        self.assertEqual(self.read_folder(serial), self.read_folder(parallel))
+        return serial
+
+    def test_parallel_matches_serial(self):
+        """Test worker processes write exactly the same files as one process"""
+        serial = self.check_parallel_matches_serial("files")
+        saved = self.read_folder(self.store_folder)
+        self.assertEqual(self.read_folder(serial), saved)
+
+    def test_parallel_from_sqlite(self):
+        """Test workers can each open the SQLite store"""
+        self.check_parallel_matches_serial("sqlite")
+
+    def test_bad_worker_count(self):
+        """Test a worker count below 1 is refused"""
+        store = self.fill_store("files")
+        with self.assertRaises(ValueError):
+            render.render_all(store, self.temp_dir.name, workers=0)
+
+    @patch('builtins.print')
+    def test_render_all_command(self, mock_print):
+        """Test the render-all command shows each worker's speed"""
+        self.fill_store("files")
+        output = os.path.join(self.temp_dir.name, "out")
+
+        result = main.run_command(["render-all", "--output", output, "--workers", "2",
+                                   "--chunk-size", "10"])
+
+        self.assertEqual(result, 0)
+        self.assertEqual(len(os.listdir(output)), 25)
+        printed = [call.args[0] for call in mock_print.call_args_list if call.args]
+        self.assertTrue(any(line.startswith("Worker 1:") for line in printed))
+        self.assertTrue(any(line.startswith("Wrote 25 reports") for line in printed))
+
+    @patch('builtins.print')
+    def test_default_folder_is_not_the_store(self, mock_print):
+        """Test reports go into their own folder and never over the store's files"""
+        self.fill_store("files")
+        old_dir = os.getcwd()
+        os.chdir(self.store_folder)
+        try:
+            self.assertEqual(main.run_command(["render-all", "--workers", "1"]), 0)
+            self.assertEqual(len(os.listdir("reports")), 25)
+            self.assertEqual(main.run_command(["render-all", "--output", "."]), 1)
+        finally:
+            os.chdir(old_dir)
+        mock_print.assert_any_call("That's the store's own folder, pick another one with --output")
+
+    def test_waits_for_a_save_in_progress(self):
+        """Test a player being saved isn't read until the save has finished"""
+        store = self.fill_store("files")
+        output = os.path.join(self.temp_dir.name, "out")
+        os.makedirs(output)
+        with locks.player_lock(store.folder, "P3"):
+            thread = threading.Thread(target=render.render_player, args=(store, "P3", output))
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+        thread.join()
+        self.assertEqual(os.listdir(output), ["player_P3.txt"])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,137 @@
+"""
+Unit tests for the day, week, month and season totals
+"""
+
+import unittest
+import datetime
+import os
+import tempfile
+from unittest.mock import patch
+import main
+import rollups
+import storage
+
+
+def local_time(*args):
+    return datetime.datetime(*args).timestamp()
+
+
+class TestBucketKeys(unittest.TestCase):
+    """Test cases for working out which buckets a game goes in"""
+
+    def test_keys(self):
+        """Test a normal day in October"""
+        self.assertEqual(rollups.bucket_keys(local_time(2026, 10, 18, 15, 30)),
+                         {"day": "2026-10-18", "week": "2026-W42", "month": "2026-10", "season": "2026-27"})
+
+    def test_season_starts_in_september(self):
+        """Test August is the end of one season and September starts the next"""
+        self.assertEqual(rollups.bucket_keys(local_time(2027, 8, 31))["season"], "2026-27")
+        self.assertEqual(rollups.bucket_keys(local_time(2027, 9, 1))["season"], "2027-28")
+
+    def test_week_across_new_year(self):
+        """Test 1 January 2027 is in the last week of 2026"""
+        self.assertEqual(rollups.bucket_keys(local_time(2027, 1, 1))["week"], "2026-W53")
+
+
+class TestRollups(unittest.TestCase):
+    """Test cases for adding games to the totals and asking for them"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.rollups = rollups.Rollups(os.path.join(self.temp_dir.name, "rollups.db"))
+
+    def tearDown(self):
+        self.rollups.close()
+        main.set_store(None)
+        self.temp_dir.cleanup()
+
+    def test_player_and_club_totals(self):
+        """Test games count towards the player and the whole club"""
+        monday = local_time(2026, 10, 12, 10)
+        self.rollups.add_games("P1", [100, 300], [10.0, 20.0], monday)
+        self.rollups.add_games("P2", [500], [5.0], monday + 3600)
+        self.rollups.add_games("P1", [200], [30.0], monday + 2 * 86400)
+
+        player = self.rollups.totals("week", "P1", monday)
+        self.assertEqual((player.games, player.highest_score, player.total_time), (3, 300, 60.0))
+        self.assertEqual(player.average_time, 20.0)
+        club = self.rollups.totals("week", when=monday)
+        self.assertEqual((club.games, club.highest_score, club.total_time), (4, 500, 65.0))
+        self.assertEqual(self.rollups.totals("day", "P1", monday).games, 2)
+
+    def test_many_players_at_once(self):
+        """Test add_many gives the same totals as adding each player on their own"""
+        monday = local_time(2026, 10, 12, 10)
+        self.rollups.add_many({"P1": ([100, 300], [10.0, 20.0]), "P2": ([500], [5.0]), "P3": ([], [])}, monday)
+        player = self.rollups.totals("week", "P1", monday)
+        self.assertEqual((player.games, player.highest_score, player.total_time), (2, 300, 30.0))
+        club = self.rollups.totals("week", when=monday)
+        self.assertEqual((club.games, club.highest_score, club.total_time), (3, 500, 35.0))
+        self.assertEqual(self.rollups.totals("week", "P3", monday).games, 0)
+
+    def test_other_weeks_are_separate(self):
+        """Test last week's games don't show up in this week's totals"""
+        this_week = local_time(2026, 10, 14)
+        self.rollups.add_games("P1", [900], [9.0], this_week - 7 * 86400)
+        self.rollups.add_games("P1", [100], [1.0], this_week)
+
+        self.assertEqual(self.rollups.totals("week", "P1", this_week).highest_score, 100)
+        self.assertEqual(self.rollups.totals("month", "P1", this_week).highest_score, 900)
+        self.assertEqual([bucket for bucket, _ in self.rollups.history("week", "P1")],
+                         ["2026-W41", "2026-W42"])
+
+    def test_nothing_recorded(self):
+        """Test an empty bucket gives an empty summary"""
+        totals = self.rollups.totals("season", "NOBODY")
+        self.assertEqual((totals.games, totals.average_time), (0, 0.0))
+        with self.assertRaises(ValueError):
+            self.rollups.totals("year")
+
+    def test_games_are_stamped(self):
+        """Test every game gets its own stamp"""
+        self.rollups.add_games("P1", [1, 2, 3], [1.0, 2.0, 3.0], 1700000000.0)
+        stamps = self.rollups.connection.execute(
+            "SELECT player_id, recorded_at, score FROM game_stamps ORDER BY score").fetchall()
+        self.assertEqual(stamps, [("P1", 1700000000.0, 1), ("P1", 1700000000.0, 2), ("P1", 1700000000.0, 3)])
+
+    @patch('builtins.print')
+    def test_recording_updates_the_rollups(self, mock_print):
+        """Test recording and adding games both go into this week's totals"""
+        main.set_store(storage.open_store("files", self.temp_dir.name))
+        with patch('builtins.input', side_effect=["P1", "2", "1500", "25.5", "1800", "30.0", ""]):
+            main.record_scores()
+        main.save_new_games("P1", [2000], [10.0])
+        # Saving without new games (e.g. fixing a report) leaves the totals alone
+        main.save_to_file("P1", [1], [1.0], 1, 1.0, quiet=True)
+
+        totals = main.get_rollups().totals("week", "P1")
+        self.assertEqual((totals.games, totals.highest_score, totals.total_time), (3, 2000, 65.5))
+
+        self.assertEqual(main.run_command(["rollup", "p1", "--period", "season"]), 0)
+        mock_print.assert_any_call("This season for P1: 3 games, highest score 2,000, "
+                                   "average time 21.83 minutes, total 65.5 minutes")
+
+
+    @patch('builtins.print')
+    def test_saving_again_is_not_counted_twice(self, mock_print):
+        """Test importing or recording the same games again leaves the totals alone"""
+        main.set_store(storage.open_store("files", self.temp_dir.name))
+        path = os.path.join(self.temp_dir.name, "games.csv")
+        with open(path, "w") as file:
+            file.write("player_id,score,time\nP1,100,10.0\nP2,50,5.0\nP1,300,20.0\nP1,100,10.0\n")
+        main.run_command(["ingest", path])
+        main.run_command(["ingest", path])
+        self.assertEqual(main.get_rollups().totals("week", "P1").games, 3)
+        self.assertEqual(main.get_rollups().totals("week").games, 4)
+
+        # Recording P1 again with one more game only adds that one
+        with patch('builtins.input', side_effect=["P1", "4", "100", "10.0", "300", "20.0",
+                                                  "100", "10.0", "700", "1.0", ""]):
+            main.record_scores()
+        totals = main.get_rollups().totals("week", "P1")
+        self.assertEqual((totals.games, totals.highest_score, totals.total_time), (4, 700, 41.0))
+        self.assertEqual(list(main.get_store().load_games("P1")[0]), [100, 300, 100, 700])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
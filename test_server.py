@@ -0,0 +1,102 @@
+"""
+Unit tests for the stats web service
+"""
+
+import unittest
+import asyncio
+import tempfile
+import load_test
+import main
+import server
+import storage
+
+
+class TestParsing(unittest.TestCase):
+    """Test cases for reading requests"""
+
+    def test_parse_games_uses_menu_messages(self):
+        """Test bad games get the same messages as the menu"""
+        with self.assertRaises(server.RequestError) as caught:
+            server.parse_games(b'{"score": -5, "time": 3}')
+        self.assertEqual(str(caught.exception), "Scores can't be negative! Try again.")
+        self.assertEqual(caught.exception.status, 400)
+
+    def test_parse_one_or_many_games(self):
+        """Test a single game or a list of games can be sent"""
+        self.assertEqual(server.parse_games(b'{"score": 5, "time": 3}'), ([5], [3.0]))
+        body = b'{"games": [{"score": 5, "time": 3}, {"score": 7, "time": 1.5}]}'
+        self.assertEqual(server.parse_games(body), ([5, 7], [3.0, 1.5]))
+
+    def test_route(self):
+        """Test paths are matched to a player and action"""
+        self.assertEqual(server.route("/players/alice/stats"), ("ALICE", "stats"))
+        self.assertEqual(server.route("/players/john%20smith/games"), ("JOHN SMITH", "games"))
+        self.assertEqual(server.route("/players/a%2Fb/stats"), ("A/B", "stats"))
+        with self.assertRaises(server.RequestError):
+            server.route("/teams/alice")
+
+
+class TestService(unittest.IsolatedAsyncioTestCase):
+    """Test cases for the running service"""
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        main.set_store(storage.open_store("files", self.temp_dir.name))
+        self.service = server.StatsServer(workers=4)
+        self.host, self.port = await self.service.start("127.0.0.1", 0)
+
+    async def asyncTearDown(self):
+        await self.service.stop()
+        main.set_store(None)
+        self.temp_dir.cleanup()
+
+    async def send(self, method, path, data=None):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            return await load_test._request(reader, writer, method, path, data)
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    async def test_record_then_read_stats(self):
+        """Test games posted to the service are saved and their stats read back"""
+        status, stats = await self.send("POST", "/players/alice/games",
+                                        {"games": [{"score": 1200, "time": 25.0},
+                                                   {"score": 1500, "time": 20.5}]})
+        self.assertEqual(status, 201)
+        self.assertEqual(stats["highest_score"], 1500)
+
+        status, stats = await self.send("GET", "/players/ALICE/stats")
+        self.assertEqual(status, 200)
+        self.assertEqual(stats, {"player_id": "ALICE", "games": 2, "highest_score": 1500,
+                                 "average_time": 22.75, "total_time": 45.5})
+        self.assertIn("Number of Games: 2\n", main.get_store().load_report("ALICE"))
+
+    async def test_errors(self):
+        """Test unknown players and bad games get error answers"""
+        status, data = await self.send("GET", "/players/NOBODY/stats")
+        self.assertEqual(status, 404)
+        status, data = await self.send("POST", "/players/bob/games", {"score": 5, "time": 0})
+        self.assertEqual(status, 400)
+        self.assertEqual(data["error"], "Time must be more than 0 minutes!")
+
+    async def test_many_connections_lose_no_games(self):
+        """Test lots of connections adding games to the same players at once"""
+        results = await load_test.run_load_test(self.host, self.port, connections=60,
+                                                requests=3, players=5)
+        self.assertEqual(results["errors"], 0)
+        self.assertEqual(await load_test.check_games(self.host, self.port, results["games"]), {})
+        self.assertEqual(sum(results["games"].values()), 180)
+        # Each player's lock is thrown away once their saves are done
+        self.assertEqual(self.service.player_locks, {})
+
+    async def test_id_with_space(self):
+        """Test a percent-encoded player ID with a space in it can be saved and read"""
+        status, _ = await self.send("POST", "/players/john%20smith/games", {"score": 5, "time": 3})
+        self.assertEqual(status, 201)
+        status, stats = await self.send("GET", "/players/JOHN%20SMITH/stats")
+        self.assertEqual((status, stats["player_id"], stats["games"]), (200, "JOHN SMITH", 1))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
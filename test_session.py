@@ -0,0 +1,77 @@
+"""
+Unit tests for scripted sessions and the session replay
+"""
+
+import unittest
+import tempfile
+import main
+import replay
+import storage
+from session import ScriptedSession, SessionOver
+
+
+class TestScriptedSession(unittest.TestCase):
+    """Test cases for playing the menu back from a script"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        main.set_store(storage.TextFileStore(self.temp_dir.name))
+
+    def tearDown(self):
+        main.set_session(None)
+        main.set_store(None)
+        self.temp_dir.cleanup()
+
+    def test_records_a_player(self):
+        """Test a scripted session records scores through the menu and exits"""
+        session = ScriptedSession(["1", "player1", "abc", "2", "1500", "25.5", "-100", "900", "20",
+                                   "", "2", "PLAYER1", "", "3"], keep_output=True)
+        main.set_session(session)
+        main.main()
+
+        scores, times = main.get_store().load_games("PLAYER1")
+        self.assertEqual(list(scores), [1500, 900])
+        self.assertEqual(list(times), [25.5, 20.0])
+        self.assertEqual(session.answers_left, 0)
+        self.assertIn("Please enter a number, not letters!\n", session.output)
+        self.assertIn("Scores can't be negative! Try again.\n", session.output)
+        self.assertIn("Goodbye!", session.text())
+
+    def test_running_out_of_answers(self):
+        """Test a session that never exits stops with SessionOver"""
+        main.set_session(ScriptedSession(["2"]))
+        with self.assertRaises(SessionOver):
+            main.main()
+
+
+class TestReplay(unittest.TestCase):
+    """Test cases for the made up sessions and playing them back"""
+
+    def test_session_mix(self):
+        """Test sessions come out in the test table's proportions"""
+        sessions = replay.make_sessions(2000, seed=3)
+        kinds = [kind for kind, _, _ in sessions]
+        self.assertAlmostEqual(kinds.count("valid") / 2000, 0.5, delta=0.05)
+        self.assertAlmostEqual(kinds.count("invalid") / 2000, 0.35, delta=0.05)
+        self.assertAlmostEqual(kinds.count("extreme") / 2000, 0.15, delta=0.05)
+        for kind, answers, _ in sessions:
+            self.assertEqual(answers[-1], "3")
+
+    def test_replay_in_one_process(self):
+        """Test every session finishes and saves every game"""
+        results = replay.run_replay(replay.make_sessions(60, seed=1, players=5), processes=1)
+        self.assertEqual(len(results["latencies"]), 60)
+        self.assertEqual((results["errors"], results["unfinished"]), (0, 0))
+        self.assertEqual(results["saved_games"], results["expected_games"])
+
+    def test_replay_across_processes(self):
+        """Test sessions played in two processes at once don't lose games"""
+        results = replay.run_replay(replay.make_sessions(120, seed=2, players=5), processes=2,
+                                    store_type="sqlite")
+        self.assertEqual(len(results["latencies"]), 120)
+        self.assertEqual((results["errors"], results["unfinished"]), (0, 0))
+        self.assertEqual(results["saved_games"], results["expected_games"])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
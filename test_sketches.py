@@ -0,0 +1,175 @@
+"""
+Unit tests for the streaming sketches
+The error bounds checked here are the ones given in sketches.py
+"""
+
+import unittest
+import bisect
+import os
+import random
+import tempfile
+from unittest.mock import patch
+import main
+import sketches
+
+QUANTILES = [0.001, 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99, 0.999]
+
+
+def rank_error(sorted_values, estimate, quantile):
+    """How far the estimate's real rank is from the rank asked for"""
+    low = bisect.bisect_left(sorted_values, estimate) / len(sorted_values)
+    high = bisect.bisect_right(sorted_values, estimate) / len(sorted_values)
+    if low <= quantile <= high:
+        return 0.0
+    return min(abs(low - quantile), abs(high - quantile))
+
+
+class TestTDigest(unittest.TestCase):
+    """Test cases for the quantile sketch"""
+
+    def check_within_bound(self, digest, values):
+        exact = sorted(values)
+        for quantile in QUANTILES:
+            self.assertLessEqual(rank_error(exact, digest.quantile(quantile), quantile), 0.01,
+                                 f"quantile {quantile}")
+
+    def test_scores_and_times(self):
+        """Test whole number scores and skewed times are both within 1% rank"""
+        rng = random.Random(5)
+        scores = [rng.randint(0, 1000000) for _ in range(50000)]
+        times = [rng.expovariate(1 / 30) for _ in range(50000)]
+        for values in (scores, times):
+            digest = sketches.TDigest()
+            digest.add_all(values)
+            self.check_within_bound(digest, values)
+            self.assertLess(len(digest.means), 200)
+
+    def test_merged_runs(self):
+        """Test digests from separate runs merge into one within the same bound"""
+        rng = random.Random(6)
+        values = [rng.gauss(500, 100) for _ in range(60000)]
+        merged = sketches.TDigest()
+        for start in range(0, len(values), 20000):
+            part = sketches.TDigest()
+            part.add_all(values[start:start + 20000])
+            merged.merge(part)
+        self.assertEqual(merged.count, 60000)
+        self.check_within_bound(merged, values)
+
+    def test_ends_and_small_digests(self):
+        """Test the smallest and largest values and tiny inputs"""
+        digest = sketches.TDigest()
+        self.assertIsNone(digest.quantile(0.5))
+        digest.add(7)
+        self.assertEqual(digest.quantile(0.5), 7)
+        digest.add_all([1, 2, 3])
+        self.assertEqual(digest.quantile(0), 1)
+        self.assertEqual(digest.quantile(1), 7)
+        with self.assertRaises(ValueError):
+            digest.quantile(1.5)
+
+    def test_save_and_load(self):
+        """Test a digest read back from JSON gives the same answers"""
+        digest = sketches.TDigest()
+        digest.add_all(range(1000))
+        copy = sketches.TDigest.from_dict(digest.to_dict())
+        for quantile in QUANTILES:
+            self.assertEqual(copy.quantile(quantile), digest.quantile(quantile))
+
+
+class TestHyperLogLog(unittest.TestCase):
+    """Test cases for the distinct player sketch"""
+
+    def test_counts_within_three_standard_errors(self):
+        """Test counts from tiny to large are within 3 standard errors"""
+        for count in (1, 50, 5000, 100000):
+            sketch = sketches.HyperLogLog()
+            for number in range(count):
+                sketch.add(f"PLAYER{number}")
+                sketch.add(f"PLAYER{number}")  # seeing a player twice changes nothing
+            self.assertLessEqual(abs(sketch.count() - count), 3 * sketch.standard_error * count + 1)
+
+    def test_merge_is_the_union(self):
+        """Test merging two overlapping sketches counts each player once"""
+        first = sketches.HyperLogLog()
+        second = sketches.HyperLogLog()
+        for number in range(30000):
+            first.add(f"P{number}")
+        for number in range(20000, 50000):
+            second.add(f"P{number}")
+        first.merge(second)
+        self.assertLessEqual(abs(first.count() - 50000), 3 * first.standard_error * 50000)
+        with self.assertRaises(ValueError):
+            first.merge(sketches.HyperLogLog(10))
+
+    def test_save_and_load(self):
+        """Test a sketch read back from JSON gives the same count"""
+        sketch = sketches.HyperLogLog()
+        for number in range(1000):
+            sketch.add(number)
+        self.assertEqual(sketches.HyperLogLog.from_dict(sketch.to_dict()).count(), sketch.count())
+
+
+class TestClubSketches(unittest.TestCase):
+    """Test cases for the sketches kept while importing"""
+
+    def setUp(self):
+        self.old_dir = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+
+    def tearDown(self):
+        main.set_store(None)
+        os.chdir(self.old_dir)
+        self.temp_dir.cleanup()
+
+    def write_csv(self, name, players, first_player=0):
+        with open(name, "w") as file:
+            file.write("player_id,score,time\n")
+            for number in range(first_player, first_player + players):
+                file.write(f"p{number},{number * 10},{number % 60 + 0.5}\n")
+
+    @patch('builtins.print')
+    def test_separate_imports_add_up(self, mock_print):
+        """Test two imports merge into the club's sketches and can be merged again"""
+        self.write_csv("first.csv", 100)
+        self.write_csv("second.csv", 100, first_player=100)
+        main.run_command(["ingest", "first.csv"])
+        main.run_command(["ingest", "second.csv", "--sketch", "second.json"])
+
+        club = sketches.load_sketches("sketches.json")
+        self.assertEqual(club.games, 200)
+        self.assertEqual(club.players.count(), 200)
+        self.assertAlmostEqual(club.scores.quantile(0.5), 1000, delta=20)
+        self.assertEqual(sketches.load_sketches("second.json").games, 100)
+
+        # Merging a run's sketches in again counts its games again
+        self.assertEqual(main.run_command(["sketches", "--merge", "second.json"]), 0)
+        self.assertEqual(sketches.load_sketches("sketches.json").games, 300)
+        mock_print.assert_any_call("Games: 300")
+        mock_print.assert_any_call("Different players: about 200 (give or take 0.8%)")
+
+    @patch('builtins.print')
+    def test_importing_again_adds_only_new_games(self, mock_print):
+        """Test importing the same players again only sketches the games that are new"""
+        self.write_csv("first.csv", 100)
+        main.run_command(["ingest", "first.csv"])
+        main.run_command(["ingest", "first.csv"])
+        club = sketches.load_sketches("sketches.json")
+        self.assertEqual(club.games, 100)
+        self.assertEqual(club.players.count(), 100)
+
+        self.write_csv("more.csv", 120)
+        main.run_command(["ingest", "more.csv", "--sketch", "more.json"])
+        self.assertEqual(sketches.load_sketches("more.json").games, 20)
+        self.assertEqual(sketches.load_sketches("sketches.json").games, 120)
+
+    @patch('builtins.print')
+    def test_no_sketches_yet(self, mock_print):
+        """Test showing sketches before anything has been imported"""
+        self.assertEqual(main.run_command(["sketches"]), 0)
+        mock_print.assert_any_call("No games have been imported yet.")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
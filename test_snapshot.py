@@ -0,0 +1,141 @@
+"""
+Unit tests for merging snapshots from several branches
+"""
+
+import unittest
+import os
+import random
+import tempfile
+from unittest.mock import patch
+import main
+import snapshot
+import storage
+
+
+def make_site(rng, players, games_per_player):
+    """Makes {player_id: (scores, times)} for one branch"""
+    site = {}
+    for player_id in players:
+        count = rng.randint(1, games_per_player)
+        site[player_id] = ([rng.randint(0, 1000000) for _ in range(count)],
+                           [round(rng.uniform(0.01, 1440), rng.randint(0, 3)) for _ in range(count)])
+    return site
+
+
+class TestExactSum(unittest.TestCase):
+    """Test cases for adding floats without rounding"""
+
+    def test_order_makes_no_difference(self):
+        """Test adding in a different order gives exactly the same total"""
+        values = [0.1, 0.2, 0.3, 1e-10, 1440.0, 33.33]
+        forwards = snapshot.ExactSum()
+        forwards.add_all(values)
+        backwards = snapshot.ExactSum()
+        backwards.add_all(reversed(values))
+        self.assertEqual(forwards.to_list(), backwards.to_list())
+        self.assertEqual(snapshot.ExactSum.from_list(forwards.to_list()), forwards)
+        self.assertEqual(snapshot.ExactSum().to_list(), [0, 0])
+
+
+class TestMerging(unittest.TestCase):
+    """Test cases for merging snapshots"""
+
+    def setUp(self):
+        rng = random.Random(7)
+        everyone = [f"P{number}" for number in range(60)]
+        # Each branch has some of the players, and some players go to several
+        self.sites = {name: make_site(rng, rng.sample(everyone, 25), 30)
+                      for name in ["north", "south", "east", "west"]}
+        self.snapshots = {}
+        for name, site in self.sites.items():
+            site_snapshot = snapshot.Snapshot([name])
+            for player_id, (scores, times) in site.items():
+                site_snapshot.players[player_id] = snapshot.PlayerTotals.from_games(scores, times)
+                site_snapshot.sketches.add_games(player_id, scores, times)
+            self.snapshots[name] = site_snapshot
+
+    def all_games(self, player_id):
+        scores = []
+        times = []
+        for site in self.sites.values():
+            if player_id in site:
+                scores.extend(site[player_id][0])
+                times.extend(site[player_id][1])
+        return scores, times
+
+    def test_same_as_the_raw_games(self):
+        """Test merged stats match working them out from every game at once"""
+        merged = snapshot.merge_snapshots(self.snapshots.values())
+        self.assertEqual(merged.sites, ["east", "north", "south", "west"])
+        for player_id, totals in merged.players.items():
+            scores, times = self.all_games(player_id)
+            self.assertEqual(totals.games, len(scores))
+            self.assertEqual(totals.highest_score, main.find_highest_score(scores))
+            self.assertEqual(totals.average_time, main.calculate_average_time(times))
+
+    def test_any_order_or_tree_gives_the_same(self):
+        """Test merging in a different order, or pairs then the pairs, changes nothing"""
+        north, south, east, west = (self.snapshots[name] for name in ["north", "south", "east", "west"])
+        in_a_row = snapshot.merge_snapshots([north, south, east, west])
+        backwards = snapshot.merge_snapshots([west, east, south, north])
+        tree = snapshot.merge_snapshots([snapshot.merge_snapshots([east, north]),
+                                         snapshot.merge_snapshots([west, south])])
+        for other in (backwards, tree):
+            self.assertEqual({player_id: totals.to_list() for player_id, totals in other.players.items()},
+                             {player_id: totals.to_list() for player_id, totals in in_a_row.players.items()})
+            self.assertEqual(other.sketches.games, in_a_row.sketches.games)
+            self.assertEqual(other.sketches.players.count(), in_a_row.sketches.players.count())
+
+    def test_branch_counted_once(self):
+        """Test merging a branch into a snapshot that already has it is refused"""
+        merged = snapshot.merge_snapshots([self.snapshots["north"], self.snapshots["south"]])
+        with self.assertRaises(ValueError):
+            merged.merge(self.snapshots["north"])
+
+    def test_save_and_load(self):
+        """Test a snapshot read back from JSON has exactly the same totals"""
+        north = self.snapshots["north"]
+        copy = snapshot.Snapshot.from_text(north.to_text())
+        self.assertEqual(copy.sites, ["north"])
+        self.assertEqual({player_id: totals.to_list() for player_id, totals in copy.players.items()},
+                         {player_id: totals.to_list() for player_id, totals in north.players.items()})
+
+
+class TestSnapshotCommands(unittest.TestCase):
+    """Test cases for the snapshot and merge-snapshots commands"""
+
+    def setUp(self):
+        self.old_dir = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        for site in ("north", "south"):
+            os.mkdir(site)
+
+    def tearDown(self):
+        main.set_store(None)
+        os.chdir(self.old_dir)
+        self.temp_dir.cleanup()
+
+    @patch('builtins.print')
+    def test_two_branches(self, mock_print):
+        """Test snapshots of two branches' files merge into the club's totals"""
+        for site, scores, times in [("north", [100, 900], [10.0, 20.0]), ("south", [500], [30.5])]:
+            main.set_store(storage.open_store("files", site))
+            main.save_to_file("P1", scores, times, main.find_highest_score(scores),
+                              main.calculate_average_time(times), quiet=True)
+            self.assertEqual(main.run_command(["snapshot", site]), 0)
+        main.set_store(None)
+
+        result = main.run_command(["merge-snapshots", "snapshot_north.json", "snapshot_south.json",
+                                   "--output", "club.json", "--player", "p1"])
+        self.assertEqual(result, 0)
+        mock_print.assert_any_call("Games: 3")
+        mock_print.assert_any_call("P1: 3 games, highest score 900, average time 20.17 minutes")
+        self.assertEqual(snapshot.load_snapshot("club.json").sites, ["north", "south"])
+
+        # The merged snapshot already has north, so it can't be merged with it again
+        self.assertEqual(main.run_command(["merge-snapshots", "club.json", "snapshot_north.json"]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
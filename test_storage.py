@@ -0,0 +1,466 @@
+"""
+Unit tests for the report formatting and storage backends
+"""
+
+import unittest
+import os
+import tempfile
+import threading
+from array import array
+from unittest.mock import patch
+import main
+import report
+import storage
+from summary import RunningSummary
+
+
+class TestReport(unittest.TestCase):
+    """Test cases for building the report text"""
+
+    def test_report_matches_saved_example(self):
+        """Test the report is exactly the same as the example file"""
+        here = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(here, "player_TESTONE.txt")) as file:
+            expected = file.read()
+
+        text = report.build_report("TESTONE", [134, 156], [5.0, 3.0], 156, 4.0)
+        self.assertEqual(text, expected)
+
+
+class TestReadingReports(unittest.TestCase):
+    """Test cases for reading the numbers back out of saved reports"""
+
+    def setUp(self):
+        report.clear_report_cache()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = storage.TextFileStore(self.temp_dir.name)
+
+    def tearDown(self):
+        report.clear_report_cache()
+        self.temp_dir.cleanup()
+
+    def test_parse_raw_data_gives_typed_arrays(self):
+        """Test the RAW DATA lines come back as int and float arrays"""
+        text = report.build_report("P1", [1200, 1500], [25.0, 20.5], 1500, 22.75)
+        scores, times = report.parse_raw_data(text)
+        self.assertEqual(scores, array('i', [1200, 1500]))
+        self.assertEqual(times, array('d', [25.0, 20.5]))
+
+    def test_repeat_reads_use_the_cache(self):
+        """Test a report that hasn't changed is only read from disk once"""
+        self.store.save_player("P1", [10, 20], [1.0, 2.0], 20, 1.5)
+        self.store.load_games("P1")
+
+        with patch('builtins.open', side_effect=AssertionError("read the disk again")):
+            scores, times = self.store.load_games("P1")
+        self.assertEqual(scores, array('i', [10, 20]))
+
+    def test_saving_again_is_seen(self):
+        """Test a report saved again is read again instead of coming from the cache"""
+        self.store.save_player("P1", [10, 20], [1.0, 2.0], 20, 1.5)
+        self.store.load_games("P1")
+        self.store.save_player("P1", [30, 40], [1.0, 2.0], 40, 1.5)
+        self.assertEqual(self.store.load_games("P1")[0], array('i', [30, 40]))
+
+    def test_changing_result_leaves_cache_alone(self):
+        """Test changing the arrays handed out doesn't change the cached copy"""
+        self.store.save_player("P1", [10], [1.0], 10, 1.0)
+        scores, _ = self.store.load_games("P1")
+        scores.append(99)
+        self.assertEqual(self.store.load_games("P1")[0], array('i', [10]))
+
+
+class TestTextFileStore(unittest.TestCase):
+    """Test cases for the one-file-per-player store"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = storage.TextFileStore(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_save_and_load(self):
+        """Test a saved report can be read back"""
+        self.store.save_player("P1", [10, 20], [1.0, 2.0], 20, 1.5)
+        text = self.store.load_report("P1")
+        self.assertIn("Highest Score: 20\n", text)
+        self.assertEqual(self.store.player_ids(), ["P1"])
+
+    def test_missing_player(self):
+        """Test loading an unknown player raises FileNotFoundError"""
+        with self.assertRaises(FileNotFoundError):
+            self.store.load_report("NOBODY")
+
+    def test_sync_flushes_folder_once_per_batch(self):
+        """Test a syncing store flushes the folder after each save, or once per batch"""
+        store = storage.TextFileStore(self.temp_dir.name, sync=True)
+        with patch('storage.fsync_path') as mock_fsync:
+            store.save_player("P1", [10], [1.0], 10, 1.0)
+            self.assertEqual(mock_fsync.call_count, 1)
+
+            with store.batch():
+                for number in range(5):
+                    store.save_player(f"B{number}", [10], [1.0], 10, 1.0)
+                self.assertEqual(mock_fsync.call_count, 1)
+            self.assertEqual(mock_fsync.call_count, 2)
+        self.assertEqual(len(store.player_ids()), 6)
+
+    def test_batch_only_covers_its_own_thread(self):
+        """Test a save from another thread is flushed straight away during a batch"""
+        store = storage.TextFileStore(self.temp_dir.name, sync=True)
+        with patch('storage.fsync_path') as mock_fsync:
+            with store.batch():
+                thread = threading.Thread(target=store.save_player, args=("P2", [10], [1.0], 10, 1.0))
+                thread.start()
+                thread.join()
+                self.assertEqual(mock_fsync.call_count, 1)
+            self.assertEqual(mock_fsync.call_count, 1)
+
+
+class TestIndexedStore(unittest.TestCase):
+    """Test cases for the single-file indexed store"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = storage.open_store("indexed", self.temp_dir.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.temp_dir.cleanup()
+
+    def test_latest_report_wins(self):
+        """Test saving a player again replaces their report"""
+        self.store.save_player("P1", [10], [1.0], 10, 1.0)
+        self.store.save_player("P2", [5], [2.0], 5, 2.0)
+        self.store.save_player("P1", [99], [3.0], 99, 3.0)
+
+        self.assertIn("Highest Score: 99\n", self.store.load_report("P1"))
+        self.assertIn("Highest Score: 5\n", self.store.load_report("P2"))
+        self.assertEqual(sorted(self.store.player_ids()), ["P1", "P2"])
+
+    def test_same_text_as_file_store(self):
+        """Test both stores hold exactly the same report text"""
+        self.store.save_player("P1", [1200, 1500], [25.0, 20.5], 1500, 22.75)
+        expected = report.build_report("P1", [1200, 1500], [25.0, 20.5], 1500, 22.75)
+        self.assertEqual(bytes(self.store.load_report_view("P1")), expected.encode('utf-8'))
+
+    def test_missing_player(self):
+        """Test loading an unknown player raises FileNotFoundError"""
+        with self.assertRaises(FileNotFoundError):
+            self.store.load_report("NOBODY")
+
+    def test_index_survives_reopening(self):
+        """Test a new store object finds reports saved by an older one"""
+        self.store.save_player("P1", [10], [1.0], 10, 1.0)
+        reopened = storage.open_store("indexed", self.temp_dir.name)
+        self.assertIn("Player ID: P1\n", reopened.load_report("P1"))
+        reopened.close()
+
+    def test_missing_index_is_rebuilt(self):
+        """Test the index is rebuilt from the data file if it is lost"""
+        self.store.save_player("P1", [10], [1.0], 10, 1.0)
+        self.store.save_player("P1", [20], [1.0], 20, 1.0)
+        os.remove(self.store.index_path)
+
+        reopened = storage.open_store("indexed", self.temp_dir.name)
+        self.assertIn("Highest Score: 20\n", reopened.load_report("P1"))
+        reopened.close()
+
+    def test_compact_frees_space(self):
+        """Test compaction drops old reports but keeps the latest ones"""
+        for score in range(5):
+            self.store.save_player("P1", [score], [1.0], score, 1.0)
+        self.store.save_player("P2", [7], [1.0], 7, 1.0)
+        self.store.load_report("P1")
+
+        freed = self.store.compact()
+
+        self.assertGreater(freed, 0)
+        self.assertIn("Highest Score: 4\n", self.store.load_report("P1"))
+        self.assertIn("Highest Score: 7\n", self.store.load_report("P2"))
+
+    def test_id_with_space_survives_reopening(self):
+        """Test a player ID with a space in it is still found after reopening"""
+        self.store.save_player("JOHN SMITH", [10], [1.0], 10, 1.0)
+        self.assertIn("Highest Score: 10\n", self.store.load_report("JOHN SMITH"))
+
+        reopened = storage.open_store("indexed", self.temp_dir.name)
+        self.assertEqual(reopened.player_ids(), ["JOHN SMITH"])
+        self.assertIn("Highest Score: 10\n", reopened.load_report("JOHN SMITH"))
+        reopened.compact()
+        self.assertIn("Highest Score: 10\n", reopened.load_report("JOHN SMITH"))
+        reopened.close()
+
+    def test_long_non_ascii_id(self):
+        """Test a 20 character ID of emoji saves and loads without rebuilding the index"""
+        player_id = "\U0001F600" * 20
+        self.store.save_player(player_id, [10, 20], [1.0, 2.0], 20, 1.5)
+        with patch.object(self.store, "_rebuild_index") as rebuild:
+            self.assertEqual(list(self.store.load_games(player_id)[0]), [10, 20])
+            self.assertEqual(self.store.load_stats(player_id)["highest_score"], 20)
+        rebuild.assert_not_called()
+
+        reopened = storage.open_store("indexed", self.temp_dir.name)
+        self.assertEqual(reopened.player_ids(), [player_id])
+        self.assertEqual(list(reopened.load_games(player_id)[1]), [1.0, 2.0])
+        reopened.close()
+
+    def test_unreadable_record_is_missing(self):
+        """Test a record that still can't be read after rebuilding counts as not saved"""
+        self.store.save_player("P1", [10], [1.0], 10, 1.0)
+        with patch.object(self.store, "_read_record", return_value=None):
+            with self.assertRaises(FileNotFoundError):
+                self.store.load_games("P1")
+
+    def test_other_threads_wait_for_a_batch(self):
+        """Test a save from another thread waits for a batch and flushes its own record"""
+        store = storage.open_store("indexed", self.temp_dir.name, sync=True)
+        with patch.object(store, '_sync_files') as mock_sync:
+            with store.batch():
+                store.save_player("P1", [10], [1.0], 10, 1.0)
+                thread = threading.Thread(target=store.save_player, args=("P2", [10], [1.0], 10, 1.0))
+                thread.start()
+                thread.join(0.2)
+                self.assertTrue(thread.is_alive())
+            thread.join()
+            self.assertEqual(mock_sync.call_count, 2)
+        self.assertEqual(sorted(store.player_ids()), ["P1", "P2"])
+        store.close()
+
+    def test_batch_keeps_files_open(self):
+        """Test a batch opens the data and index files once and survives a compaction part way"""
+        real_open = open
+        opened = []
+
+        def counting_open(path, mode='r', *args, **kwargs):
+            if mode == 'ab':
+                opened.append(path)
+            return real_open(path, mode, *args, **kwargs)
+
+        with patch("builtins.open", counting_open), self.store.batch():
+            for number in range(5):
+                self.store.save_player(f"P{number}", [number], [1.0], number, 1.0)
+            self.assertEqual(opened.count(self.store.data_path), 1)
+            self.store.compact()
+            self.store.save_player("P0", [9], [1.0], 9, 1.0)
+
+        reopened = storage.open_store("indexed", self.temp_dir.name)
+        self.assertEqual(sorted(reopened.player_ids()), [f"P{number}" for number in range(5)])
+        self.assertIn("Highest Score: 9\n", reopened.load_report("P0"))
+        reopened.close()
+
+    def test_broken_index_line_is_an_error(self):
+        """Test a line that can't be read in the index raises instead of being skipped"""
+        self.store.save_player("P1", [10], [1.0], 10, 1.0)
+        with open(self.store.index_path, 'a', encoding='utf-8') as file:
+            file.write("PLAYER P2 10 extra\n")
+        with self.assertRaises(ValueError):
+            storage.open_store("indexed", self.temp_dir.name)
+
+    def test_compact_stopped_between_swaps(self):
+        """Test a compaction that stops after swapping the data file but not the index"""
+        for score in range(3):
+            self.store.save_player("P1", [score], [1.0], score, 1.0)
+        self.store.save_player("P2", [7], [1.0], 7, 1.0)
+
+        real_replace = os.replace
+        calls = []
+
+        def replace_once(source, target):
+            calls.append(target)
+            if len(calls) == 2:
+                raise OSError("stopped")
+            real_replace(source, target)
+
+        with patch("os.replace", replace_once):
+            with self.assertRaises(OSError):
+                self.store.compact()
+
+        self.assertIn("Highest Score: 2\n", self.store.load_report("P1"))
+        reopened = storage.open_store("indexed", self.temp_dir.name)
+        self.assertIn("Highest Score: 2\n", reopened.load_report("P1"))
+        self.assertIn("Highest Score: 7\n", reopened.load_report("P2"))
+        reopened.close()
+
+
+class TestSqliteStore(unittest.TestCase):
+    """Test cases for the SQLite store"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = storage.open_store("sqlite", self.temp_dir.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.temp_dir.cleanup()
+
+    def test_same_text_as_file_store(self):
+        """Test the report built from the database matches the text report"""
+        self.store.save_player("P1", [1200, 1500], [25.0, 20.5], 1500, 22.75)
+        expected = report.build_report("P1", [1200, 1500], [25.0, 20.5], 1500, 22.75)
+        self.assertEqual(self.store.load_report("P1"), expected)
+        self.assertEqual(self.store.load_games("P1"), (array('i', [1200, 1500]), array('d', [25.0, 20.5])))
+
+    def test_saving_again_replaces_games(self):
+        """Test saving a player again replaces all of their games"""
+        self.store.save_player("P1", [10, 20, 30], [1.0, 2.0, 3.0], 30, 2.0)
+        self.store.save_player("P1", [99], [3.0], 99, 3.0)
+        self.assertEqual(self.store.load_games("P1"), (array('i', [99]), array('d', [3.0])))
+        self.assertEqual(self.store.player_ids(), ["P1"])
+
+    def test_kept_games_are_not_written_again(self):
+        """Test only the games after kept_games are replaced"""
+        self.store.save_player("P1", [10, 20], [1.0, 2.0], 20, 1.5)
+        self.store.save_player("P1", [10, 20, 30], [1.0, 2.0, 3.0], 30, 2.0, kept_games=2)
+        self.assertEqual(self.store.load_games("P1"), (array('i', [10, 20, 30]), array('d', [1.0, 2.0, 3.0])))
+        self.store.save_player("P1", [10, 5], [1.0, 0.5], 10, 0.75, kept_games=1)
+        self.assertEqual(self.store.load_games("P1"), (array('i', [10, 5]), array('d', [1.0, 0.5])))
+
+    def test_missing_player(self):
+        """Test loading an unknown player raises FileNotFoundError"""
+        with self.assertRaises(FileNotFoundError):
+            self.store.load_report("NOBODY")
+
+    def test_add_games_only_writes_new_games(self):
+        """Test new games are added on to the saved ones, and a summary that's out of date is refused"""
+        summary = RunningSummary.from_games([10, 20], [1.0, 2.0])
+        self.assertTrue(self.store.add_games("P1", [10, 20], [1.0, 2.0], summary))
+        summary.add_games([30], [3.0])
+        self.assertTrue(self.store.add_games("P1", [30], [3.0], summary))
+        expected = report.build_report("P1", [10, 20, 30], [1.0, 2.0, 3.0], 30, 2.0)
+        self.assertEqual(self.store.load_report("P1"), expected)
+        self.assertEqual(self.store.load_summary("P1").games, 3)
+
+        stale = RunningSummary.from_games([10, 40], [1.0, 4.0])
+        self.assertFalse(self.store.add_games("P1", [40], [4.0], stale))
+        self.assertFalse(self.store.add_games("P1", [40], [4.0], RunningSummary.from_games([40], [4.0])))
+        self.assertEqual(list(self.store.load_games("P1")[0]), [10, 20, 30])
+
+    def test_uses_wal(self):
+        """Test the database is in WAL mode so readers don't block the writer"""
+        mode = self.store.connection.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    def test_failed_batch_saves_nothing(self):
+        """Test a batch that goes wrong part way through is rolled back"""
+        with self.assertRaises(RuntimeError):
+            with self.store.batch():
+                self.store.save_player("P1", [10], [1.0], 10, 1.0)
+                raise RuntimeError("stop")
+        self.assertEqual(self.store.player_ids(), [])
+
+    def test_second_connection_sees_saves(self):
+        """Test another connection (e.g. another program) reads what was saved"""
+        other = storage.open_store("sqlite", self.temp_dir.name)
+        with self.store.batch():
+            self.store.save_player("P1", [10], [1.0], 10, 1.0)
+            # Not committed yet, so the other reader still sees no players
+            self.assertEqual(other.player_ids(), [])
+        self.assertIn("Highest Score: 10\n", other.load_report("P1"))
+        other.close()
+
+
+class TestLoadStats(unittest.TestCase):
+    """Test cases for looking up a player's stats without their games"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        main.set_store(None)
+        self.temp_dir.cleanup()
+
+    def test_every_store_gives_the_same_stats(self):
+        """Test all the stores agree with the stats worked out from the games"""
+        scores = list(range(1, 5001))
+        times = [game / 4 for game in range(1, 5001)]
+        expected = {"player_id": "P1", "games": 5000, "highest_score": 5000,
+                    "average_time": main.calculate_average_time(times), "total_time": sum(times)}
+        for store_type in storage.STORE_TYPES:
+            folder = os.path.join(self.temp_dir.name, store_type)
+            os.mkdir(folder)
+            store = storage.open_store(store_type, folder)
+            store.save_player("P1", scores, times, 5000, main.calculate_average_time(times))
+            self.assertEqual(store.load_stats("P1"), expected)
+            with self.assertRaises(FileNotFoundError):
+                store.load_stats("NOBODY")
+            store.close()
+
+    def test_only_the_top_is_read(self):
+        """Test the file store reads one small block however long the report is"""
+        store = storage.open_store("files", self.temp_dir.name)
+        store.save_player("P1", [7] * 100000, [1.5] * 100000, 7, 1.5)
+        with patch('os.pread', wraps=os.pread) as mock_pread:
+            stats = store.load_stats("P1")
+        mock_pread.assert_called_once()
+        self.assertEqual(mock_pread.call_args[0][1], report.SUMMARY_READ_SIZE)
+        self.assertEqual(stats["games"], 100000)
+
+    def test_longest_summary_fits(self):
+        """Test the SUMMARY part of a report with the biggest values fits in the block read"""
+        text = report.build_report("X" * 20, [2147483647], [1e-300 / 3], 2147483647, 1e-300 / 3)
+        summary_end = text.index("DETAILED GAME DATA")
+        self.assertLess(len(text[:summary_end].encode('utf-8')), report.SUMMARY_READ_SIZE)
+
+    def test_old_database_counts_games(self):
+        """Test an SQLite database from before the games column still gives a game count"""
+        store = storage.open_store("sqlite", self.temp_dir.name)
+        store.save_player("P1", [1, 2, 3], [1.0, 2.0, 3.0], 3, 2.0)
+        store.connection.execute("UPDATE players SET games = NULL")
+        self.assertEqual(store.load_stats("P1")["games"], 3)
+        store.close()
+
+    @patch('builtins.print')
+    def test_stats_command(self, mock_print):
+        """Test stats --summary prints just the player's stats"""
+        main.set_store(storage.open_store("files", self.temp_dir.name))
+        main.save_to_file("P1", [1200, 1800], [20.0, 30.0], 1800, 25.0, quiet=True)
+
+        self.assertEqual(main.run_command(["stats", "--summary", "p1"]), 0)
+        printed = [call[0][0] for call in mock_print.call_args_list]
+        self.assertEqual(printed, ["Player ID: P1", "Number of Games: 2", "Highest Score: 1,800",
+                                   "Average Time: 25.0 minutes", "Total Time Played: 50.0 minutes"])
+        self.assertEqual(main.run_command(["stats", "--summary", "NOBODY"]), 1)
+
+
+class TestStoreSelection(unittest.TestCase):
+    """Test cases for picking a store from the command line"""
+
+    def setUp(self):
+        self.old_dir = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+
+    def tearDown(self):
+        main.set_store(None)
+        os.chdir(self.old_dir)
+        self.temp_dir.cleanup()
+
+    @patch('builtins.print')
+    def test_ingest_into_indexed_store(self, mock_print):
+        """Test the --store option saves into the indexed store"""
+        with open("results.csv", "w") as file:
+            file.write("player_id,score,time\nalice,100,10.0\n")
+
+        main.run_command(["--store", "indexed", "ingest", "results.csv"])
+
+        self.assertTrue(os.path.exists("players.dat"))
+        self.assertFalse(os.path.exists("player_ALICE.txt"))
+        self.assertIn("Highest Score: 100\n", main.get_store().load_report("ALICE"))
+
+
+    @patch('builtins.print')
+    def test_ingest_into_sqlite_store(self, mock_print):
+        """Test ingest saves into the SQLite store and reads back the same report"""
+        with open("results.csv", "w") as file:
+            file.write("player_id,score,time\nalice,100,10.0\nalice,250,5.5\nbob,7,1.0\n")
+
+        main.run_command(["--store", "sqlite", "ingest", "results.csv"])
+
+        self.assertTrue(os.path.exists("players.db"))
+        expected = report.build_report("ALICE", [100, 250], [10.0, 5.5], 250, 7.75)
+        self.assertEqual(main.get_store().load_report("ALICE"), expected)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,106 @@
+"""
+Unit tests for running summaries and adding games to saved players
+"""
+
+import unittest
+import os
+import tempfile
+from array import array
+from unittest.mock import patch
+import main
+import storage
+from summary import RunningSummary
+
+
+class TestRunningSummary(unittest.TestCase):
+    """Test cases for the running totals"""
+
+    def test_matches_full_calculation(self):
+        """Test the summary gives the same stats as working them out from scratch"""
+        scores = [1200, 1500, 900]
+        times = [25.0, 20.5, 30.1]
+        summary = RunningSummary.from_games(scores, times)
+
+        self.assertEqual(summary.games, 3)
+        self.assertEqual(summary.highest_score, main.find_highest_score(scores))
+        self.assertEqual(summary.average_time, main.calculate_average_time(times))
+        self.assertEqual(summary.total_time, sum(times))
+
+    def test_adding_games_later(self):
+        """Test adding games one batch at a time gives the same totals"""
+        summary = RunningSummary.from_games([10, 20], [0.1, 0.2])
+        summary.add_games([5], [0.3])
+        self.assertEqual(summary.total_time, sum([0.1, 0.2, 0.3]))
+        self.assertEqual(summary.highest_score, 20)
+
+    def test_variance(self):
+        """Test the time variance uses the sum of squares"""
+        summary = RunningSummary.from_games([1, 1], [2.0, 4.0])
+        self.assertAlmostEqual(summary.time_variance, 1.0)
+
+    def test_text_round_trip(self):
+        """Test a summary can be saved as text and read back"""
+        summary = RunningSummary.from_games([7, 3], [1.5, 2.5])
+        loaded = RunningSummary.from_text(summary.to_text())
+        self.assertEqual(loaded.to_dict(), summary.to_dict())
+
+
+class TestAppendGames(unittest.TestCase):
+    """Test cases for adding games to a saved player"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        main.set_store(None)
+        self.temp_dir.cleanup()
+
+    def check_append(self, store_type):
+        main.set_store(storage.open_store(store_type, self.temp_dir.name))
+        main.save_to_file("P1", [100, 300], [10.0, 20.0], 300, 15.0, quiet=True)
+
+        summary = main.append_games("P1", [200], [30.0], quiet=True)
+
+        self.assertEqual(summary.games, 3)
+        self.assertEqual(main.get_store().load_games("P1"),
+                         (array('i', [100, 300, 200]), array('d', [10.0, 20.0, 30.0])))
+        text = main.get_store().load_report("P1")
+        self.assertIn("Number of Games: 3\n", text)
+        self.assertIn("Average Time: 20.0 minutes\n", text)
+        self.assertIn("Total Time Played: 60.0 minutes\n", text)
+
+    def test_append_to_file_store(self):
+        """Test new games are added on to a player_<ID>.txt report"""
+        self.check_append("files")
+
+    def test_append_to_indexed_store(self):
+        """Test new games are added on to a report in the indexed store"""
+        self.check_append("indexed")
+
+    def test_replacing_drops_old_summary(self):
+        """Test saving a full new history doesn't keep an out of date summary"""
+        main.set_store(storage.open_store("files", self.temp_dir.name))
+        main.append_games("P1", [100], [10.0], quiet=True)
+        main.save_to_file("P1", [5], [1.0], 5, 1.0, quiet=True)
+
+        self.assertIsNone(main.get_store().load_summary("P1"))
+        summary = main.append_games("P1", [7], [3.0], quiet=True)
+        self.assertEqual(summary.highest_score, 7)
+        self.assertEqual(summary.games, 2)
+
+    @patch('builtins.print')
+    def test_ingest_append(self, mock_print):
+        """Test ingest --append adds to the saved games instead of replacing them"""
+        main.set_store(storage.open_store("files", self.temp_dir.name))
+        main.save_to_file("ALICE", [50], [5.0], 50, 5.0, quiet=True)
+        path = os.path.join(self.temp_dir.name, "more.csv")
+        with open(path, "w") as file:
+            file.write("player_id,score,time\nalice,80,15.0\n")
+
+        main.ingest_file(path, append=True)
+
+        self.assertEqual(main.get_store().load_games("ALICE"), (array('i', [50, 80]), array('d', [5.0, 15.0])))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
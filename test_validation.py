@@ -0,0 +1,73 @@
+"""
+Unit tests for checking whole columns at once
+"""
+
+import unittest
+from array import array
+import validation
+
+
+class TestCheckColumn(unittest.TestCase):
+    """Test cases for the batch checks against the rule table"""
+
+    def codes(self, *names):
+        return array('B', [validation.ERROR_CODES[name] for name in names])
+
+    def test_good_columns(self):
+        """Test a column with nothing wrong gets all zero codes"""
+        codes, player_ids = validation.check_column("player_id", [" alice ", "Bob"])
+        self.assertEqual(codes, array('B', [0, 0]))
+        self.assertEqual(player_ids, ["ALICE", "BOB"])
+        codes, times = validation.check_column("time", ["1440", "0.5"])
+        self.assertEqual(codes, array('B', [0, 0]))
+        self.assertEqual(times, array('d', [1440.0, 0.5]))
+
+    def test_every_problem_has_a_code(self):
+        """Test each broken value gets the code for its problem"""
+        codes, _ = validation.check_column("player_id", ["", "THISPLAYERIDISTOOLONG123", "OK"])
+        self.assertEqual(codes, self.codes("empty_id", "id_too_long", "ok"))
+        codes, _ = validation.check_column("games", ["0", "-5", "abc", "150"])
+        self.assertEqual(codes, self.codes("too_few_games", "too_few_games", "games_not_number", "ok"))
+        codes, _ = validation.check_column("score", ["-100", "2000000", "xyz", "12.5", "1000000", "0"])
+        self.assertEqual(codes, self.codes("score_negative", "score_too_high", "score_not_number",
+                                           "score_not_number", "ok", "ok"))
+        codes, _ = validation.check_column("time", ["0", "-10.5", "2000", "abc"])
+        self.assertEqual(codes, self.codes("time_too_short", "time_too_short", "time_too_long",
+                                           "time_not_number"))
+
+    def test_huge_whole_numbers(self):
+        """Test numbers too big for the array are still caught"""
+        codes, _ = validation.check_column("score", ["1" * 30, "-" + "1" * 30, "5"])
+        self.assertEqual(codes, self.codes("score_too_high", "score_negative", "ok"))
+
+    def test_batch_uses_the_first_problem(self):
+        """Test each row gets the first problem found, the ID before the score before the time"""
+        codes, cleaned = validation.validate_batch({
+            "player_id": ["a", "", "c", "d"],
+            "score": ["1", "-1", "-1", "4"],
+            "time": ["1", "0", "0", "2000"],
+        })
+        self.assertEqual(codes, self.codes("ok", "empty_id", "score_negative", "time_too_long"))
+        self.assertEqual(cleaned["score"][0], 1)
+
+    def test_summary(self):
+        """Test the report counts each problem and lists the first rows with it"""
+        codes = self.codes("ok", "score_negative", "ok", "score_negative", "time_too_long")
+        report = validation.summarise_errors(codes, first_row=11, examples=1)
+        self.assertEqual((report["rows"], report["valid"], report["rejected"]), (5, 2, 3))
+        self.assertEqual(report["errors"]["score_negative"],
+                         {"code": 6, "message": "Scores can't be negative! Try again.", "count": 2, "rows": [12]})
+        self.assertEqual(report["errors"]["time_too_long"]["rows"], [15])
+
+    def test_single_values_match_the_batch(self):
+        """Test the menu's checks give the same answers as the batch"""
+        self.assertEqual(validation.validate_player_id(" abc "), "ABC")
+        self.assertEqual(validation.validate_number_of_games("150"), 150)
+        with self.assertRaisesRegex(ValueError, "under 1,000,000"):
+            validation.validate_score("2000000")
+        with self.assertRaisesRegex(ValueError, "more than 0 minutes"):
+            validation.validate_time("0")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
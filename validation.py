@@ -0,0 +1,215 @@
+"""
+Validation rules for the Games Club Statistics Program
+Every rule is in the RULES table below. The menu checks one value at a
+time: each validate_ function either returns the cleaned up value or
+raises a ValueError with the friendly message the menu shows
+
+Imports check whole columns at once with check_column and validate_batch
+instead, which give an error code for every row (0 for a good row) and
+never stop or prompt, so bad rows can be set aside at full speed.
+summarise_errors turns the codes into a report of what went wrong and where
+"""
+
+from array import array
+
+# Every problem a value can have, as (name, message), the code is the place in the list
+ERRORS = [
+    ("ok", ""),
+    ("empty_id", "Oops! You can't leave this empty. Try again."),
+    ("id_too_long", "That's too long! Keep it under 20 characters."),
+    ("games_not_number", "Please enter a number, not letters!"),
+    ("too_few_games", "You need to have played at least 1 game!"),
+    ("score_not_number", "Please enter a number for the score!"),
+    ("score_negative", "Scores can't be negative! Try again."),
+    ("score_too_high", "That's an amazing score, but let's keep it under 1,000,000!"),
+    ("time_not_number", "Please enter a number for the time!"),
+    ("time_too_short", "Time must be more than 0 minutes!"),
+    ("time_too_long", "That's more than 24 hours! Are you sure?"),
+]
+
+# Error name -> code
+ERROR_CODES = {name: code for code, (name, _) in enumerate(ERRORS)}
+
+# The rules for each kind of value. Numbers must be from low to high, with
+# low_included saying if low itself is allowed and None for no limit
+# Games have no upper limit as they are kept in compact arrays that can
+# hold a whole season, and 1440 minutes is 24 hours
+RULES = {
+    "player_id": {"max_length": 20, "empty": "empty_id", "too_long": "id_too_long"},
+    "games": {"type": int, "low": 1, "low_included": True, "high": None,
+              "not_number": "games_not_number", "too_low": "too_few_games", "too_high": None},
+    "score": {"type": int, "low": 0, "low_included": True, "high": 1000000,
+              "not_number": "score_not_number", "too_low": "score_negative", "too_high": "score_too_high"},
+    "time": {"type": float, "low": 0, "low_included": False, "high": 1440,
+             "not_number": "time_not_number", "too_low": "time_too_short", "too_high": "time_too_long"},
+}
+
+def _check_ids(rule, values):
+    """
+    Checks a column of player IDs
+    Returns (codes, IDs stripped and in uppercase)
+    """
+    player_ids = list(map(str.strip, map(str, values)))
+    lengths = list(map(len, player_ids))
+    max_length = rule["max_length"]
+    if not lengths or (min(lengths) > 0 and max(lengths) <= max_length):
+        # Every ID is fine, which min and max tell us without a loop in Python
+        codes = array('B', bytes(len(lengths)))
+    else:
+        empty = ERROR_CODES[rule["empty"]]
+        too_long = ERROR_CODES[rule["too_long"]]
+        codes = array('B', [empty if not length else too_long if length > max_length else 0
+                            for length in lengths])
+    return codes, list(map(str.upper, player_ids))
+
+def _parse_numbers(number_type, values):
+    """
+    Turns a column into numbers
+    Returns (numbers, rows that aren't numbers), with 0 in the place of each bad one
+    """
+    typecode = 'q' if number_type is int else 'd'
+    try:
+        # One pass in C when every value is fine, which is nearly always
+        # (a list first then an array is quicker than filling the array)
+        return array(typecode, list(map(number_type, values))), []
+    except (ValueError, TypeError, OverflowError):
+        pass
+
+    numbers = array(typecode)
+    bad_rows = []
+    for row, value in enumerate(values):
+        try:
+            number = number_type(value)
+        except (ValueError, TypeError, OverflowError):
+            numbers.append(0)
+            bad_rows.append(row)
+            continue
+        if typecode == 'q':
+            # A whole number too big for the array is outside every rule anyway
+            number = max(min(number, 2 ** 63 - 1), -2 ** 63)
+        numbers.append(number)
+    return numbers, bad_rows
+
+def _inside(numbers, low, low_included, high):
+    """
+    Returns True if every number is inside the limits
+    """
+    if not numbers:
+        return True
+    smallest = min(numbers)
+    return (smallest >= low if low_included else smallest > low) and max(numbers) <= high
+
+def _check_numbers(rule, values):
+    """
+    Checks a column of numbers against a rule
+    Returns (codes, numbers)
+    """
+    numbers, bad_rows = _parse_numbers(rule["type"], values)
+    low, high = rule["low"], rule["high"]
+    too_low = ERROR_CODES[rule["too_low"]]
+    too_high = ERROR_CODES[rule["too_high"]] if high is not None else 0
+    if high is None:
+        high = float("inf")
+
+    if not bad_rows and _inside(numbers, low, rule["low_included"], high):
+        return array('B', bytes(len(numbers))), numbers
+    if rule["low_included"]:
+        codes = array('B', [too_low if number < low else too_high if number > high else 0
+                            for number in numbers])
+    else:
+        codes = array('B', [too_low if number <= low else too_high if number > high else 0
+                            for number in numbers])
+    not_number = ERROR_CODES[rule["not_number"]]
+    for row in bad_rows:
+        codes[row] = not_number
+    return codes, numbers
+
+def check_column(field, values):
+    """
+    Checks a whole column of values with the rule for field ("player_id",
+    "games", "score" or "time")
+    Returns (codes, cleaned values) with a code for every row, 0 if it's fine
+    The cleaned values are a list of IDs or an array of numbers, and the
+    rows with a code other than 0 should be ignored
+    """
+    rule = RULES[field]
+    if field == "player_id":
+        return _check_ids(rule, values)
+    return _check_numbers(rule, values)
+
+def validate_batch(columns):
+    """
+    Checks several columns of the same rows, e.g.
+    validate_batch({"player_id": ids, "score": scores, "time": times})
+    Returns (codes, cleaned columns) where each row's code is the first
+    problem found, checking the fields in the order they are in RULES
+    """
+    codes = None
+    cleaned = {}
+    for field in RULES:
+        if field not in columns:
+            continue
+        field_codes, cleaned[field] = check_column(field, columns[field])
+        if codes is None:
+            codes = field_codes
+        elif any(field_codes):
+            codes = array('B', [code or field_code for code, field_code in zip(codes, field_codes)])
+    return codes if codes is not None else array('B'), cleaned
+
+def summarise_errors(codes, first_row=1, examples=10):
+    """
+    Makes a report from the codes validate_batch gave, with rows numbered
+    from first_row
+    Returns {"rows", "valid", "rejected", "errors"} where errors has
+    {"code", "message", "count", "rows"} for each problem found, with
+    the first few row numbers that had it
+    """
+    errors = {}
+    for row, code in enumerate(codes, start=first_row):
+        if code:
+            name, message = ERRORS[code]
+            entry = errors.get(name)
+            if entry is None:
+                entry = errors[name] = {"code": code, "message": message, "count": 0, "rows": []}
+            entry["count"] += 1
+            if len(entry["rows"]) < examples:
+                entry["rows"].append(row)
+    rejected = sum(entry["count"] for entry in errors.values())
+    return {"rows": len(codes), "valid": len(codes) - rejected, "rejected": rejected, "errors": errors}
+
+def _check_one(field, value):
+    """
+    Checks a single value, raising a ValueError with the menu's message if it's wrong
+    """
+    codes, cleaned = check_column(field, [value])
+    if codes[0]:
+        raise ValueError(ERRORS[codes[0]][1])
+    return cleaned[0]
+
+def validate_player_id(text):
+    """
+    Checks a player ID and returns it in uppercase
+    It can't be empty and must be 20 characters or less
+    """
+    return _check_one("player_id", text)
+
+def validate_number_of_games(text):
+    """
+    Checks how many games were played and returns it as a whole number
+    Must be at least 1
+    """
+    return _check_one("games", text)
+
+def validate_score(text):
+    """
+    Checks a score and returns it as a whole number
+    Must be between 0 and 1,000,000
+    """
+    return _check_one("score", text)
+
+def validate_time(text):
+    """
+    Checks a game time and returns it as a decimal number of minutes
+    Must be more than 0 and no more than 1440 (24 hours)
+    """
+    return _check_one("time", text)